@@ -0,0 +1,207 @@
+from collections import OrderedDict
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import math
+import time
+
+from .config import settings
+
+class OverloadedError(Exception):
+    """Raised when a stage's wait queue is full; mapped to 503 with Retry-After"""
+    
+    def __init__(self, stage: str, retry_after: Optional[float] = None):
+        self.stage = stage
+        self.retry_after = retry_after if retry_after is not None else settings.ADMISSION_RETRY_AFTER_SECONDS
+        super().__init__(f"Server overloaded ({stage} queue full), retry later")
+
+class StageLimiter:
+    """Bounded concurrency with a bounded FIFO wait queue for one pipeline stage.
+    
+    Up to ``max_concurrent`` callers hold a slot; up to ``max_queue`` more wait
+    for one (at most ``queue_timeout`` seconds). Anyone beyond that is shed
+    immediately with OverloadedError instead of piling up.
+    """
+    
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: "OrderedDict[int, asyncio.Future]" = OrderedDict()
+        self._next_waiter = 0
+        
+        # Statistics
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.max_queue_depth = 0
+        self.total_queue_wait = 0.0
+    
+    async def acquire(self):
+        """Take a slot, waiting in the queue if needed; raises OverloadedError when full"""
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            raise OverloadedError(self.name)
+        
+        waiter_id = self._next_waiter
+        self._next_waiter += 1
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[waiter_id] = future
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done() or future.cancelled():
+                self.timed_out += 1
+                raise OverloadedError(self.name)
+            # The slot was handed over just as the wait timed out: keep it
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.release()  # Slot was handed over just as we gave up
+            raise
+        finally:
+            self._waiters.pop(waiter_id, None)
+            if not future.done():
+                future.cancel()
+            self.total_queue_wait += time.perf_counter() - started
+        self.admitted += 1
+    
+    def release(self):
+        """Return a slot, handing it straight to the oldest waiter"""
+        while self._waiters:
+            _, future = self._waiters.popitem(last=False)
+            if not future.done():
+                future.set_result(None)  # Slot transfers; active count unchanged
+                return
+        self.active -= 1
+    
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Report occupancy, queue depth and shed counts"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "avg_queue_wait_ms": 1000.0 * self.total_queue_wait / self.admitted if self.admitted else 0.0
+        }
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, holding at most ``burst``"""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+    
+    def take(self, cost: float = 1.0) -> float:
+        """Spend tokens; returns 0 when allowed, else seconds until enough accrue"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+class ClientRateLimiter:
+    """Per-client token buckets, keeping the ``max_clients`` most recently seen clients"""
+    
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+    
+    def check(self, client_id: str) -> float:
+        """0 if the client may proceed, else seconds it should wait"""
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_id)
+        
+        wait = bucket.take()
+        if wait:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return wait
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Report limiter settings and decisions"""
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "tracked_clients": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited
+        }
+
+class AdmissionController:
+    """Admission limits for the analysis pipeline.
+    
+    ``ingest`` bounds uploads being received and ``persist`` bounds saves of
+    finished analyses; preprocess/infer queueing is bounded inside the
+    inference batcher. Optional per-client rate limits apply on top.
+    """
+    
+    def __init__(self):
+        self.enabled = settings.ADMISSION_CONTROL_ENABLED
+        timeout = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+        self.stages: Dict[str, StageLimiter] = {
+            "ingest": StageLimiter("ingest", settings.INGEST_MAX_CONCURRENT, settings.INGEST_MAX_QUEUE, timeout),
+            "persist": StageLimiter("persist", settings.PERSIST_MAX_CONCURRENT, settings.PERSIST_MAX_QUEUE, timeout),
+        }
+        self.rate_limiter = ClientRateLimiter(
+            settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST
+        ) if settings.RATE_LIMIT_ENABLED else None
+    
+    def stage(self, name: str) -> StageLimiter:
+        return self.stages[name]
+    
+    def slot(self, name: str) -> AsyncContextManager[None]:
+        """Hold a slot in a stage (a no-op when admission control is disabled)"""
+        return self.stages[name].slot() if self.enabled else nullcontext()
+    
+    def check_rate_limit(self, client_id: str) -> Tuple[bool, float]:
+        """(allowed, retry_after_seconds) for one request from a client"""
+        if self.rate_limiter is None:
+            return True, 0.0
+        wait = self.rate_limiter.check(client_id)
+        return wait == 0.0, wait
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-stage and rate limiter statistics"""
+        return {
+            "enabled": self.enabled,
+            "stages": {name: stage.get_stats() for name, stage in self.stages.items()},
+            "rate_limit": self.rate_limiter.get_stats() if self.rate_limiter else None
+        }
+
+# Global admission controller
+admission = AdmissionController()
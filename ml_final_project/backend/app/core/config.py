@@ -1,15 +1,25 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 import os
 
 class Settings(BaseSettings):
     # API Settings
     PROJECT_NAME: str = "Lung Disease Detection API"
     DEBUG: bool = True
+    WORKERS: int = 1  # Server processes; more than one starts the pre-fork server (see start.py)
+    
+    # Storage Settings
+    STORAGE_BACKEND: str = "firestore"  # "firestore", "sqlite" (local file) or "memory" (no persistence)
+    LOCAL_STORAGE_PATH: str = "data/local_storage.db"  # Database file of the "sqlite" backend
     
     # Firebase Settings
     FIREBASE_PROJECT_ID: str = os.getenv("FIREBASE_PROJECT_ID", "lungdiseasedetection-19b4f")
     FIREBASE_CREDENTIALS_PATH: str = os.getenv("FIREBASE_CREDENTIALS_PATH", "firebase-credentials.json")
+    FIRESTORE_IO_THREADS: int = 16  # Concurrent Firestore round trips (threads sharing one client)
+    
+    # Disease Catalog Settings (served from an in-memory snapshot)
+    CATALOG_WATCH_CHANGES: bool = True  # Reload when storage reports a change (Firestore snapshot listener)
+    CATALOG_REFRESH_SECONDS: float = 300.0  # Fallback version check interval; 0 disables
     
     # CORS Settings
     ALLOWED_ORIGINS: List[str] = [
@@ -27,10 +37,83 @@ class Settings(BaseSettings):
         "image/bmp",
         "image/tiff"
     ]
+    IMAGE_MAX_PIXELS: int = 50_000_000  # Rejects decompression bombs before decoding
+    IMAGE_MIN_DIMENSION: int = 64
+    IMAGE_MAX_FRAMES: int = 1
+    UPLOAD_CHUNK_SIZE: int = 64 * 1024
+    UPLOAD_SPOOL_MAX_MEMORY: int = 1024 * 1024  # Larger uploads are spooled to disk (in TMPDIR) by the multipart parser
+    UPLOAD_FORM_OVERHEAD: int = 1024 * 1024  # Allowance for multipart framing and form fields
+    
+    # Batch Analysis Settings
+    MAX_BATCH_FILES: int = 500
+    MAX_BATCH_UPLOAD_SIZE: int = 256 * 1024 * 1024  # Whole request body of a batch or job submission
+    BATCH_CONCURRENCY: int = 32  # Files analyzed at once; keep above INFERENCE_MAX_BATCH_SIZE
+    JOB_DB_PATH: str = "data/jobs.db"  # SQLite database of background analysis jobs
+    JOB_STORAGE_DIR: str = "uploads/jobs"  # Images of background jobs; analyzed ones are kept (served from /uploads), failed ones deleted
+    JOB_LEASE_SECONDS: float = 60.0  # A job whose process stops renewing its lease this long is resumed by another
+    JOB_PROGRESS_POLL_SECONDS: float = 1.0  # How often progress streams check for items finished by other processes
+    
+    # Symptom Triage Settings
+    MAX_TRIAGE_RECORDS: int = 10000  # Questionnaires per bulk triage request
+    TRIAGE_CHUNK_SIZE: int = 256  # Questionnaires scored per matrix multiply while streaming
     
     # ML Model Settings
     MODEL_PATH: str = "app/models"
     CONFIDENCE_THRESHOLD: float = 0.7
+    INFERENCE_BACKEND: str = "numpy"  # "keras", "savedmodel", "tflite", "onnx", "numpy" (stub) or "remote"
+    MODEL_FILENAME: Optional[str] = None  # Defaults to lung_disease_model.<ext> for the backend
+    INFERENCE_THREADS: Optional[int] = None  # Intra-op threads per worker; defaults to cores / WORKERS
+    INFERENCE_INTER_OP_THREADS: Optional[int] = None  # Inter-op threads per worker (TensorFlow/ONNX Runtime)
+    INFERENCE_WORKER_ADDRESSES: List[str] = []  # "remote" backend: unix:/path.sock or host:port per worker
+    INFERENCE_WORKER_CONNECTIONS: int = 2  # Batches in flight per worker (overlaps transfer with compute)
+    INFERENCE_WORKER_TIMEOUT_SECONDS: float = 30.0
+    
+    # Inference Batching Settings
+    INFERENCE_MAX_BATCH_SIZE: int = 16  # Max images per forward pass
+    INFERENCE_MAX_WAIT_MS: float = 10.0  # Max time a request waits for a batch to fill
+    INFERENCE_BATCH_BUCKETS: List[int] = [1, 2, 4, 8, 16]  # Batches are padded up to one of these shapes
+    COMPILE_CACHE_DIR: Optional[str] = None  # Set to persist compiled graphs across restarts
+    INFERENCE_PRIORITY_WEIGHTS: Dict[str, int] = {"interactive": 8, "batch": 2, "background": 1}  # Share of batch slots per lane
+    INFERENCE_STARVATION_MS: float = 1000.0  # Requests queued longer than this are served next, whatever their lane
+    
+    # Image Preprocessing Settings
+    PREPROCESS_EXECUTOR: str = "process"  # "process" or "thread"
+    PREPROCESS_WORKERS: int = min(4, os.cpu_count() or 1)
+    PREPROCESS_BUFFERS: int = 2  # Preallocated batch tensors; batches decoding/inferring at once
+    
+    # Inference Result Cache Settings
+    MODEL_VERSION: Optional[str] = None  # Part of the cache key; defaults to the model file hash
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_ENTRIES: int = 1024
+    RESULT_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    RESULT_CACHE_DIR: Optional[str] = None  # Set to enable the on-disk tier
+    RESULT_CACHE_DISK_MAX_MB: int = 256
+    
+    # Admission Control Settings (requests over the limits are shed with 503 + Retry-After)
+    ADMISSION_CONTROL_ENABLED: bool = True
+    INGEST_MAX_CONCURRENT: int = 32  # Analysis uploads being received at once
+    INGEST_MAX_QUEUE: int = 64  # Analysis requests waiting to start receiving
+    INFERENCE_MAX_QUEUE: int = 256  # Images waiting for the batcher (decode + inference)
+    PERSIST_MAX_CONCURRENT: int = 16  # Analyses being saved (disk + Firestore) at once
+    PERSIST_MAX_QUEUE: int = 256
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0  # Longest wait for a stage slot before shedding
+    ADMISSION_RETRY_AFTER_SECONDS: int = 2
+    RATE_LIMIT_ENABLED: bool = False  # Per-client token buckets on the analysis endpoints
+    RATE_LIMIT_PER_SECOND: float = 5.0
+    RATE_LIMIT_BURST: int = 20
+    RATE_LIMIT_CLIENT_HEADER: Optional[str] = None  # e.g. "X-API-Key"; defaults to the client IP
+    
+    # Startup Settings
+    STARTUP_WAIT_SECONDS: float = 5.0  # How long a request waits for a stage still starting
+    STARTUP_RETRY_AFTER_SECONDS: int = 5
+    
+    # Firestore Write-Behind Settings (analysis results are saved in the background)
+    FIRESTORE_BATCH_SIZE: int = 500  # Writes per batch commit (Firestore's limit)
+    FIRESTORE_FLUSH_INTERVAL_MS: float = 50.0  # How long a partial batch waits to fill
+    FIRESTORE_WRITE_QUEUE_MAX: int = 10000  # Queued writes beyond this are refused
+    FIRESTORE_WRITE_RETRIES: int = 5
+    FIRESTORE_RETRY_BACKOFF_SECONDS: float = 0.5  # Doubles after each failed attempt
+    FIRESTORE_FLUSH_TIMEOUT_SECONDS: float = 30.0  # How long shutdown waits for queued writes
     
     # Security Settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
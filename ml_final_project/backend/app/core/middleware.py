@@ -0,0 +1,166 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Dict, Iterable, Optional
+import json
+import math
+
+from .admission import AdmissionController, OverloadedError
+
+class RequestSizeLimitMiddleware:
+    """Rejects oversized request bodies with 413 before they are fully buffered.
+    
+    Requests with a declared Content-Length over the limit are refused without
+    reading the body. Chunked bodies are counted as they arrive; once the limit
+    is crossed the app's response is discarded and replaced with a 413. Only
+    ``methods`` are limited, so CORS preflights (OPTIONS) pass through.
+    """
+    
+    def __init__(self, app: ASGIApp, limits: Dict[str, int], methods: Iterable[str] = ("POST",)):
+        self.app = app
+        self.limits = limits
+        self.methods = set(methods)
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] in self.methods else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+        
+        received = 0
+        exceeded = False
+        response_started = False
+        
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Stop feeding the body; the app sees a disconnect
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+        
+        async def tracking_send(message: Message):
+            nonlocal response_started
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+        
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except Exception:
+            if not exceeded:
+                raise
+        
+        if exceeded and not response_started:
+            await self._reject(send, limit)
+    
+    async def _reject(self, send: Send, limit: int):
+        """Send a 413 response"""
+        body = json.dumps({
+            "detail": f"Request body too large. Maximum size: {limit / (1024*1024):.1f}MB"
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close")
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+class AdmissionControlMiddleware:
+    """Admission control for expensive endpoints, applied before the body is read.
+    
+    Clients over their rate limit get 429. Otherwise the request takes an
+    ingest slot, waiting in a bounded queue if all are busy; when the queue
+    is full it is shed at once with 503. The slot is held until the request
+    body has been received, so a burst of uploads cannot all be buffered.
+    Both responses carry Retry-After. Only ``methods`` are admission-checked,
+    so CORS preflights (OPTIONS) spend no tokens or slots.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        paths: Iterable[str],
+        client_header: Optional[str] = None,
+        methods: Iterable[str] = ("POST",)
+    ):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+        self.methods = set(methods)
+        self.client_header = client_header.lower().encode() if client_header else None
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in self.methods or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        
+        allowed, retry_after = self.controller.check_rate_limit(self._client_id(scope))
+        if not allowed:
+            await self._reject(send, 429, "Rate limit exceeded", retry_after)
+            return
+        
+        ingest = self.controller.stage("ingest")
+        try:
+            await ingest.acquire()
+        except OverloadedError as e:
+            await self._reject(send, 503, str(e), e.retry_after)
+            return
+        
+        released = False
+        
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                ingest.release()
+        
+        async def admitted_receive() -> Message:
+            message = await receive()
+            if message["type"] != "http.request" or not message.get("more_body", False):
+                release()  # Body fully received (or client gone)
+            return message
+        
+        try:
+            await self.app(scope, admitted_receive, send)
+        finally:
+            release()
+    
+    def _client_id(self, scope: Scope) -> str:
+        """Rate limit key: the configured header if present, else the client address"""
+        if self.client_header is not None:
+            value = dict(scope["headers"]).get(self.client_header)
+            if value:
+                return value.decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+    
+    async def _reject(self, send: Send, status: int, detail: str, retry_after: float):
+        """Send a JSON error with Retry-After"""
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(min(retry_after, 3600)))).encode()),
+                (b"connection", b"close")
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,96 @@
+from fastapi import HTTPException
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import time
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class StartupTasks:
+    """Runs startup stages concurrently in the background and tracks readiness.
+    
+    The app starts accepting connections as soon as the stages are launched,
+    so liveness checks pass immediately; endpoints that need a stage wait for
+    it (briefly) or fail fast with 503 until it is ready.
+    """
+    
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._durations: Dict[str, float] = {}
+    
+    def start(self, name: str, fn: Callable[[], Awaitable[Any]]):
+        """Launch a named startup stage"""
+        begun = time.perf_counter()
+        task = asyncio.create_task(fn(), name=f"startup:{name}")
+        task.add_done_callback(lambda t: self._finish(name, t, begun))
+        self._tasks[name] = task
+    
+    def _finish(self, name: str, task: asyncio.Task, begun: float):
+        """Record how a stage ended"""
+        self._durations[name] = time.perf_counter() - begun
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            logger.error(f"❌ Startup stage '{name}' failed: {str(error)}")
+        else:
+            logger.info(f"✅ Startup stage '{name}' ready in {1000 * self._durations[name]:.0f} ms")
+    
+    def state(self, name: str) -> str:
+        """"pending", "ready", "failed" or "cancelled"; unknown stages count as ready"""
+        task = self._tasks.get(name)
+        if task is None:
+            return "ready"
+        if not task.done():
+            return "pending"
+        if task.cancelled():
+            return "cancelled"
+        return "failed" if task.exception() is not None else "ready"
+    
+    def is_ready(self, name: Optional[str] = None) -> bool:
+        """Whether a stage (or every stage) completed successfully"""
+        names = [name] if name is not None else list(self._tasks)
+        return all(self.state(stage) == "ready" for stage in names)
+    
+    async def wait(self, name: str, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for a stage; True once it is ready"""
+        task = self._tasks.get(name)
+        if task is not None and not task.done():
+            await asyncio.wait([task], timeout=timeout)
+        return self.is_ready(name)
+    
+    def status(self) -> Dict[str, Any]:
+        """Per-stage state, duration and error"""
+        stages = {}
+        for name, task in self._tasks.items():
+            state = self.state(name)
+            stages[name] = {
+                "state": state,
+                "duration_ms": 1000 * self._durations.get(name, 0.0),
+                "error": str(task.exception()) if state == "failed" else None
+            }
+        return stages
+    
+    async def cancel_all(self):
+        """Cancel stages still running at shutdown"""
+        pending = [task for task in self._tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+def require_stage(name: str, timeout: Optional[float] = None):
+    """FastAPI dependency that waits for a startup stage or responds 503"""
+    async def dependency():
+        if not await startup_tasks.wait(name, settings.STARTUP_WAIT_SECONDS if timeout is None else timeout):
+            failed = startup_tasks.state(name) == "failed"
+            raise HTTPException(
+                status_code=503,
+                detail=f"Service unavailable ({name} failed to start)" if failed else f"Service is starting up ({name} not ready)",
+                headers={"Retry-After": str(settings.STARTUP_RETRY_AFTER_SECONDS)}
+            )
+    return dependency
+
+# Global startup tracker
+startup_tasks = StartupTasks()
@@ -1,35 +1,64 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
 import os
 from contextlib import asynccontextmanager
 
 from .routers import analysis, diseases, symptoms, users
 from .core.config import settings
+from .core.admission import admission, OverloadedError
+from .core.middleware import AdmissionControlMiddleware, RequestSizeLimitMiddleware
+from .core.startup import startup_tasks
 from .services.ml_service import MLService
 from .services.firebase_service import firebase_service
+from .services.analysis_jobs import job_manager
+from .services.disease_catalog import disease_catalog
+
+# Uploads are kept in the multipart parser's spool files (see upload_ingest)
+MultiPartParser.spool_max_size = settings.UPLOAD_SPOOL_MAX_MEMORY
 
 # Global service instances
 ml_service = None
 
+async def connect_firebase():
+    """Connect to Firestore, seed empty collections and load the disease catalog"""
+    await firebase_service.initialize()
+    print(f"🔥 Storage connected successfully ({firebase_service.storage.name})!")
+    
+    # Catalog endpoints are served from memory from here on
+    await disease_catalog.start()
+
+async def load_ml_models():
+    """Load the model and compile every batch bucket"""
+    await ml_service.load_models()
+    await ml_service.warmup()
+    print("🚀 ML models loaded successfully!")
+    
+    # Pick up background jobs interrupted by a restart
+    await job_manager.start(ml_service)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     global ml_service
     
-    # Initialize Firebase
-    await firebase_service.initialize()
-    print("🔥 Firebase connected successfully!")
-    
-    # Initialize ML service
+    # Run startup stages concurrently in the background; the server accepts
+    # traffic right away and endpoints wait on the stages they need
     ml_service = MLService()
-    await ml_service.load_models()
-    print("🚀 ML models loaded successfully!")
+    startup_tasks.start("firebase", connect_firebase)
+    startup_tasks.start("ml_models", load_ml_models)
     
     yield
     
     # Shutdown
     print("🔄 Shutting down...")
+    await startup_tasks.cancel_all()
+    await job_manager.shutdown()
+    await ml_service.shutdown()
+    await disease_catalog.close()
+    await firebase_service.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -39,15 +68,47 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# CORS middleware for Next.js frontend
+# Shed analysis requests beyond the ingest limits (and rate-limit clients) before reading their bodies
+if settings.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        controller=admission,
+        paths=["/api/analysis/upload-xray", "/api/analysis/batch-analyze", "/api/analysis/jobs"],
+        client_header=settings.RATE_LIMIT_CLIENT_HEADER
+    )
+
+# Reject oversized uploads before the multipart body is buffered. This is the
+# only early abort: the endpoints see each file once it is fully spooled
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    limits={
+        "/api/analysis/upload-xray": settings.MAX_FILE_SIZE + settings.UPLOAD_FORM_OVERHEAD,
+        "/api/analysis/batch-analyze": settings.MAX_BATCH_UPLOAD_SIZE,
+        "/api/analysis/jobs": settings.MAX_BATCH_UPLOAD_SIZE,
+    }
+)
+
+# CORS middleware for Next.js frontend. Added last so it is outermost: the
+# 413/429/503 responses of the middleware above carry CORS headers too, and
+# browsers may read their Retry-After
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    """A pipeline stage is saturated: shed the request and tell the client when to retry"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
 # Create uploads directory if it doesn't exist
 os.makedirs("uploads", exist_ok=True)
 
@@ -71,4 +132,20 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "ml_service": ml_service is not None} 
\ No newline at end of file
+    """Liveness: the process is up and serving, even while models load"""
+    return {
+        "status": "healthy",
+        "ml_service": ml_service is not None and startup_tasks.is_ready("ml_models"),
+        "ready": startup_tasks.is_ready()
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: every startup stage has completed"""
+    stages = startup_tasks.status()
+    states = {stage["state"] for stage in stages.values()}
+    status = "ready" if states <= {"ready"} else "starting" if states <= {"ready", "pending"} else "failed"
+    return JSONResponse(
+        status_code=200 if status == "ready" else 503,
+        content={"status": status, "stages": stages}
+    )
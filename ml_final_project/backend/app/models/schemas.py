@@ -16,6 +16,11 @@ class DiseaseType(str, Enum):
     COVID19 = "covid19"
     NORMAL = "normal"
 
+class Priority(str, Enum):
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+    BACKGROUND = "background"
+
 # Base schemas
 class DiseaseBase(BaseModel):
     name: str
@@ -23,7 +28,7 @@ class DiseaseBase(BaseModel):
     severity: SeverityLevel
     symptoms: List[str]
     treatment: Optional[str] = None
-    
+
 class Disease(DiseaseBase):
     id: int
     image_url: Optional[str] = None
@@ -46,6 +51,15 @@ class PredictionResult(BaseModel):
     confidence: float = Field(..., ge=0.0, le=1.0)
     probability: float = Field(..., ge=0.0, le=1.0)
 
+class ImageMetadata(BaseModel):
+    format: str
+    mime_type: str
+    width: int
+    height: int
+    mode: str
+    bit_depth: int
+    frames: int = 1
+
 class AnalysisResult(BaseModel):
     id: str
     predictions: List[PredictionResult]
@@ -56,12 +70,43 @@ class AnalysisResult(BaseModel):
     requires_immediate_attention: bool
     analysis_timestamp: datetime
     image_path: Optional[str] = None
+    image_metadata: Optional[ImageMetadata] = None
 
 class AnalysisResponse(BaseModel):
     success: bool
     analysis: AnalysisResult
     message: str
 
+class BatchAnalysisItem(BaseModel):
+    """One NDJSON line of a streamed batch analysis"""
+    index: int
+    filename: Optional[str] = None
+    success: bool
+    analysis: Optional[AnalysisResult] = None
+    message: str
+
+class AnalysisJobItem(BaseModel):
+    """One image of a background analysis job"""
+    index: int
+    filename: Optional[str] = None
+    status: str  # "pending", "completed" or "failed"
+    success: bool
+    analysis: Optional[AnalysisResult] = None
+    message: Optional[str] = None
+
+class AnalysisJob(BaseModel):
+    """Status and progress of a background analysis job"""
+    id: str
+    status: str  # "queued", "running", "completed" or "failed"
+    priority: Priority
+    total: int
+    completed: int
+    failed: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    items: Optional[List[AnalysisJobItem]] = None
+
 # Symptom schemas
 class SymptomMatch(BaseModel):
     symptom: str
@@ -78,6 +123,17 @@ class SymptomAnalysisResponse(BaseModel):
     suggested_diseases: List[Disease]
     recommendations: List[str]
 
+class BulkTriageRequest(BaseModel):
+    """Symptom questionnaires to match in one call"""
+    records: List[SymptomAnalysisRequest]
+
+class TriageItem(BaseModel):
+    """One NDJSON line of a streamed bulk triage"""
+    index: int
+    success: bool
+    result: Optional[SymptomAnalysisResponse] = None
+    message: str
+
 # User schemas
 class UserBase(BaseModel):
     email: str
@@ -1,7 +1,6 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Form
-from fastapi.responses import JSONResponse
-from typing import List, Optional
-import aiofiles
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional, Tuple
 import os
 import uuid
 from datetime import datetime
@@ -10,17 +9,26 @@ from ..models.schemas import (
     AnalysisResponse, 
     AnalysisRequest, 
     AnalysisResult,
+    AnalysisJob,
+    BatchAnalysisItem,
     FileUploadResponse,
-    ErrorResponse
+    ErrorResponse,
+    Priority
 )
 from ..services.ml_service import MLService
 from ..services.firebase_service import firebase_service
+from ..services.analysis_jobs import job_manager
+from ..services.disease_catalog import disease_catalog
+from ..services.upload_ingest import ingest_upload, IngestedUpload, UploadTooLargeError
+from ..services.image_probe import probe_image, InvalidImageError
 from ..core.config import settings
+from ..core.startup import require_stage
+from ..core.admission import admission, OverloadedError
 
 router = APIRouter()
 
 # Dependency to get ML service
-async def get_ml_service() -> MLService:
+async def get_ml_service(_=Depends(require_stage("ml_models"))) -> MLService:
     from ..main import ml_service
     if ml_service is None:
         raise HTTPException(status_code=503, detail="ML service not available")
@@ -38,6 +46,7 @@ async def analyze_xray(
     """
     Upload and analyze chest X-ray image for lung disease detection
     """
+    upload = None
     try:
         # Validate file type
         if file.content_type not in settings.ALLOWED_IMAGE_TYPES:
@@ -46,16 +55,20 @@ async def analyze_xray(
                 detail=f"Invalid file type. Allowed types: {', '.join(settings.ALLOWED_IMAGE_TYPES)}"
             )
         
-        # Validate file size
-        file_content = await file.read()
-        if len(file_content) > settings.MAX_FILE_SIZE:
+        # Read in chunks, validating file size and hashing as we go
+        try:
+            upload = await ingest_upload(file)
+        except UploadTooLargeError:
             raise HTTPException(
                 status_code=400,
                 detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / (1024*1024):.1f}MB"
             )
         
-        # Reset file pointer
-        await file.seek(0)
+        # Check magic bytes and image header before any pixel decode
+        try:
+            upload.metadata = probe_image(upload.spool)
+        except InvalidImageError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
         
         # Prepare patient info
         patient_info = {}
@@ -69,7 +82,9 @@ async def analyze_xray(
             patient_info["medical_history"] = [h.strip() for h in medical_history.split(",")]
         
         # Perform ML analysis
-        analysis_result = await ml_service.predict_lung_disease(file_content, patient_info)
+        analysis_result = await ml_service.predict_lung_disease(
+            await upload.read_async(), patient_info, digest=upload.digest, image_metadata=upload.metadata
+        )
         
         # Save uploaded file
         file_id = str(uuid.uuid4())
@@ -77,88 +92,183 @@ async def analyze_xray(
         saved_filename = f"{file_id}.{file_extension}"
         file_path = f"uploads/{saved_filename}"
         
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(file_content)
-        
-        # Update analysis result with file path
-        analysis_result.image_path = file_path
-        
-        # Save analysis to Firebase
-        try:
-            await firebase_service.save_analysis(analysis_result)
-        except Exception as e:
-            # Log error but don't fail the request
-            print(f"Warning: Failed to save analysis to Firebase: {e}")
+        async with admission.slot("persist"):
+            await upload.save_to(file_path)
+            
+            # Update analysis result with file path
+            analysis_result.image_path = file_path
+            
+            # Queue the analysis for Firebase (written in the background)
+            try:
+                await firebase_service.save_analysis(analysis_result)
+            except Exception as e:
+                # Log error but don't fail the request
+                print(f"Warning: Failed to save analysis to Firebase: {e}")
         
         return AnalysisResponse(
             success=True,
             analysis=analysis_result,
             message="X-ray analysis completed successfully"
         )
-        
-    except HTTPException:
+    
+    except (HTTPException, OverloadedError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    finally:
+        if upload is not None:
+            upload.close()
+
+async def _ingest_batch(files: List[UploadFile]) -> Tuple[List[Tuple[int, IngestedUpload]], List[BatchAnalysisItem]]:
+    """Validate each file of a batch and take ownership of its contents.
+    
+    The request's upload files are closed before a streamed response body
+    (or a background job) reads them. Returns the accepted uploads with their
+    indices and a failed item for every rejected file.
+    """
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {settings.MAX_BATCH_FILES} files allowed per batch"
+        )
+    
+    rejected = []
+    accepted = []
+    for index, file in enumerate(files):
+        if file.content_type not in settings.ALLOWED_IMAGE_TYPES:
+            rejected.append(BatchAnalysisItem(
+                index=index,
+                filename=file.filename,
+                success=False,
+                message=f"Invalid file type for {file.filename}"
+            ))
+            continue
+        
+        try:
+            upload = await ingest_upload(file)
+        except UploadTooLargeError:
+            rejected.append(BatchAnalysisItem(
+                index=index,
+                filename=file.filename,
+                success=False,
+                message=f"File {file.filename} too large"
+            ))
+            continue
+        
+        try:
+            upload.metadata = probe_image(upload.spool)
+        except InvalidImageError as e:
+            upload.close()
+            rejected.append(BatchAnalysisItem(
+                index=index,
+                filename=file.filename,
+                success=False,
+                message=f"Invalid image {file.filename}: {str(e)}"
+            ))
+            continue
+        
+        accepted.append((index, upload))
+    
+    return accepted, rejected
 
-@router.post("/batch-analyze", response_model=List[AnalysisResponse])
+@router.post("/batch-analyze")
 async def batch_analyze_xrays(
     files: List[UploadFile] = File(...),
+    priority: Priority = Form(Priority.BATCH),
     ml_service: MLService = Depends(get_ml_service)
 ):
     """
     Analyze multiple X-ray images in batch
-    """
-    if len(files) > 10:  # Limit batch size
-        raise HTTPException(status_code=400, detail="Maximum 10 files allowed per batch")
     
-    results = []
+    Results are streamed as NDJSON (one BatchAnalysisItem per line) in the
+    order files finish, so clients can consume them while the batch runs.
+    Images are scheduled in the ``batch`` lane by default (``background`` for
+    re-screening jobs), so they yield to interactive single uploads.
+    """
+    accepted, rejected = await _ingest_batch(files)
     
-    for file in files:
+    async def stream_results():
         try:
-            # Validate each file
-            if file.content_type not in settings.ALLOWED_IMAGE_TYPES:
-                results.append(AnalysisResponse(
-                    success=False,
-                    analysis=None,
-                    message=f"Invalid file type for {file.filename}"
-                ))
-                continue
-            
-            file_content = await file.read()
-            if len(file_content) > settings.MAX_FILE_SIZE:
-                results.append(AnalysisResponse(
-                    success=False,
-                    analysis=None,
-                    message=f"File {file.filename} too large"
-                ))
-                continue
-            
-            # Analyze image
-            analysis_result = await ml_service.predict_lung_disease(file_content)
-            
-            # Save to Firebase (optional for batch)
-            try:
-                await firebase_service.save_analysis(analysis_result)
-            except Exception as e:
-                print(f"Warning: Failed to save batch analysis to Firebase: {e}")
-            
-            results.append(AnalysisResponse(
-                success=True,
-                analysis=analysis_result,
-                message=f"Analysis completed for {file.filename}"
-            ))
+            for item in rejected:
+                yield item.model_dump_json() + "\n"
             
-        except Exception as e:
-            results.append(AnalysisResponse(
-                success=False,
-                analysis=None,
-                message=f"Failed to analyze {file.filename}: {str(e)}"
-            ))
+            uploads = [upload for _, upload in accepted]
+            async for position, result in ml_service.iter_batch_analyze(uploads, priority=priority):
+                index, upload = accepted[position]
+                filename = upload.filename
+                if isinstance(result, Exception):
+                    item = BatchAnalysisItem(
+                        index=index,
+                        filename=filename,
+                        success=False,
+                        message=f"Failed to analyze {filename}: {str(result)}"
+                    )
+                else:
+                    # Queue the Firebase write (optional for batch; skipped when the write queue is full)
+                    try:
+                        await firebase_service.save_analysis(result)
+                    except Exception as e:
+                        print(f"Warning: Failed to save batch analysis to Firebase: {e}")
+                    
+                    item = BatchAnalysisItem(
+                        index=index,
+                        filename=filename,
+                        success=True,
+                        analysis=result,
+                        message=f"Analysis completed for {filename}"
+                    )
+                yield item.model_dump_json() + "\n"
+        finally:
+            for _, upload in accepted:
+                upload.close()
     
-    return results
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
-@router.get("/history/{analysis_id}")
+@router.post("/jobs", response_model=AnalysisJob, status_code=202, dependencies=[Depends(get_ml_service)])
+async def submit_analysis_job(
+    files: List[UploadFile] = File(...),
+    priority: Priority = Form(Priority.BATCH)
+):
+    """
+    Submit X-ray images for background analysis
+    
+    Returns the job at once; poll ``GET /jobs/{job_id}`` for results or follow
+    ``GET /jobs/{job_id}/events`` for progress. Jobs survive a restart.
+    """
+    accepted, rejected = await _ingest_batch(files)
+    try:
+        return await job_manager.submit(accepted, rejected, priority)
+    finally:
+        for _, upload in accepted:
+            upload.close()
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJob)
+async def get_analysis_job(job_id: str, include_items: bool = True):
+    """
+    Get a background analysis job's progress and the results finished so far
+    """
+    job = await job_manager.get_job(job_id, include_items=include_items)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def stream_analysis_job_events(job_id: str):
+    """
+    Stream a background analysis job's progress as Server-Sent Events
+    
+    Sends a ``progress`` event with the current counts, an ``item`` event as
+    each image finishes, and a final ``done`` event.
+    """
+    if await job_manager.get_job(job_id, include_items=False) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        job_manager.events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/history/{analysis_id}", dependencies=[Depends(require_stage("firebase"))])
 async def get_analysis_history(analysis_id: str):
     """
     Get analysis history by ID from Firebase
@@ -186,7 +296,21 @@ async def get_supported_formats():
     return {
         "supported_formats": settings.ALLOWED_IMAGE_TYPES,
         "max_file_size_mb": settings.MAX_FILE_SIZE / (1024 * 1024),
-        "max_batch_size": 10,
+        "max_image_pixels": settings.IMAGE_MAX_PIXELS,
+        "max_batch_size": settings.MAX_BATCH_FILES,
         "confidence_threshold": settings.CONFIDENCE_THRESHOLD,
         "firebase_enabled": True
-    } 
\ No newline at end of file
+    }
+
+@router.get("/stats")
+async def get_inference_stats(ml_service: MLService = Depends(get_ml_service)):
+    """
+    Get inference pipeline statistics (batch sizes, queue wait, admission control, write queue, catalog)
+    """
+    return {
+        **ml_service.get_stats(),
+        "admission": admission.get_stats(),
+        "jobs": job_manager.get_stats(),
+        "persistence": firebase_service.get_write_stats(),
+        "catalog": disease_catalog.get_stats()
+    }
\ No newline at end of file
@@ -3,8 +3,10 @@ from typing import List, Optional
 
 from ..models.schemas import Disease, SeverityLevel
 from ..services.disease_service import DiseaseService
+from ..core.startup import require_stage
 
-router = APIRouter()
+# The catalog only needs Firestore, so it serves while models are still loading
+router = APIRouter(dependencies=[Depends(require_stage("firebase"))])
 
 # Dependency to get disease service
 def get_disease_service() -> DiseaseService:
@@ -48,15 +50,17 @@ async def get_disease_by_name(
 @router.get("/search/", response_model=List[Disease])
 async def search_diseases(
     q: str = Query(..., description="Search query for diseases"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of results"),
     disease_service: DiseaseService = Depends(get_disease_service)
 ):
     """
-    Search diseases by name, description, or symptoms
+    Search diseases by name, description, symptoms, risk factors or prevention,
+    ranked by relevance (prefix and typo tolerant)
     """
     if len(q.strip()) < 2:
         raise HTTPException(status_code=400, detail="Search query must be at least 2 characters")
     
-    diseases = await disease_service.search_diseases(q)
+    diseases = await disease_service.search_diseases(q, limit)
     return diseases
 
 @router.get("/severity/{severity_level}", response_model=List[Disease])
@@ -1,15 +1,25 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Sequence, Tuple
+import asyncio
+
+import numpy as np
 
 from ..models.schemas import (
     SymptomAnalysisRequest, 
     SymptomAnalysisResponse, 
     SymptomMatch,
-    Disease
+    BulkTriageRequest,
+    TriageItem,
+    Disease,
+    SeverityLevel
 )
 from ..services.disease_service import DiseaseService
+from ..core.config import settings
+from ..core.startup import require_stage
 
-router = APIRouter()
+# The catalog only needs Firestore, so it serves while models are still loading
+router = APIRouter(dependencies=[Depends(require_stage("firebase"))])
 
 # Dependency to get disease service
 def get_disease_service() -> DiseaseService:
@@ -26,42 +36,18 @@ async def match_symptoms_to_diseases(
     if not request.symptoms:
         raise HTTPException(status_code=400, detail="At least one symptom is required")
     
-    # Get symptom matches
-    symptom_matches_data = await disease_service.match_symptoms_to_diseases(request.symptoms)
+    # Match every symptom against the catalog in one pass
+    symptom_matches_data, suggested_diseases = await disease_service.match_symptoms(request.symptoms)
     
     # Convert to SymptomMatch objects
-    symptom_matches = []
-    all_matching_diseases = set()
-    
-    for match_data in symptom_matches_data:
-        symptom_match = SymptomMatch(
+    symptom_matches = [
+        SymptomMatch(
             symptom=match_data["symptom"],
             diseases=match_data["matching_diseases"],
             match_score=min(1.0, match_data["match_count"] / 4.0)  # Normalize to 0-1 scale
         )
-        symptom_matches.append(symptom_match)
-        all_matching_diseases.update(match_data["matching_diseases"])
-    
-    # Get disease details for matched diseases
-    suggested_diseases = []
-    for disease_name in all_matching_diseases:
-        disease = await disease_service.get_disease_by_name(disease_name)
-        if disease:
-            suggested_diseases.append(disease)
-    
-    # Sort diseases by how many symptoms they match
-    disease_match_scores = {}
-    for disease in suggested_diseases:
-        score = 0
-        for symptom in request.symptoms:
-            for disease_symptom in disease.symptoms:
-                if symptom.lower() in disease_symptom.lower() or disease_symptom.lower() in symptom.lower():
-                    score += 1
-                    break
-        disease_match_scores[disease.name] = score
-    
-    # Sort by match score
-    suggested_diseases.sort(key=lambda d: disease_match_scores.get(d.name, 0), reverse=True)
+        for match_data in symptom_matches_data
+    ]
     
     # Generate recommendations
     recommendations = _generate_symptom_recommendations(request.symptoms, suggested_diseases, request.age)
@@ -72,6 +58,109 @@ async def match_symptoms_to_diseases(
         recommendations=recommendations
     )
 
+@router.post("/triage")
+async def bulk_triage(
+    request: BulkTriageRequest,
+    disease_service: DiseaseService = Depends(get_disease_service)
+):
+    """
+    Match many symptom questionnaires in one call
+    
+    Results are streamed as NDJSON, one TriageItem per record in input order,
+    each carrying the same response as ``/match``. The questionnaires are
+    encoded as a sparse patient × symptom matrix and scored against the
+    catalog a chunk at a time, in a worker thread; every distinct symptom is
+    matched once per request.
+    """
+    records = request.records
+    if not records:
+        raise HTTPException(status_code=400, detail="At least one record is required")
+    if len(records) > settings.MAX_TRIAGE_RECORDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {settings.MAX_TRIAGE_RECORDS} records allowed per triage"
+        )
+    
+    snapshot = disease_service.snapshot
+    # Matching and scoring are CPU-bound; they run in a thread, off the event loop
+    batch = await asyncio.to_thread(snapshot.matcher.match_batch, [record.symptoms for record in records])
+    
+    def rule_inputs():
+        """Rule inputs, computed once per distinct symptom, disease and record"""
+        severe = np.array([disease.severity in (SeverityLevel.HIGH, SeverityLevel.CRITICAL) for disease in snapshot.diseases], dtype=bool)
+        emergency = np.array([_is_emergency(term) for term in batch.terms], dtype=np.int32)
+        ages = np.array([record.age or 0 for record in records], dtype=np.int64)  # Like ``if age:``, 0 means unknown
+        return severe, emergency, ages
+    
+    severe, emergency, ages = await asyncio.to_thread(rule_inputs)
+    
+    # Matching diseases and score of each distinct symptom, built on first use
+    term_matches = {}
+    
+    def symptom_match(term: int, symptom: str) -> Optional[SymptomMatch]:
+        if term not in term_matches:
+            diseases = [snapshot.diseases[column].name for column in np.flatnonzero(batch.hits[term])]
+            term_matches[term] = (diseases, min(1.0, len(diseases) / 4.0))  # Normalize to 0-1 scale
+        diseases, match_score = term_matches[term]
+        if not diseases:
+            return None
+        return SymptomMatch(symptom=symptom, diseases=diseases, match_score=match_score)
+    
+    def render_chunk(start: int, stop: int) -> str:
+        """NDJSON lines of a range of records (blocking)"""
+        scores = batch.scores(start, stop)
+        
+        # Recommendation rules for the whole chunk
+        if len(snapshot.diseases):
+            top = scores.argmax(axis=1)  # First of equal scores, as in the catalog-ordered /match ranking
+            severe_top = np.where((scores[np.arange(stop - start), top] > 0) & severe[top], top, -1)
+        else:
+            severe_top = np.full(stop - start, -1, dtype=np.int64)
+        recommendations, advice = _generate_bulk_symptom_recommendations(
+            has_emergency=batch.patient_sums(emergency, start, stop) > 0,
+            symptom_counts=batch.symptom_counts(start, stop),
+            severe_top=severe_top,
+            ages=ages[start:stop],
+            diseases=snapshot.diseases
+        )
+        
+        lines = []
+        for offset in range(stop - start):
+            index = start + offset
+            record = records[index]
+            if not record.symptoms:
+                item = TriageItem(index=index, success=False, message="At least one symptom is required")
+                lines.append(item.model_dump_json() + "\n")
+                continue
+            
+            terms = batch.indices[batch.indptr[index]:batch.indptr[index + 1]]
+            matches = [symptom_match(int(term), symptom) for term, symptom in zip(terms, record.symptoms)]
+            
+            # Matched diseases by score; ties keep catalog order
+            row = scores[offset]
+            columns = np.flatnonzero(row)
+            columns = columns[np.argsort(-row[columns], kind="stable")]
+            
+            item = TriageItem(
+                index=index,
+                success=True,
+                result=SymptomAnalysisResponse(
+                    matches=[match for match in matches if match is not None],
+                    suggested_diseases=[snapshot.diseases[column] for column in columns],
+                    recommendations=recommendations[advice[offset]]
+                ),
+                message="Triage completed"
+            )
+            lines.append(item.model_dump_json() + "\n")
+        return "".join(lines)
+    
+    async def stream_results():
+        chunk_size = max(1, settings.TRIAGE_CHUNK_SIZE)
+        for start in range(0, len(records), chunk_size):
+            yield await asyncio.to_thread(render_chunk, start, min(start + chunk_size, len(records)))
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @router.get("/common-symptoms")
 async def get_common_symptoms():
     """
@@ -141,20 +230,28 @@ async def get_symptom_categories():
         "emergency_note": "If experiencing 'concerning' symptoms, seek immediate medical attention"
     }
 
+EMERGENCY_SYMPTOMS = [
+    "coughing up blood", "severe chest pain", "extreme shortness of breath",
+    "high fever", "difficulty breathing", "blood in cough"
+]
+
+GENERAL_ADVICE = [
+    "Monitor symptoms and track any changes",
+    "Maintain good hygiene practices",
+    "Get adequate rest and stay hydrated",
+    "Avoid smoking and secondhand smoke"
+]
+
+def _is_emergency(symptom_lower: str) -> bool:
+    """Whether a lowercased symptom mentions an emergency symptom"""
+    return any(emergency in symptom_lower for emergency in EMERGENCY_SYMPTOMS)
+
 def _generate_symptom_recommendations(symptoms: List[str], diseases: List[Disease], age: int = None) -> List[str]:
     """Generate recommendations based on symptoms and matched diseases"""
     recommendations = []
     
     # Check for emergency symptoms
-    emergency_symptoms = [
-        "coughing up blood", "severe chest pain", "extreme shortness of breath",
-        "high fever", "difficulty breathing", "blood in cough"
-    ]
-    
-    has_emergency = any(
-        any(emergency in symptom.lower() for emergency in emergency_symptoms)
-        for symptom in symptoms
-    )
+    has_emergency = any(_is_emergency(symptom.lower()) for symptom in symptoms)
     
     if has_emergency:
         recommendations.append("⚠️ URGENT: Seek immediate medical attention due to concerning symptoms")
@@ -177,11 +274,50 @@ def _generate_symptom_recommendations(symptoms: List[str], diseases: List[Diseas
             recommendations.append("Young children require immediate pediatric evaluation")
     
     # General health advice
-    recommendations.extend([
-        "Monitor symptoms and track any changes",
-        "Maintain good hygiene practices",
-        "Get adequate rest and stay hydrated",
-        "Avoid smoking and secondhand smoke"
-    ])
-    
-    return recommendations 
\ No newline at end of file
+    recommendations.extend(GENERAL_ADVICE)
+    
+    return recommendations
+
+def _generate_bulk_symptom_recommendations(
+    has_emergency: np.ndarray,
+    symptom_counts: np.ndarray,
+    severe_top: np.ndarray,
+    ages: np.ndarray,
+    diseases: Sequence[Disease]
+) -> Tuple[List[List[str]], np.ndarray]:
+    """The rules of ``_generate_symptom_recommendations``, evaluated for many patients at once.
+    
+    ``severe_top`` is each patient's top matched disease column when it is
+    high or critical severity, else -1; ``ages`` uses 0 for unknown. The rules
+    are evaluated as arrays and packed into one key per patient, so a list is
+    built only for each distinct outcome. Returns those lists and the index of
+    each patient's list.
+    """
+    rules = np.stack([
+        has_emergency,
+        symptom_counts >= 3,
+        ages >= 65,
+        (ages != 0) & (ages <= 5) & (ages < 65)
+    ], axis=1)
+    keys = (rules @ (1 << np.arange(rules.shape[1]))) * (len(diseases) + 1) + severe_top + 1
+    distinct, patients = np.unique(keys, return_inverse=True)
+    
+    recommendations = []
+    for key in distinct.tolist():
+        flags, column = divmod(key, len(diseases) + 1)
+        emergency, multiple, elderly, young = (bool(flags >> bit & 1) for bit in range(4))
+        advice = []
+        if emergency:
+            advice.append("⚠️ URGENT: Seek immediate medical attention due to concerning symptoms")
+            advice.append("Visit emergency room or call emergency services")
+        if multiple:
+            advice.append("Multiple symptoms detected - schedule appointment with healthcare provider")
+        if column:
+            advice.append(f"Symptoms may indicate {diseases[column - 1].name} - requires medical evaluation")
+        if elderly:
+            advice.append("Age 65+ increases risk - prioritize medical consultation")
+        elif young:
+            advice.append("Young children require immediate pediatric evaluation")
+        advice.extend(GENERAL_ADVICE)
+        recommendations.append(advice)
+    return recommendations, patients.reshape(-1)
@@ -0,0 +1,505 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from datetime import datetime
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from ..core.config import settings
+from ..core.admission import OverloadedError
+from ..models.schemas import AnalysisResult, BatchAnalysisItem, ImageMetadata, Priority
+from .upload_ingest import IngestedUpload
+from .firebase_service import firebase_service
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    owner TEXT,
+    lease_until REAL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    item_index INTEGER NOT NULL,
+    filename TEXT,
+    image_path TEXT,
+    digest TEXT,
+    image_metadata TEXT,
+    status TEXT NOT NULL,
+    message TEXT,
+    result TEXT,
+    PRIMARY KEY (job_id, item_index)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+"""
+
+# Job and item states
+QUEUED, RUNNING, COMPLETED, FAILED, PENDING = "queued", "running", "completed", "failed", "pending"
+FINISHED_STATES = {COMPLETED, FAILED}
+
+# Columns of the public job view; the rest is bookkeeping of the running process
+JOB_FIELDS = ("id", "status", "priority", "total", "completed", "failed", "error", "created_at", "updated_at")
+
+class JobStore:
+    """Durable job state in SQLite (blocking; call from a thread)"""
+    
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            # Databases created before jobs were leased lack the lease columns
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+    
+    def create_job(self, job_id: str, priority: str, items: List[Dict[str, Any]], owner: str, lease_seconds: float):
+        """Insert a job, leased to its submitter, and its items in one transaction"""
+        now = datetime.now().isoformat()
+        failed = sum(1 for item in items if item["status"] == FAILED)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, priority, total, failed, created_at, updated_at, owner, lease_until)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, priority, len(items), failed, now, now, owner, time.time() + lease_seconds)
+            )
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, item_index, filename, image_path, digest, image_metadata, status, message)"
+                " VALUES (:job_id, :index, :filename, :image_path, :digest, :image_metadata, :status, :message)",
+                [{"job_id": job_id, "image_path": None, "digest": None, "image_metadata": None, "message": None, **item}
+                 for item in items]
+            )
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job row as a dict (public fields only), or None"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+    
+    def get_items(self, job_id: str, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Items of a job in submission order, optionally filtered by status"""
+        query = "SELECT * FROM job_items WHERE job_id = ?"
+        params: Tuple = (job_id,)
+        if status is not None:
+            query += " AND status = ?"
+            params += (status,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY item_index", params).fetchall()
+        return [dict(row) for row in rows]
+    
+    def claim_job(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """Mark an unfinished job running under ``owner``; False if another live process holds it.
+        
+        A job can be claimed when it is unowned, already leased to ``owner``,
+        or its lease has expired (its process died or stalled).
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, updated_at = ?"
+                " WHERE id = ? AND status IN (?, ?)"
+                " AND (owner IS NULL OR owner = ? OR lease_until IS NULL OR lease_until < ?)",
+                (RUNNING, owner, now + lease_seconds, datetime.now().isoformat(), job_id, QUEUED, RUNNING, owner, now)
+            )
+        return cursor.rowcount == 1
+    
+    def claimable_jobs(self, owner: str) -> List[str]:
+        """Ids of unfinished jobs no live process holds, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?)"
+                " AND (owner IS NULL OR owner = ? OR lease_until IS NULL OR lease_until < ?) ORDER BY created_at",
+                (QUEUED, RUNNING, owner, time.time())
+            ).fetchall()
+        return [row["id"] for row in rows]
+    
+    def renew_leases(self, owner: str, lease_seconds: float) -> Set[str]:
+        """Extend the leases of the running jobs ``owner`` holds; returns their ids"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ?",
+                (time.time() + lease_seconds, owner, RUNNING)
+            )
+            rows = self._conn.execute("SELECT id FROM jobs WHERE owner = ? AND status = ?", (owner, RUNNING)).fetchall()
+        return {row["id"] for row in rows}
+    
+    def release_jobs(self, owner: str):
+        """Hand ``owner``'s unfinished jobs back to the queue for any process to resume"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, updated_at = ?"
+                " WHERE owner = ? AND status IN (?, ?)",
+                (QUEUED, datetime.now().isoformat(), owner, QUEUED, RUNNING)
+            )
+    
+    def finish_job(self, job_id: str, owner: str, status: str, error: Optional[str] = None):
+        """Set a job's final status, if ``owner`` still holds it"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, owner = NULL, lease_until = NULL, updated_at = ?"
+                " WHERE id = ? AND owner = ?",
+                (status, error, datetime.now().isoformat(), job_id, owner)
+            )
+    
+    def record_item(self, job_id: str, index: int, status: str, message: str, result: Optional[str] = None) -> bool:
+        """Store a pending item's outcome and bump the job's counters; False if it was already recorded"""
+        counter = "completed" if status == COMPLETED else "failed"
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET status = ?, message = ?, result = ? WHERE job_id = ? AND item_index = ? AND status = ?",
+                (status, message, result, job_id, index, PENDING)
+            )
+            if cursor.rowcount != 1:
+                return False
+            self._conn.execute(
+                f"UPDATE jobs SET {counter} = {counter} + 1, updated_at = ? WHERE id = ?",
+                (datetime.now().isoformat(), job_id)
+            )
+        return True
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class AnalysisJobManager:
+    """Runs analysis jobs in the background with durable, pollable progress.
+    
+    Submitted images are written to JOB_STORAGE_DIR and the job to SQLite
+    before the request returns, so jobs left unfinished by a restart resume
+    from their pending items. Each finished item is stored, written through
+    to Firestore and published to progress subscribers.
+    
+    Worker processes share the store. A process runs a job only after
+    claiming it, and keeps it by renewing a lease (``JOB_LEASE_SECONDS``); the
+    jobs of a process that stops renewing are claimed and resumed by another.
+    Progress streams also poll the store, so they follow jobs run elsewhere.
+    """
+    
+    def __init__(self, db_path: str, storage_dir: str, concurrency: int, lease_seconds: float = 60.0, poll_seconds: float = 1.0):
+        self.db_path = db_path
+        self.storage_dir = storage_dir
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.ml_service = None
+        self._owner: Optional[Tuple[int, str]] = None
+        self._store: Optional[JobStore] = None
+        self._runners: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.shed_retries = 0  # Items put back after the inference queue shed them
+    
+    @property
+    def owner(self) -> str:
+        """This process's lease holder id (a pre-forked worker gets its own, not its parent's)"""
+        if self._owner is None or self._owner[0] != os.getpid():
+            self._owner = (os.getpid(), f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}")
+        return self._owner[1]
+    
+    @property
+    def store(self) -> JobStore:
+        """The job store, opened on first use"""
+        if self._store is None:
+            self._store = JobStore(self.db_path)
+        return self._store
+    
+    async def start(self, ml_service):
+        """Attach the ML service, resume unclaimed jobs and keep this process's leases alive"""
+        self.ml_service = ml_service
+        await self._resume_unclaimed()
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+    
+    async def shutdown(self):
+        """Stop running jobs; they resume from their pending items in another process or on next start"""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        runners = list(self._runners.values())
+        for task in runners:
+            task.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+        if self._store is not None:
+            await asyncio.to_thread(self._store.release_jobs, self.owner)
+            self._store.close()
+            self._store = None
+    
+    async def submit(
+        self,
+        accepted: List[Tuple[int, IngestedUpload]],
+        rejected: List[BatchAnalysisItem],
+        priority: Priority = Priority.BATCH
+    ) -> Dict[str, Any]:
+        """Persist the images and job, start processing, and return the job"""
+        job_id = str(uuid.uuid4())
+        job_dir = os.path.join(self.storage_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        
+        items = []
+        for index, upload in accepted:
+            extension = upload.filename.split('.')[-1] if upload.filename and '.' in upload.filename else 'jpg'
+            image_path = os.path.join(job_dir, f"{index}.{extension}")
+            await upload.save_to(image_path)
+            items.append({
+                "index": index,
+                "filename": upload.filename,
+                "image_path": image_path,
+                "digest": upload.digest,
+                "image_metadata": upload.metadata.model_dump_json() if upload.metadata else None,
+                "status": PENDING
+            })
+        for item in rejected:
+            items.append({"index": item.index, "filename": item.filename, "status": FAILED, "message": item.message})
+        items.sort(key=lambda item: item["index"])
+        
+        await asyncio.to_thread(
+            self.store.create_job, job_id, Priority(priority).value, items, self.owner, self.lease_seconds
+        )
+        self._launch(job_id)
+        return await self.get_job(job_id, include_items=False)
+    
+    async def get_job(self, job_id: str, include_items: bool = True) -> Optional[Dict[str, Any]]:
+        """Job status with progress counts and, optionally, per-item results"""
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job is None:
+            return None
+        if include_items:
+            job["items"] = [self._item_view(item) for item in await asyncio.to_thread(self.store.get_items, job_id)]
+        return job
+    
+    async def events(self, job_id: str, keepalive_seconds: float = 15.0) -> AsyncIterator[str]:
+        """Server-Sent Events: the current state, one event per finished item, then ``done``.
+        
+        Items finished in this process are pushed as they finish; between them
+        the store is polled, so items finished by another worker process are
+        reported too.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            job = await self.get_job(job_id, include_items=False)
+            reported = {item["item_index"] for item in await asyncio.to_thread(self.store.get_items, job_id)
+                        if item["status"] != PENDING}
+            yield self._sse("progress", job)
+            idle = 0.0
+            while job["status"] not in FINISHED_STATES:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    # Catch up on progress made by other processes
+                    polled = await self.get_job(job_id, include_items=False)
+                    if (polled["completed"], polled["failed"]) != (job["completed"], job["failed"]):
+                        for item in await asyncio.to_thread(self.store.get_items, job_id):
+                            if item["status"] != PENDING and item["item_index"] not in reported:
+                                reported.add(item["item_index"])
+                                yield self._sse("item", {"job": polled, "item": self._event_item(item)})
+                        idle = 0.0
+                    elif polled["status"] not in FINISHED_STATES:
+                        idle += self.poll_seconds
+                        if idle >= keepalive_seconds:
+                            yield ": keepalive\n\n"
+                            idle = 0.0
+                    job = polled
+                    continue
+                if event == "item":
+                    if data["item"]["index"] in reported:
+                        continue
+                    reported.add(data["item"]["index"])
+                yield self._sse(event, data)
+                if event == "done":
+                    return
+                job = data["job"]
+                idle = 0.0
+            yield self._sse("done", job)
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Jobs running in this process and open progress streams"""
+        return {
+            "running_jobs": len(self._runners),
+            "progress_streams": sum(len(queues) for queues in self._subscribers.values()),
+            "shed_retries": self.shed_retries
+        }
+    
+    def _launch(self, job_id: str):
+        """Start the background runner for a job"""
+        if job_id in self._runners:
+            return
+        task = asyncio.create_task(self._run(job_id), name=f"analysis-job:{job_id}")
+        self._runners[job_id] = task
+        task.add_done_callback(lambda _: self._runners.pop(job_id, None))
+    
+    async def _resume_unclaimed(self):
+        """Start jobs no live process holds: left by a restart or by a worker that died"""
+        for job_id in await asyncio.to_thread(self.store.claimable_jobs, self.owner):
+            if job_id not in self._runners:
+                logger.info(f"Resuming analysis job {job_id}")
+                self._launch(job_id)
+    
+    async def _run_heartbeat(self):
+        """Renew this process's leases, drop jobs it lost, and pick up abandoned ones"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                held = await asyncio.to_thread(self.store.renew_leases, self.owner, self.lease_seconds)
+                for job_id, task in list(self._runners.items()):
+                    if job_id not in held and not task.done():
+                        # Our lease lapsed and another process claimed the job
+                        logger.warning(f"Lost the lease on analysis job {job_id}; stopping")
+                        task.cancel()
+                await self._resume_unclaimed()
+            except Exception as e:
+                logger.error(f"Analysis job heartbeat failed: {str(e)}")
+    
+    async def _run(self, job_id: str):
+        """Claim a job, then analyze its pending items with bounded concurrency"""
+        if not await asyncio.to_thread(self.store.claim_job, job_id, self.owner, self.lease_seconds):
+            return  # Another process runs it
+        try:
+            pending = await asyncio.to_thread(self.store.get_items, job_id, PENDING)
+            job = await asyncio.to_thread(self.store.get_job, job_id)
+            priority = Priority(job["priority"])
+            semaphore = asyncio.Semaphore(self.concurrency)
+            
+            async def analyze(item: Dict[str, Any]):
+                async with semaphore:
+                    await self._analyze_item(job_id, item, priority)
+            
+            await asyncio.gather(*(analyze(item) for item in pending))
+            await asyncio.to_thread(self.store.finish_job, job_id, self.owner, COMPLETED)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed: {str(e)}")
+            await asyncio.to_thread(self.store.finish_job, job_id, self.owner, FAILED, str(e))
+        
+        self._publish(job_id, "done", await self.get_job(job_id, include_items=False))
+    
+    async def _analyze_item(self, job_id: str, item: Dict[str, Any], priority: Priority):
+        """Analyze one stored image and record its outcome"""
+        filename = item["filename"]
+        try:
+            image_data = await asyncio.to_thread(self._read_image, item["image_path"])
+            metadata = ImageMetadata.model_validate_json(item["image_metadata"]) if item["image_metadata"] else None
+            result = await self._predict(image_data, item["digest"], metadata, priority)
+            result.image_path = item["image_path"]
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status, message, result = FAILED, f"Failed to analyze {filename}: {str(e)}", None
+            # Nothing refers to the image of a failed item
+            await asyncio.to_thread(self._remove_image, item["image_path"])
+        else:
+            status, message = COMPLETED, f"Analysis completed for {filename}"
+            try:
+                await firebase_service.save_analysis(result)
+            except Exception as e:
+                logger.warning(f"Failed to save job analysis to Firebase: {e}")
+        
+        recorded = await asyncio.to_thread(
+            self.store.record_item, job_id, item["item_index"], status, message,
+            result.model_dump_json() if result is not None else None
+        )
+        
+        if recorded and job_id in self._subscribers:
+            self._publish(job_id, "item", {
+                "job": await self.get_job(job_id, include_items=False),
+                "item": {"index": item["item_index"], "filename": filename, "success": status == COMPLETED,
+                         "analysis": json.loads(result.model_dump_json()) if result is not None else None,
+                         "message": message}
+            })
+    
+    async def _predict(self, image_data: bytes, digest: Optional[str], metadata: Optional[ImageMetadata], priority: Priority) -> AnalysisResult:
+        """Analyze an image, waiting out load shedding instead of failing the item"""
+        attempt = 0
+        while True:
+            try:
+                return await self.ml_service.predict_lung_disease(
+                    image_data, digest=digest, image_metadata=metadata, priority=priority
+                )
+            except OverloadedError as e:
+                # The lane is full for now; a durable job can wait its turn
+                self.shed_retries += 1
+                await asyncio.sleep(min(max(e.retry_after, 0.1) * 2 ** min(attempt, 5), 30.0))
+                attempt += 1
+    
+    def _publish(self, job_id: str, event: str, data: Dict[str, Any]):
+        """Send an event to every progress stream of a job"""
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait((event, data))
+    
+    @staticmethod
+    def _read_image(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+    
+    @staticmethod
+    def _remove_image(path: Optional[str]):
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    @staticmethod
+    def _item_view(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Public view of an item row"""
+        return {
+            "index": item["item_index"],
+            "filename": item["filename"],
+            "status": item["status"],
+            "success": item["status"] == COMPLETED,
+            "analysis": AnalysisResult.model_validate_json(item["result"]) if item["result"] else None,
+            "message": item["message"]
+        }
+    
+    @staticmethod
+    def _event_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        """An item row as sent in ``item`` events"""
+        return {
+            "index": item["item_index"],
+            "filename": item["filename"],
+            "success": item["status"] == COMPLETED,
+            "analysis": json.loads(item["result"]) if item["result"] else None,
+            "message": item["message"]
+        }
+    
+    @staticmethod
+    def _sse(event: str, data: Dict[str, Any]) -> str:
+        """Format one Server-Sent Event"""
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+# Global job manager
+job_manager = AnalysisJobManager(
+    settings.JOB_DB_PATH,
+    settings.JOB_STORAGE_DIR,
+    settings.BATCH_CONCURRENCY,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    poll_seconds=settings.JOB_PROGRESS_POLL_SECONDS
+)
@@ -0,0 +1,198 @@
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+
+from ..core.config import settings
+from ..models.schemas import Disease, SeverityLevel
+from .firebase_service import firebase_service
+from .disease_search import SearchIndex
+from .symptom_matcher import SymptomMatcher
+
+logger = logging.getLogger(__name__)
+
+class CatalogSnapshot:
+    """An immutable view of the disease catalog with lookup indexes.
+    
+    Built once per catalog version and shared by every request; callers must
+    treat the models as read-only. A refresh builds a new snapshot and swaps
+    it in, so a request that holds one sees a consistent catalog.
+    """
+    
+    def __init__(self, diseases: List[Disease], version: int = 0, fingerprint: str = "", loaded_at: Optional[datetime] = None):
+        self.diseases: Tuple[Disease, ...] = tuple(sorted(diseases, key=lambda disease: disease.id))
+        self.version = version
+        self.fingerprint = fingerprint
+        self.loaded_at = loaded_at
+        self.by_id: Mapping[int, Disease] = MappingProxyType({disease.id: disease for disease in self.diseases})
+        self.by_name: Mapping[str, Disease] = MappingProxyType({disease.name: disease for disease in self.diseases})
+        self.by_severity: Mapping[SeverityLevel, Tuple[Disease, ...]] = MappingProxyType({
+            level: tuple(disease for disease in self.diseases if disease.severity == level) for level in SeverityLevel
+        })
+        self.matcher = SymptomMatcher(self.diseases)
+    
+    def __len__(self) -> int:
+        return len(self.diseases)
+
+def _to_disease(data: Dict[str, Any], loaded_at: datetime) -> Disease:
+    """Convert a stored document to a Disease model"""
+    return Disease(
+        id=data.get('id', 0),
+        name=data.get('name', ''),
+        description=data.get('description', ''),
+        severity=SeverityLevel(data.get('severity', 'moderate')),
+        symptoms=data.get('symptoms', []),
+        treatment=data.get('treatment'),
+        image_url=data.get('image_url'),
+        risk_factors=data.get('risk_factors', []),
+        prevention=data.get('prevention', []),
+        created_at=data.get('created_at') or loaded_at
+    )
+
+def _fingerprint(documents: List[Dict[str, Any]]) -> str:
+    """Content hash of the catalog documents, to skip rebuilding an unchanged catalog"""
+    encoded = json.dumps(
+        sorted(documents, key=lambda data: str(data.get('firestore_id', data.get('id')))),
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+class DiseaseCatalog:
+    """Holds the current catalog snapshot and keeps it up to date.
+    
+    The catalog is read from storage once at startup. It is reloaded when the
+    storage backend reports a change to the ``diseases`` collection (a
+    Firestore snapshot listener) and, as a fallback, on a fixed interval; a
+    reload whose content hash matches the current snapshot is dropped.
+    """
+    
+    def __init__(self, watch_changes: bool = True, refresh_seconds: float = 300.0):
+        self.watch_changes = watch_changes
+        self.refresh_seconds = refresh_seconds
+        self.snapshot = CatalogSnapshot([])
+        self.search_index = SearchIndex()  # Kept in step with the snapshot
+        self._changed: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._unsubscribe: Optional[Callable[[], None]] = None
+        
+        # Catalog statistics
+        self.reloads = 0
+        self.swaps = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+    
+    @property
+    def loaded(self) -> bool:
+        """Whether a snapshot has been read from storage"""
+        return self.snapshot.loaded_at is not None
+    
+    async def start(self):
+        """Load the catalog, then keep it fresh in the background"""
+        loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        await self.refresh()
+        
+        if self.watch_changes:
+            try:
+                self._unsubscribe = firebase_service.storage.watch(
+                    firebase_service.diseases.collection,
+                    lambda: loop.call_soon_threadsafe(self._changed.set)
+                )
+            except Exception as e:
+                logger.warning(f"Catalog change notifications unavailable ({str(e)}); relying on periodic refresh")
+        
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+    
+    async def refresh(self) -> bool:
+        """Reload the catalog from storage; True if a new snapshot was swapped in"""
+        self.reloads += 1
+        try:
+            documents = await firebase_service.diseases.list_all()
+            fingerprint = _fingerprint(documents)
+            if self.loaded and fingerprint == self.snapshot.fingerprint:
+                return False
+            
+            loaded_at = datetime.now()
+            diseases = []
+            for data in documents:
+                try:
+                    diseases.append(_to_disease(data, loaded_at))
+                except Exception as e:
+                    logger.warning(f"Skipping invalid disease document {data.get('firestore_id', data.get('id'))}: {str(e)}")
+            
+            # Indexes and the symptom matcher are built off the event loop
+            loop = asyncio.get_running_loop()
+            snapshot = await loop.run_in_executor(
+                None, CatalogSnapshot, diseases, self.snapshot.version + 1, fingerprint, loaded_at
+            )
+            if not len(self.search_index):
+                # First build of a possibly large catalog
+                search_index = SearchIndex()
+                reindexed = await loop.run_in_executor(None, search_index.update, snapshot.diseases)
+                self.search_index = search_index
+            else:
+                # Only changed diseases are reindexed, in place and with no await
+                # before the swap, so searches never see a partial update
+                reindexed = self.search_index.update(snapshot.diseases)
+            
+            # Atomic swap: requests read either the old snapshot or the new one
+            self.snapshot = snapshot
+            self.swaps += 1
+            logger.info(f"📚 Disease catalog v{snapshot.version} loaded ({len(diseases)} diseases, {reindexed} reindexed)")
+            return True
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error(f"Failed to load disease catalog: {str(e)}")
+            return False
+    
+    async def _run(self):
+        """Reload on change notifications or when the refresh interval elapses"""
+        while True:
+            if not self.loaded:
+                timeout = settings.STARTUP_RETRY_AFTER_SECONDS  # Retry a failed first load soon
+            else:
+                timeout = self.refresh_seconds if self.refresh_seconds > 0 else None
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            await self.refresh()
+    
+    async def close(self):
+        """Stop listening for changes"""
+        if self._unsubscribe is not None:
+            try:
+                self._unsubscribe()
+            except Exception as e:
+                logger.warning(f"Failed to unsubscribe from catalog changes: {str(e)}")
+            self._unsubscribe = None
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Report the current snapshot and reload outcomes"""
+        return {
+            "version": self.snapshot.version,
+            "diseases": len(self.snapshot),
+            "loaded_at": self.snapshot.loaded_at.isoformat() if self.loaded else None,
+            "reloads": self.reloads,
+            "swaps": self.swaps,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "search_index": self.search_index.get_stats()
+        }
+
+# Global catalog instance
+disease_catalog = DiseaseCatalog(
+    watch_changes=settings.CATALOG_WATCH_CHANGES,
+    refresh_seconds=settings.CATALOG_REFRESH_SECONDS
+)
@@ -0,0 +1,240 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+import bisect
+import math
+import re
+
+from ..models.schemas import Disease
+
+# Relative weight of a term by the field it occurs in
+FIELD_WEIGHTS = {
+    'name': 5.0,
+    'symptoms': 3.0,
+    'risk_factors': 1.5,
+    'description': 1.0,
+    'prevention': 1.0,
+}
+
+# Score multiplier by how a query token matched an indexed term
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.7
+TYPO_MATCH = 0.5
+
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSIONS = 64  # Indexed terms a short prefix may expand to
+MIN_TYPO_LENGTH = 4  # Shorter tokens must match exactly or by prefix
+
+STOPWORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'for', 'from', 'in',
+    'is', 'it', 'may', 'of', 'on', 'or', 'that', 'the', 'to', 'with'
+})
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def _stem(token: str) -> str:
+    """Strip a plural "s" so "lung" and "lungs" index alike"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, lightly stemmed word tokens of a text, without stopwords"""
+    return [_stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def _max_typos(term: str) -> int:
+    """Edits tolerated for a term of this length"""
+    if len(term) < MIN_TYPO_LENGTH:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+def _delete_depth(term: str) -> int:
+    """Deletions indexed for a term: enough to meet any token allowed to be that many typos away"""
+    return 2 if len(term) >= 6 else 1
+
+def _deletes(term: str, depth: int) -> Set[str]:
+    """Every string obtained by deleting up to ``depth`` characters from a term"""
+    variants = {term}
+    frontier = {term}
+    for _ in range(depth):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+def edit_distance(a: str, b: str) -> int:
+    """Edit distance counting insertions, deletions, substitutions and adjacent transpositions"""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+class SearchIndex:
+    """Inverted index over the disease catalog for ranked full-text search.
+    
+    Terms from each disease's name, description, symptoms, risk factors and
+    prevention advice are weighted by field; queries match terms exactly, by
+    prefix, or within one or two typos (through a symmetric-delete index, so
+    fuzzy lookups do not scan the vocabulary). Results are ranked by weighted
+    term frequency times inverse document frequency, scaled by the share of
+    query tokens matched.
+    
+    ``update`` reindexes only the diseases whose text changed. It and
+    ``search`` are synchronous, so on the event loop a search never sees a
+    partial update.
+    """
+    
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._documents: Dict[int, Tuple[tuple, Dict[str, float]]] = {}
+        self._typo_index: Dict[str, Set[str]] = defaultdict(set)
+        self._sorted_terms: List[str] = []
+        self._sorted_dirty = False
+    
+    def __len__(self) -> int:
+        return len(self._documents)
+    
+    @staticmethod
+    def _signature(disease: Disease) -> tuple:
+        """The indexed text of a disease"""
+        return tuple(
+            (field, tuple(value) if isinstance(value, list) else value)
+            for field, value in ((field, getattr(disease, field)) for field in FIELD_WEIGHTS)
+        )
+    
+    @staticmethod
+    def _weighted_terms(disease: Disease) -> Dict[str, float]:
+        """Field-weighted frequency of each term in a disease"""
+        terms: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            value = getattr(disease, field) or ''
+            texts = value if isinstance(value, list) else [value]
+            for text in texts:
+                for token in tokenize(text):
+                    terms[token] += weight
+        return terms
+    
+    def update(self, diseases: Iterable[Disease]) -> int:
+        """Sync the index with a catalog; returns how many diseases were (re)indexed or removed"""
+        changed = 0
+        seen = set()
+        for disease in diseases:
+            seen.add(disease.id)
+            signature = self._signature(disease)
+            indexed = self._documents.get(disease.id)
+            if indexed is not None and indexed[0] == signature:
+                continue
+            self._remove(disease.id)
+            self._add(disease.id, signature, self._weighted_terms(disease))
+            changed += 1
+        for disease_id in [disease_id for disease_id in self._documents if disease_id not in seen]:
+            self._remove(disease_id)
+            changed += 1
+        return changed
+    
+    def _add(self, disease_id: int, signature: tuple, terms: Dict[str, float]):
+        self._documents[disease_id] = (signature, terms)
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                for variant in _deletes(term, _delete_depth(term)):
+                    self._typo_index[variant].add(term)
+                self._sorted_dirty = True
+            postings[disease_id] = weight
+    
+    def _remove(self, disease_id: int):
+        indexed = self._documents.pop(disease_id, None)
+        if indexed is None:
+            return
+        for term in indexed[1]:
+            postings = self._postings[term]
+            postings.pop(disease_id, None)
+            if not postings:
+                del self._postings[term]
+                for variant in _deletes(term, _delete_depth(term)):
+                    terms = self._typo_index.get(variant)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._typo_index[variant]
+                self._sorted_dirty = True
+    
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        """Indexed terms starting with a prefix (other than the prefix itself)"""
+        if self._sorted_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._sorted_dirty = False
+        start = bisect.bisect_right(self._sorted_terms, prefix)
+        terms = []
+        for term in self._sorted_terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+    
+    def _typo_terms(self, token: str) -> List[str]:
+        """Indexed terms within the tolerated edit distance of a token"""
+        max_typos = _max_typos(token)
+        if not max_typos:
+            return []
+        candidates = set()
+        for variant in _deletes(token, max_typos):
+            candidates |= self._typo_index.get(variant, set())
+        candidates.discard(token)
+        return [term for term in candidates if edit_distance(token, term) <= max_typos]
+    
+    def _expand(self, token: str) -> Dict[str, float]:
+        """Indexed terms a query token matches, with their match multiplier"""
+        matches: Dict[str, float] = {}
+        if len(token) >= MIN_PREFIX_LENGTH:
+            for term in self._prefix_terms(token):
+                matches[term] = PREFIX_MATCH
+        if token in self._postings:
+            matches[token] = EXACT_MATCH
+        else:
+            for term in self._typo_terms(token):
+                matches.setdefault(term, TYPO_MATCH)
+        return matches
+    
+    def search(self, query: str, limit: int = 50) -> List[Tuple[int, float]]:
+        """Ids of the diseases matching a query with their scores, best first"""
+        tokens = list(dict.fromkeys(tokenize(query) or TOKEN_PATTERN.findall(query.lower())))
+        if not tokens or not self._documents:
+            return []
+        
+        total = len(self._documents)
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        for token in tokens:
+            # Best match of this token per disease
+            token_scores: Dict[int, float] = {}
+            for term, multiplier in self._expand(token).items():
+                postings = self._postings[term]
+                idf = math.log(1.0 + total / len(postings))
+                for disease_id, weight in postings.items():
+                    score = multiplier * idf * weight
+                    if score > token_scores.get(disease_id, 0.0):
+                        token_scores[disease_id] = score
+            for disease_id, score in token_scores.items():
+                scores[disease_id] += score
+                matched[disease_id] += 1
+        
+        ranked = [
+            (disease_id, score * matched[disease_id] / len(tokens))
+            for disease_id, score in scores.items()
+        ]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Index size"""
+        return {
+            "documents": len(self._documents),
+            "terms": len(self._postings),
+            "typo_variants": len(self._typo_index)
+        }
@@ -1,73 +1,55 @@
-from typing import List, Optional, Dict
-from datetime import datetime
+from typing import List, Optional, Dict, Tuple
 
-from ..models.schemas import Disease, DiseaseCreate, DiseaseType, SeverityLevel
-from .firebase_service import firebase_service
+import numpy as np
+
+from ..models.schemas import Disease, SeverityLevel
+from .disease_catalog import CatalogSnapshot, DiseaseCatalog, disease_catalog
 
 class DiseaseService:
-    def __init__(self):
-        pass
+    """Catalog queries, answered from the in-memory catalog snapshot"""
+    
+    def __init__(self, catalog: Optional[DiseaseCatalog] = None):
+        self.catalog = catalog or disease_catalog
     
-    def _convert_firestore_to_disease(self, firestore_data: Dict) -> Disease:
-        """Convert Firestore document to Disease model"""
-        return Disease(
-            id=firestore_data.get('id', 0),
-            name=firestore_data.get('name', ''),
-            description=firestore_data.get('description', ''),
-            severity=SeverityLevel(firestore_data.get('severity', 'moderate')),
-            symptoms=firestore_data.get('symptoms', []),
-            treatment=firestore_data.get('treatment'),
-            image_url=firestore_data.get('image_url'),
-            risk_factors=firestore_data.get('risk_factors', []),
-            prevention=firestore_data.get('prevention', []),
-            created_at=datetime.now()  # Firestore timestamp conversion would be more complex
-        )
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """The current catalog; hold on to it for a consistent view across lookups"""
+        return self.catalog.snapshot
     
     async def get_all_diseases(self) -> List[Disease]:
-        """Get all diseases from Firebase"""
-        firestore_diseases = await firebase_service.get_all_diseases()
-        return [self._convert_firestore_to_disease(disease_data) for disease_data in firestore_diseases]
+        """Get all diseases"""
+        return list(self.snapshot.diseases)
     
     async def get_disease_by_id(self, disease_id: int) -> Optional[Disease]:
-        """Get disease by ID from Firebase"""
-        firestore_diseases = await firebase_service.get_all_diseases()
-        for disease_data in firestore_diseases:
-            if disease_data.get('id') == disease_id:
-                return self._convert_firestore_to_disease(disease_data)
-        return None
+        """Get disease by ID"""
+        return self.snapshot.by_id.get(disease_id)
     
     async def get_disease_by_name(self, name: str) -> Optional[Disease]:
-        """Get disease by name from Firebase"""
-        disease_data = await firebase_service.get_disease_by_name(name)
-        if disease_data:
-            return self._convert_firestore_to_disease(disease_data)
-        return None
+        """Get disease by name"""
+        return self.snapshot.by_name.get(name)
     
-    async def search_diseases(self, query: str) -> List[Disease]:
-        """Search diseases by name or symptoms in Firebase"""
-        firestore_diseases = await firebase_service.search_diseases(query)
-        return [self._convert_firestore_to_disease(disease_data) for disease_data in firestore_diseases]
+    async def search_diseases(self, query: str, limit: int = 50) -> List[Disease]:
+        """Search diseases by name, description, symptoms, risk factors or prevention, best match first"""
+        snapshot = self.snapshot
+        results = self.catalog.search_index.search(query, limit)
+        return [snapshot.by_id[disease_id] for disease_id, _ in results if disease_id in snapshot.by_id]
     
     async def get_diseases_by_severity(self, severity: SeverityLevel) -> List[Disease]:
-        """Get diseases by severity level from Firebase"""
-        all_diseases = await self.get_all_diseases()
-        return [disease for disease in all_diseases if disease.severity == severity]
+        """Get diseases by severity level"""
+        return list(self.snapshot.by_severity.get(severity, ()))
     
-    async def match_symptoms_to_diseases(self, symptoms: List[str]) -> List[Dict]:
-        """Match symptoms to possible diseases using Firebase data"""
-        all_diseases = await self.get_all_diseases()
-        symptom_matches = []
+    async def match_symptoms(self, symptoms: List[str]) -> Tuple[List[Dict], List[Disease]]:
+        """Match symptoms to diseases in one pass over the catalog's matcher.
         
-        for symptom in symptoms:
-            symptom_lower = symptom.lower()
-            matching_diseases = []
-            
-            for disease in all_diseases:
-                for disease_symptom in disease.symptoms:
-                    if symptom_lower in disease_symptom.lower() or disease_symptom.lower() in symptom_lower:
-                        matching_diseases.append(disease.name)
-                        break
-            
+        Returns the matching diseases of each symptom, and every matched
+        disease ordered by how many of the symptoms it matches.
+        """
+        snapshot = self.snapshot
+        matches = snapshot.matcher.match(symptoms)
+        
+        symptom_matches = []
+        for symptom, hits in zip(matches.symptoms, matches.hits):
+            matching_diseases = [snapshot.diseases[column].name for column in np.flatnonzero(hits)]
             if matching_diseases:
                 symptom_matches.append({
                     "symptom": symptom,
@@ -75,10 +57,18 @@ class DiseaseService:
                     "match_count": len(matching_diseases)
                 })
         
+        # Stable sort: ties keep catalog order
+        ranked = np.argsort(-matches.scores, kind="stable")
+        suggested_diseases = [snapshot.diseases[column] for column in ranked if matches.scores[column] > 0]
+        return symptom_matches, suggested_diseases
+    
+    async def match_symptoms_to_diseases(self, symptoms: List[str]) -> List[Dict]:
+        """Match symptoms to possible diseases"""
+        symptom_matches, _ = await self.match_symptoms(symptoms)
         return symptom_matches
     
     async def get_disease_recommendations(self, disease_name: str) -> Dict:
-        """Get treatment recommendations for a disease from Firebase"""
+        """Get treatment recommendations for a disease"""
         disease = await self.get_disease_by_name(disease_name)
         if not disease:
             return {}
@@ -90,4 +80,4 @@ class DiseaseService:
             "risk_factors": disease.risk_factors,
             "severity": disease.severity.value,
             "urgent_care_needed": disease.severity in [SeverityLevel.HIGH, SeverityLevel.CRITICAL]
-        } 
\ No newline at end of file
+        }
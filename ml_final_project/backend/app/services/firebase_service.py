@@ -1,66 +1,65 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
 from typing import List, Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
 import os
 import logging
+import asyncio
 from datetime import datetime
 
 from ..core.config import settings
 from ..models.schemas import Disease, AnalysisResult, SeverityLevel
+from .write_behind import WriteBehindQueue
+from .storage_backends import create_storage
 
 logger = logging.getLogger(__name__)
 
 class FirebaseService:
+    """Disease catalog and analysis persistence over the configured storage backend
+    (Firestore, or a local SQLite/in-memory stand-in selected by STORAGE_BACKEND)"""
+    
     def __init__(self):
-        self.db = None
-        self.app = None
-        
+        # Blocking storage calls run on this pool, sharing one client
+        self._executor = ThreadPoolExecutor(max_workers=settings.FIRESTORE_IO_THREADS, thread_name_prefix="storage")
+        self.storage = create_storage(settings.STORAGE_BACKEND, self._executor)
+        self.diseases = self.storage.diseases
+        self.analyses = self.storage.analyses
+        # Analysis results are written behind the request, in batches
+        self.write_queue = WriteBehindQueue(
+            self.storage.commit_writes,
+            max_batch_size=settings.FIRESTORE_BATCH_SIZE,
+            flush_interval_ms=settings.FIRESTORE_FLUSH_INTERVAL_MS,
+            max_pending=settings.FIRESTORE_WRITE_QUEUE_MAX,
+            max_retries=settings.FIRESTORE_WRITE_RETRIES,
+            retry_backoff_seconds=settings.FIRESTORE_RETRY_BACKOFF_SECONDS,
+            is_ready=lambda: self.storage.connected,
+            executor=self._executor
+        )
+    
     async def initialize(self):
-        """Initialize Firebase connection"""
+        """Connect to the storage backend"""
         try:
-            # Check if Firebase app is already initialized
-            if not firebase_admin._apps:
-                # Initialize Firebase
-                if os.path.exists(settings.FIREBASE_CREDENTIALS_PATH):
-                    cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
-                    self.app = firebase_admin.initialize_app(cred, {
-                        'projectId': settings.FIREBASE_PROJECT_ID,
-                    })
-                else:
-                    # Use default credentials (for deployment)
-                    self.app = firebase_admin.initialize_app()
-                
-                logger.info("✅ Firebase initialized successfully")
-            else:
-                self.app = firebase_admin.get_app()
-                logger.info("✅ Using existing Firebase app")
-            
-            # Get Firestore client
-            self.db = firestore.client()
+            # Importing and authenticating block; keep them off the event loop
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.storage.connect)
             
             # Initialize collections if they don't exist
             await self._initialize_collections()
-            
+        
         except Exception as e:
-            logger.error(f"❌ Failed to initialize Firebase: {str(e)}")
+            logger.error(f"❌ Failed to initialize {self.storage.name} storage: {str(e)}")
             raise
     
     async def _initialize_collections(self):
-        """Initialize Firestore collections with sample data if empty"""
+        """Initialize collections with sample data if empty"""
         try:
             # Check if diseases collection exists and has data
-            diseases_ref = self.db.collection('diseases')
-            diseases = diseases_ref.limit(1).get()
-            
-            if not diseases:
+            if await self.diseases.is_empty():
                 logger.info("📝 Initializing diseases collection...")
                 await self._create_sample_diseases()
-                
+        
         except Exception as e:
             logger.error(f"Failed to initialize collections: {str(e)}")
     
     async def _create_sample_diseases(self):
-        """Create sample diseases in Firestore"""
+        """Create sample diseases in storage"""
         sample_diseases = [
             {
                 'id': 1,
@@ -92,7 +91,7 @@ class FirebaseService:
                     'Don\'t smoke',
                     'Keep your immune system strong'
                 ],
-                'created_at': firestore.SERVER_TIMESTAMP
+                'created_at': self.storage.server_timestamp()
             },
             {
                 'id': 2,
@@ -128,7 +127,7 @@ class FirebaseService:
                     'Maintain good ventilation',
                     'Treat latent TB infection'
                 ],
-                'created_at': firestore.SERVER_TIMESTAMP
+                'created_at': self.storage.server_timestamp()
             },
             {
                 'id': 3,
@@ -164,7 +163,7 @@ class FirebaseService:
                     'Eat healthy diet',
                     'Exercise regularly'
                 ],
-                'created_at': firestore.SERVER_TIMESTAMP
+                'created_at': self.storage.server_timestamp()
             },
             {
                 'id': 4,
@@ -201,29 +200,21 @@ class FirebaseService:
                     'Wash hands frequently',
                     'Avoid large gatherings'
                 ],
-                'created_at': firestore.SERVER_TIMESTAMP
+                'created_at': self.storage.server_timestamp()
             }
         ]
         
-        for disease_data in sample_diseases:
-            self.db.collection('diseases').document(f"disease_{disease_data['id']}").set(disease_data)
+        await self.diseases.put_many({
+            f"disease_{disease_data['id']}": disease_data for disease_data in sample_diseases
+        })
         
-        logger.info(f"✅ Created {len(sample_diseases)} sample diseases in Firestore")
+        logger.info(f"✅ Created {len(sample_diseases)} sample diseases in {self.storage.name} storage")
     
     # Disease operations
     async def get_all_diseases(self) -> List[Dict]:
         """Get all diseases from Firestore"""
         try:
-            diseases_ref = self.db.collection('diseases')
-            docs = diseases_ref.stream()
-            
-            diseases = []
-            for doc in docs:
-                disease_data = doc.to_dict()
-                disease_data['firestore_id'] = doc.id
-                diseases.append(disease_data)
-            
-            return diseases
+            return await self.diseases.list_all()
         except Exception as e:
             logger.error(f"Failed to get diseases: {str(e)}")
             return []
@@ -231,53 +222,23 @@ class FirebaseService:
     async def get_disease_by_name(self, name: str) -> Optional[Dict]:
         """Get disease by name from Firestore"""
         try:
-            diseases_ref = self.db.collection('diseases')
-            query = diseases_ref.where('name', '==', name).limit(1)
-            docs = list(query.stream())
-            
-            if docs:
-                disease_data = docs[0].to_dict()
-                disease_data['firestore_id'] = docs[0].id
-                return disease_data
-            
-            return None
+            return await self.diseases.find_by_name(name)
         except Exception as e:
             logger.error(f"Failed to get disease by name: {str(e)}")
             return None
     
-    async def search_diseases(self, query: str) -> List[Dict]:
-        """Search diseases by name or symptoms"""
-        try:
-            diseases = await self.get_all_diseases()
-            query_lower = query.lower()
-            
-            matching_diseases = []
-            for disease in diseases:
-                # Check name match
-                if query_lower in disease.get('name', '').lower():
-                    matching_diseases.append(disease)
-                    continue
-                
-                # Check description match
-                if query_lower in disease.get('description', '').lower():
-                    matching_diseases.append(disease)
-                    continue
-                
-                # Check symptoms match
-                symptoms = disease.get('symptoms', [])
-                for symptom in symptoms:
-                    if query_lower in symptom.lower():
-                        matching_diseases.append(disease)
-                        break
-            
-            return matching_diseases
-        except Exception as e:
-            logger.error(f"Failed to search diseases: {str(e)}")
-            return []
+    async def close(self):
+        """Commit queued writes before shutdown"""
+        await self.write_queue.close(settings.FIRESTORE_FLUSH_TIMEOUT_SECONDS)
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.storage.close)
+    
+    def get_write_stats(self) -> Dict[str, Any]:
+        """Write-behind queue statistics"""
+        return self.write_queue.get_stats()
     
     # Analysis operations
     async def save_analysis(self, analysis: AnalysisResult) -> str:
-        """Save analysis result to Firestore"""
+        """Queue an analysis result for a batched write to Firestore"""
         try:
             analysis_data = {
                 'id': analysis.id,
@@ -289,28 +250,24 @@ class FirebaseService:
                 'requires_immediate_attention': analysis.requires_immediate_attention,
                 'analysis_timestamp': analysis.analysis_timestamp,
                 'image_path': analysis.image_path,
-                'created_at': firestore.SERVER_TIMESTAMP
+                'created_at': self.storage.server_timestamp()
             }
             
-            doc_ref = self.db.collection('analyses').document(analysis.id)
-            doc_ref.set(analysis_data)
-            
-            logger.info(f"✅ Saved analysis {analysis.id} to Firestore")
+            self.write_queue.put('analyses', analysis.id, analysis_data)
             return analysis.id
         except Exception as e:
-            logger.error(f"Failed to save analysis: {str(e)}")
+            logger.error(f"Failed to queue analysis: {str(e)}")
             raise
     
     async def get_analysis(self, analysis_id: str) -> Optional[Dict]:
         """Get analysis by ID from Firestore"""
         try:
-            doc_ref = self.db.collection('analyses').document(analysis_id)
-            doc = doc_ref.get()
+            # Saved but not yet written
+            pending = self.write_queue.get('analyses', analysis_id)
+            if pending is not None:
+                return {key: value for key, value in pending.items() if key != 'created_at'}
             
-            if doc.exists:
-                return doc.to_dict()
-            
-            return None
+            return await self.analyses.get(analysis_id)
         except Exception as e:
             logger.error(f"Failed to get analysis: {str(e)}")
             return None
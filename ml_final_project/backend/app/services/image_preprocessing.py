@@ -0,0 +1,238 @@
+import numpy as np
+from PIL import Image
+import io
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from multiprocessing import get_context, shared_memory
+import logging
+import asyncio
+
+logger = logging.getLogger(__name__)
+
+# Model input geometry (typically 224x224 RGB for medical imaging)
+TARGET_SIZE = (224, 224)
+INPUT_SHAPE = (TARGET_SIZE[1], TARGET_SIZE[0], 3)
+INPUT_DTYPE = np.float32
+INPUT_SCALE = np.float32(1.0 / 255.0)
+
+# Modes that can be resized directly; others are converted to RGB first
+RESIZABLE_MODES = ("L", "RGB")
+
+def load_reduced(image_data: bytes) -> Image.Image:
+    """Decode an image at close to the model input size, as an RGB image of TARGET_SIZE"""
+    # Open image using PIL
+    image = Image.open(io.BytesIO(image_data))
+    
+    # JPEG: let the decoder apply DCT scaling (1/2, 1/4 or 1/8) so a
+    # 3000x3000 X-ray is decoded at ~375x375 instead of full resolution
+    if image.format == "JPEG":
+        image.draft("RGB", TARGET_SIZE)
+    
+    # Resize grayscale/RGB in their native mode; converting a full-size
+    # grayscale X-ray to RGB first would triple its memory for nothing
+    if image.mode not in RESIZABLE_MODES:
+        image = image.convert('RGB')
+    
+    # reducing_gap shrinks by an integer factor with a cheap box reduce
+    # before the final resample (formats without decoder-side scaling)
+    image = image.resize(TARGET_SIZE, reducing_gap=3.0)
+    
+    # Convert to RGB if necessary (now only 224x224 pixels)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+def decode_into(image_data: bytes, out: np.ndarray):
+    """Decode an X-ray image straight into a preallocated (224, 224, 3) float32 slot"""
+    image = load_reduced(image_data)
+    
+    # Scale uint8 pixels into the slot in one pass (no float temporaries)
+    np.multiply(np.asarray(image), INPUT_SCALE, out=out, dtype=INPUT_DTYPE)
+
+def decode_image(image_data: bytes) -> np.ndarray:
+    """Decode an X-ray image into a normalized (224, 224, 3) float32 array"""
+    out = np.empty(INPUT_SHAPE, dtype=INPUT_DTYPE)
+    decode_into(image_data, out)
+    return out
+
+def preprocess_batch(image_data_list: List[bytes], out: np.ndarray) -> List[Optional[Exception]]:
+    """Batched kernel: decode each image into out[i], returning a per-image error (or None)"""
+    errors = []
+    for i, image_data in enumerate(image_data_list):
+        try:
+            decode_into(image_data, out[i])
+            errors.append(None)
+        except Exception as e:
+            errors.append(e)
+    return errors
+
+# Shared memory blocks attached by this (worker) process, by name
+_attached_blocks: Dict[str, shared_memory.SharedMemory] = {}
+
+def _decode_into_shared_slot(image_data: bytes, shm_name: str, capacity: int, index: int) -> None:
+    """Process pool task: decode an image into one slot of a parent-owned shared memory buffer"""
+    shm = _attached_blocks.get(shm_name)
+    if shm is None:
+        # Pool buffers are long-lived, so keep the mapping for later tasks
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _attached_blocks[shm_name] = shm
+    batch = np.ndarray((capacity,) + INPUT_SHAPE, dtype=INPUT_DTYPE, buffer=shm.buf)
+    decode_into(image_data, batch[index])
+
+def _noop() -> None:
+    """Process pool task used to spawn workers ahead of the first request"""
+
+class TensorBuffer:
+    """A preallocated (capacity, 224, 224, 3) float32 batch tensor"""
+    
+    def __init__(self, capacity: int, shared: bool):
+        self.capacity = capacity
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        shape = (capacity,) + INPUT_SHAPE
+        if shared:
+            nbytes = int(np.prod(shape)) * np.dtype(INPUT_DTYPE).itemsize
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.array = np.ndarray(shape, dtype=INPUT_DTYPE, buffer=self.shm.buf)
+        else:
+            self.array = np.zeros(shape, dtype=INPUT_DTYPE)
+    
+    def release(self):
+        """Free the underlying shared memory block"""
+        if self.shm is not None:
+            del self.array  # Release the buffer export before closing
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+class ImagePreprocessor:
+    """Decodes batches of images into pooled, preallocated tensor buffers.
+    
+    Each image is decoded straight into its slot of a reusable
+    (capacity, 224, 224, 3) float32 buffer, with the images of a batch spread
+    across a process or thread pool. In process mode the buffers live in
+    shared memory, so workers write pixels in place and only the block name
+    and slot index cross the process boundary.
+    """
+    
+    def __init__(
+        self,
+        executor_type: str = "process",
+        max_workers: Optional[int] = None,
+        batch_capacity: int = 16,
+        num_buffers: int = 2
+    ):
+        if executor_type not in ("process", "thread"):
+            raise ValueError(f"Unknown preprocessing executor: {executor_type}")
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.batch_capacity = batch_capacity
+        self.num_buffers = num_buffers
+        self._executor: Optional[Executor] = None
+        self._buffers: List[TensorBuffer] = []
+        self._free_buffers: Optional[asyncio.Queue] = None
+    
+    def start(self):
+        """Create the executor and buffer pool (idempotent)"""
+        if self._executor is not None:
+            return
+        
+        if self.executor_type == "process":
+            # Spawn keeps workers independent of threads started by the ML runtime
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=get_context("spawn")
+            )
+            # Spawn the workers now rather than on the first request
+            for _ in range(self.max_workers or os.cpu_count() or 1):
+                self._executor.submit(_noop)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="preprocess"
+            )
+        
+        if not self._buffers:
+            self._buffers = [
+                TensorBuffer(self.batch_capacity, shared=self.executor_type == "process")
+                for _ in range(self.num_buffers)
+            ]
+            self._free_buffers = asyncio.Queue()
+            for buffer in self._buffers:
+                self._free_buffers.put_nowait(buffer)
+        logger.info(f"Image preprocessing running in a {self.executor_type} pool")
+    
+    def shutdown(self):
+        """Shut down the executor and free the buffer pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for buffer in self._buffers:
+            buffer.release()
+        self._buffers = []
+        self._free_buffers = None
+    
+    @asynccontextmanager
+    async def preprocess_batch(
+        self,
+        image_data_list: List[bytes]
+    ) -> AsyncIterator[Tuple[np.ndarray, List[Optional[Exception]]]]:
+        """Decode images into a pooled buffer, yielding an (N, 224, 224, 3) view and per-image errors.
+        
+        The view is only valid inside the context; the buffer is returned to
+        the pool on exit.
+        """
+        if len(image_data_list) > self.batch_capacity:
+            raise ValueError(f"Batch of {len(image_data_list)} exceeds buffer capacity {self.batch_capacity}")
+        
+        self.start()
+        free_buffers = self._free_buffers
+        buffer = await free_buffers.get()
+        try:
+            errors = await self._decode_batch(image_data_list, buffer)
+            yield buffer.array[:len(image_data_list)], errors
+        finally:
+            free_buffers.put_nowait(buffer)
+    
+    async def _decode_batch(self, image_data_list: List[bytes], buffer: TensorBuffer) -> List[Optional[Exception]]:
+        """Decode every image of a batch in parallel, each into its own slot"""
+        loop = asyncio.get_running_loop()
+        if self.executor_type == "process":
+            tasks = [
+                loop.run_in_executor(
+                    self._executor, _decode_into_shared_slot,
+                    image_data, buffer.shm.name, buffer.capacity, i
+                )
+                for i, image_data in enumerate(image_data_list)
+            ]
+        else:
+            tasks = [
+                loop.run_in_executor(self._executor, decode_into, image_data, buffer.array[i])
+                for i, image_data in enumerate(image_data_list)
+            ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        errors: List[Optional[Exception]] = []
+        for result in results:
+            if isinstance(result, BrokenProcessPool):
+                errors.append(RuntimeError("Image preprocessing worker crashed"))
+            elif isinstance(result, Exception):
+                logger.error(f"Image preprocessing failed: {str(result)}")
+                errors.append(ValueError(f"Invalid image format: {str(result)}"))
+            else:
+                errors.append(None)
+        
+        if any(isinstance(result, BrokenProcessPool) for result in results):
+            # A worker died (e.g. OOM on a huge image); recreate the pool for later requests
+            logger.error("Preprocessing worker pool broke, restarting it")
+            self._restart_executor()
+        return errors
+    
+    def _restart_executor(self):
+        """Replace a broken executor, keeping the buffer pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self.start()
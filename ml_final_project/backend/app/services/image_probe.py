@@ -0,0 +1,91 @@
+from PIL import Image
+from typing import BinaryIO, Optional
+import warnings
+
+from ..core.config import settings
+from ..models.schemas import ImageMetadata
+
+# Magic byte signatures for the formats we accept
+MAGIC_SIGNATURES = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+]
+
+FORMAT_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "BMP": "image/bmp",
+    "TIFF": "image/tiff",
+}
+
+# Bits per channel for PIL image modes
+MODE_BIT_DEPTHS = {
+    "1": 1,
+    "I;16": 16,
+    "I;16B": 16,
+    "I;16L": 16,
+    "I": 32,
+    "F": 32,
+}
+
+class InvalidImageError(ValueError):
+    """Raised when an upload fails header probing"""
+
+def sniff_format(header: bytes) -> Optional[str]:
+    """Identify the image format from its leading magic bytes"""
+    for signature, image_format in MAGIC_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    return None
+
+def probe_image(source: BinaryIO) -> ImageMetadata:
+    """Validate an image from its magic bytes and header, without decoding pixels"""
+    source.seek(0)
+    image_format = sniff_format(source.read(16))
+    if image_format is None:
+        raise InvalidImageError("Unrecognized image format")
+    
+    mime_type = FORMAT_MIME_TYPES[image_format]
+    if mime_type not in settings.ALLOWED_IMAGE_TYPES:
+        raise InvalidImageError(f"Image format {image_format} is not allowed")
+    
+    source.seek(0)
+    try:
+        with warnings.catch_warnings():
+            # Our own pixel limit below is the gate; don't let PIL warn first
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            # Image.open only parses the header; pixel data is read lazily
+            with Image.open(source, formats=[image_format]) as image:
+                width, height = image.size
+                mode = image.mode
+                frames = getattr(image, "n_frames", 1)
+    except Image.DecompressionBombError:
+        raise InvalidImageError("Image dimensions exceed the decompression bomb limit")
+    except Exception as e:
+        raise InvalidImageError(f"Corrupt or unreadable image header: {str(e)}")
+    finally:
+        source.seek(0)
+    
+    if width < settings.IMAGE_MIN_DIMENSION or height < settings.IMAGE_MIN_DIMENSION:
+        raise InvalidImageError(
+            f"Image too small ({width}x{height}). Minimum dimension: {settings.IMAGE_MIN_DIMENSION}px"
+        )
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise InvalidImageError(
+            f"Image too large ({width}x{height}). Maximum: {settings.IMAGE_MAX_PIXELS} pixels"
+        )
+    if frames > settings.IMAGE_MAX_FRAMES:
+        raise InvalidImageError(f"Image has {frames} frames. Maximum: {settings.IMAGE_MAX_FRAMES}")
+    
+    return ImageMetadata(
+        format=image_format,
+        mime_type=mime_type,
+        width=width,
+        height=height,
+        mode=mode,
+        bit_depth=MODE_BIT_DEPTHS.get(mode, 8),
+        frames=frames
+    )
@@ -0,0 +1,572 @@
+import numpy as np
+import hashlib
+import os
+import queue
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+import logging
+
+from .image_preprocessing import INPUT_DTYPE, INPUT_SHAPE
+from .remote_inference import RemoteInferenceError, WorkerConnection, WorkerUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# Models must output one score per class in this order
+NUM_CLASSES = 5
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    """Row-wise softmax"""
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+def _ensure_probabilities(outputs: np.ndarray) -> np.ndarray:
+    """Convert model outputs to (N, NUM_CLASSES) float probabilities, applying softmax to logits"""
+    outputs = np.asarray(outputs, dtype=np.float64).reshape(len(outputs), -1)
+    if outputs.shape[1] != NUM_CLASSES:
+        raise ValueError(f"Model returned {outputs.shape[1]} classes, expected {NUM_CLASSES}")
+    if outputs.min() < 0 or not np.allclose(outputs.sum(axis=1), 1.0, atol=1e-3):
+        outputs = _softmax(outputs)
+    return outputs
+
+def _hash_path(path: str) -> str:
+    """Short content hash of a model file or directory"""
+    hasher = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                file_path = os.path.join(root, filename)
+                hasher.update(os.path.relpath(file_path, path).encode())
+                with open(file_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        hasher.update(chunk)
+    else:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+    return hasher.hexdigest()[:12]
+
+class InferenceBackend:
+    """Base class for model runtimes behind MLService.
+    
+    ``predict`` takes a float32 (N, 224, 224, 3) batch scaled to [0, 1] and
+    returns (N, 5) class probabilities in ``MLService.class_names`` order.
+    It is called from a single inference thread, never from the event loop.
+    
+    ``run`` pads each batch up to the nearest of ``batch_buckets`` so the
+    runtime only ever sees a fixed set of shapes, all compiled by ``warmup``;
+    a batch larger than every bucket is run in pieces of the largest one.
+    
+    In pre-fork mode ``preload`` runs once in the parent before workers fork,
+    and ``load`` runs in each worker; weights read by ``preload`` are then
+    shared copy-on-write instead of duplicated per worker.
+    """
+    
+    name = "base"
+    default_filename: Optional[str] = None
+    max_concurrency = 1  # Batches that may run at once, each on its own thread
+    
+    def __init__(
+        self,
+        model_path: str,
+        model_filename: Optional[str] = None,
+        num_threads: Optional[int] = None,
+        batch_buckets: Optional[Sequence[int]] = None,
+        compile_cache_dir: Optional[str] = None,
+        inter_op_threads: Optional[int] = None
+    ):
+        filename = model_filename or self.default_filename
+        self.model_file = os.path.join(model_path, filename) if filename else None
+        self.version = self.name
+        self.num_threads = num_threads
+        self.inter_op_threads = inter_op_threads
+        self.batch_buckets: List[int] = sorted({b for b in (batch_buckets or []) if b > 0})
+        self.compile_cache_dir = compile_cache_dir
+        self._padding_buffers: Dict[int, np.ndarray] = {}
+        
+        # Bucketing statistics
+        self.warmup_ms: Dict[int, float] = {}
+        self.bucket_calls: Dict[int, int] = {}
+        self.total_rows = 0
+        self.padded_rows = 0
+    
+    def preload(self) -> bool:
+        """Fork-safe loading in the parent process; True if weights will be shared (blocking)"""
+        return False
+    
+    def load(self):
+        """Load the model (blocking)"""
+        raise NotImplementedError
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Run one forward pass (blocking)"""
+        raise NotImplementedError
+    
+    def close(self):
+        """Release runtime resources"""
+    
+    def bucket_for(self, size: int) -> int:
+        """Smallest bucket that fits ``size`` rows (``size`` itself if none does)"""
+        for bucket in self.batch_buckets:
+            if bucket >= size:
+                return bucket
+        return size
+    
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """Run ``predict`` on the batch padded to its bucket, returning only the real rows"""
+        size = len(batch)
+        if self.batch_buckets and size > self.batch_buckets[-1]:
+            # e.g. a remote worker configured with a smaller max batch than its client
+            largest = self.batch_buckets[-1]
+            return np.concatenate([self.run(batch[start:start + largest]) for start in range(0, size, largest)])
+        bucket = self.bucket_for(size)
+        self.bucket_calls[bucket] = self.bucket_calls.get(bucket, 0) + 1
+        self.total_rows += size
+        if bucket == size:
+            return self.predict(batch)
+        
+        # Reused per bucket: only called from the single inference thread
+        padded = self._padding_buffers.get(bucket)
+        if padded is None:
+            padded = self._padding_buffers[bucket] = np.zeros((bucket,) + INPUT_SHAPE, dtype=INPUT_DTYPE)
+        padded[:size] = batch
+        padded[size:] = 0
+        self.padded_rows += bucket - size
+        return self.predict(padded)[:size]
+    
+    def warmup(self):
+        """Run one forward pass per bucket so every shape is compiled before traffic (blocking)"""
+        for bucket in self.batch_buckets:
+            started = time.perf_counter()
+            self.predict(np.zeros((bucket,) + INPUT_SHAPE, dtype=INPUT_DTYPE))
+            self.warmup_ms[bucket] = 1000.0 * (time.perf_counter() - started)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Report bucket usage, padding overhead and warmup (compile) times"""
+        return {
+            "batch_buckets": self.batch_buckets,
+            "compile_cache_dir": self.compile_cache_dir,
+            "warmup_ms": self.warmup_ms,
+            "bucket_calls": dict(sorted(self.bucket_calls.items())),
+            "padding_ratio": self.padded_rows / (self.total_rows + self.padded_rows) if self.total_rows else 0.0
+        }
+    
+    def _require_model_file(self):
+        """Fail clearly when the configured model file is missing, and version it by content"""
+        if not os.path.exists(self.model_file):
+            raise FileNotFoundError(f"Model not found for {self.name} backend: {self.model_file}")
+        self.version = f"{self.name}-{_hash_path(self.model_file)}"
+    
+    def _compile_cache_path(self, suffix: str) -> Optional[str]:
+        """Location of this model's compiled artifact, or None when caching is off"""
+        if not self.compile_cache_dir:
+            return None
+        os.makedirs(self.compile_cache_dir, exist_ok=True)
+        return os.path.join(self.compile_cache_dir, f"{self.version}-{suffix}")
+
+class KerasBackend(InferenceBackend):
+    """Keras model file (.h5/.keras) or TensorFlow SavedModel directory.
+    
+    Each batch bucket gets its own concrete function. With a compile cache,
+    the traced functions are saved as a SavedModel keyed by model hash,
+    TensorFlow version and buckets, so restarts skip Keras rebuild and tracing.
+    TensorFlow is not fork-safe, so every worker loads its own copy.
+    """
+    
+    name = "keras"
+    default_filename = "lung_disease_model.h5"
+    
+    def load(self):
+        self._require_model_file()
+        import tensorflow as tf
+        
+        # Must happen before TensorFlow creates its thread pools
+        if self.num_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(self.num_threads)
+        if self.inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(self.inter_op_threads)
+        
+        buckets = "-".join(str(b) for b in self.batch_buckets)
+        cached = self._compile_cache_path(f"tf{tf.__version__}-b{buckets}") if buckets else None
+        if cached and os.path.isdir(cached):
+            self._loaded = tf.saved_model.load(cached)
+            self._functions = {
+                bucket: self._signature_fn(self._loaded.signatures[f"batch_{bucket}"])
+                for bucket in self.batch_buckets
+            }
+            self._fallback = None  # Cached graphs cannot retrace; ``run`` splits larger batches
+            logger.info(f"Loaded compiled functions from {cached}")
+            return
+        
+        if os.path.isdir(self.model_file):
+            loaded = tf.saved_model.load(self.model_file)
+            self._loaded = loaded  # Keep the object graph alive
+            call = self._signature_fn(loaded.signatures["serving_default"])
+        else:
+            loaded = tf.keras.models.load_model(self.model_file, compile=False)
+            call = lambda batch: loaded(batch, training=False)
+        
+        traced = tf.function(call)
+        self._functions = {
+            bucket: traced.get_concrete_function(tf.TensorSpec((bucket,) + INPUT_SHAPE, tf.float32))
+            for bucket in self.batch_buckets
+        }
+        self._fallback = traced  # Batches larger than every bucket retrace
+        
+        if cached:
+            module = tf.Module()
+            module.model = loaded  # Track the weights the functions capture
+            staging = f"{cached}.tmp-{os.getpid()}"
+            tf.saved_model.save(
+                module, staging,
+                signatures={f"batch_{bucket}": fn for bucket, fn in self._functions.items()}
+            )
+            os.replace(staging, cached)
+            logger.info(f"Saved compiled functions to {cached}")
+    
+    @staticmethod
+    def _signature_fn(signature: Callable) -> Callable:
+        """Adapt a SavedModel signature (keyword input, dict of outputs) to a single-tensor call"""
+        input_name = next(iter(signature.structured_input_signature[1]))
+        return lambda batch: next(iter(signature(**{input_name: batch}).values()))
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        fn = self._functions.get(len(batch), self._fallback)
+        if fn is None:
+            raise ValueError(
+                f"No compiled function for a batch of {len(batch)}; cached graphs only run the "
+                f"batch buckets {self.batch_buckets}"
+            )
+        return _ensure_probabilities(np.asarray(fn(batch)))
+
+class SavedModelBackend(KerasBackend):
+    """TensorFlow SavedModel directory"""
+    
+    name = "savedmodel"
+    default_filename = "lung_disease_model"
+
+class TFLiteBackend(InferenceBackend):
+    """TensorFlow Lite flatbuffer, including int8/float16 quantized variants.
+    
+    One interpreter is allocated per batch size, so steady-state traffic never
+    pays for ``resize_tensor_input`` + ``allocate_tensors``. The flatbuffer
+    needs no compilation, so there is nothing to cache on disk.
+    
+    Interpreters are built from the flatbuffer bytes, which they read weights
+    from in place. ``preload`` reads those bytes in the parent process, so
+    forked workers share one copy of the weights.
+    """
+    
+    name = "tflite"
+    default_filename = "lung_disease_model.tflite"
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._model_bytes: Optional[bytes] = None
+    
+    def load(self):
+        if self._model_bytes is None:
+            self.preload()
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        
+        self._interpreter_class = Interpreter
+        self._interpreters: Dict[int, tuple] = {}
+    
+    def preload(self) -> bool:
+        self._require_model_file()
+        with open(self.model_file, "rb") as f:
+            self._model_bytes = f.read()
+        return True
+    
+    def _interpreter_for(self, size: int) -> tuple:
+        """Interpreter with tensors allocated for a batch of ``size``"""
+        entry = self._interpreters.get(size)
+        if entry is None:
+            # Every interpreter uses the same bytes; they must outlive it
+            interpreter = self._interpreter_class(model_content=self._model_bytes, num_threads=self.num_threads)
+            input_index = interpreter.get_input_details()[0]["index"]
+            interpreter.resize_tensor_input(input_index, (size,) + INPUT_SHAPE)
+            interpreter.allocate_tensors()
+            entry = (interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0])
+            self._interpreters[size] = entry
+        return entry
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        interpreter, input_details, output_details = self._interpreter_for(len(batch))
+        interpreter.set_tensor(input_details["index"], self._quantize(batch, input_details))
+        interpreter.invoke()
+        return _ensure_probabilities(self._dequantize(interpreter.get_tensor(output_details["index"]), output_details))
+    
+    def close(self):
+        self._interpreters = {}
+    
+    @staticmethod
+    def _quantize(batch: np.ndarray, details: Dict) -> np.ndarray:
+        """Map float input onto an integer input tensor (full-int8 models)"""
+        dtype = details["dtype"]
+        if np.issubdtype(dtype, np.floating):
+            return batch.astype(dtype, copy=False)
+        scale, zero_point = details["quantization"]
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+    
+    @staticmethod
+    def _dequantize(output: np.ndarray, details: Dict) -> np.ndarray:
+        """Map an integer output tensor back to float scores"""
+        if np.issubdtype(output.dtype, np.floating):
+            return output
+        scale, zero_point = details["quantization"]
+        return (output.astype(np.float32) - zero_point) * scale
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime CPU session.
+    
+    With a compile cache, the fully optimized graph is written to disk keyed by
+    model hash and ONNX Runtime version; restarts load it with graph
+    optimization turned off.
+    
+    ORT-format models (``.ort``) are run with initializers pointing straight
+    into the model bytes. ``preload`` reads those bytes in the parent process,
+    so forked workers share one copy of the weights.
+    """
+    
+    name = "onnx"
+    default_filename = "lung_disease_model.onnx"
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._model_bytes: Optional[bytes] = None
+    
+    @property
+    def is_ort_format(self) -> bool:
+        return self.model_file.endswith(".ort")
+    
+    def preload(self) -> bool:
+        if not self.is_ort_format:
+            return False
+        self._require_model_file()
+        with open(self.model_file, "rb") as f:
+            self._model_bytes = f.read()
+        return True
+    
+    def load(self):
+        import onnxruntime as ort
+        
+        options = ort.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        if self.inter_op_threads:
+            options.inter_op_num_threads = self.inter_op_threads
+        
+        if self.is_ort_format:
+            if self._model_bytes is None:
+                self.preload()
+            # The session keeps using these bytes; they must outlive it
+            options.add_session_config_entry("session.use_ort_model_bytes_directly", "1")
+            options.add_session_config_entry("session.use_ort_model_bytes_for_initializers", "1")
+            self._session = ort.InferenceSession(self._model_bytes, sess_options=options, providers=["CPUExecutionProvider"])
+            self._input_name = self._session.get_inputs()[0].name
+            return
+        
+        self._require_model_file()
+        model_file = self.model_file
+        cached = self._compile_cache_path(f"ort{ort.__version__}.onnx")
+        staging = None
+        if cached and os.path.exists(cached):
+            model_file = cached
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            logger.info(f"Loading optimized graph from {cached}")
+        else:
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if cached:
+                staging = f"{cached}.tmp-{os.getpid()}"
+                options.optimized_model_filepath = staging
+        
+        self._session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+        if staging and os.path.exists(staging):
+            os.replace(staging, cached)
+            logger.info(f"Saved optimized graph to {cached}")
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        outputs = self._session.run(None, {self._input_name: batch.astype(np.float32, copy=False)})
+        return _ensure_probabilities(outputs[0])
+
+class NumpyStubBackend(InferenceBackend):
+    """Deterministic, CPU-cheap stand-in for load tests and benchmarks.
+    
+    Scores come from a fixed random projection of an 8x8 pooled thumbnail, so
+    the same image always gets the same prediction and different images get
+    different ones, without a trained model or ML runtime.
+    """
+    
+    name = "numpy"
+    GRID = 8
+    
+    def preload(self) -> bool:
+        self.load()
+        return True
+    
+    def load(self):
+        # Private generator: nothing touches the global NumPy RNG
+        rng = np.random.default_rng(42)
+        self._weights = rng.normal(0.0, 8.0, size=(self.GRID * self.GRID * 3, NUM_CLASSES))
+        prior = np.array([1, 2, 1, 1, 1.5])  # Slightly favor pneumonia
+        self._bias = np.log(prior / prior.sum())
+        self.version = "numpy-stub-1"
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        n, height, width, channels = batch.shape
+        pooled = batch.reshape(
+            n, self.GRID, height // self.GRID, self.GRID, width // self.GRID, channels
+        ).mean(axis=(2, 4), dtype=np.float64)
+        features = pooled.reshape(n, -1) - 0.5
+        return _softmax(features @ self._weights + self._bias)
+
+class RemoteInferenceBackend(InferenceBackend):
+    """Sends preprocessed batches to a pool of inference worker processes.
+    
+    Workers (``inference_worker.py``) run any other backend behind a socket,
+    locally or on other hosts. Each worker gets ``connections_per_worker``
+    connections, each carrying one batch at a time, so up to
+    ``max_concurrency`` batches are in flight. Workers pad to their own
+    buckets and warm up when they start.
+    """
+    
+    name = "remote"
+    FAILURE_COOLDOWN_SECONDS = 5.0
+    
+    def __init__(
+        self,
+        model_path: str,
+        model_filename: Optional[str] = None,
+        worker_addresses: Sequence[str] = (),
+        connections_per_worker: int = 1,
+        timeout: float = 30.0,
+        **kwargs
+    ):
+        super().__init__(model_path, model_filename, **kwargs)
+        self.batch_buckets = []  # Padding happens on the workers
+        self.worker_addresses = list(worker_addresses)
+        self.connections_per_worker = max(1, connections_per_worker)
+        self.timeout = timeout
+        self.max_concurrency = max(1, len(self.worker_addresses) * self.connections_per_worker)
+        self._idle: queue.Queue = queue.Queue()
+        self._connections: List[WorkerConnection] = []
+        self.worker_calls = {address: 0 for address in self.worker_addresses}
+        self.worker_errors = {address: 0 for address in self.worker_addresses}
+    
+    def load(self):
+        if not self.worker_addresses:
+            raise ValueError("The remote backend needs INFERENCE_WORKER_ADDRESSES")
+        
+        versions = {}
+        for address in self.worker_addresses:
+            probe = WorkerConnection(address, self.timeout)
+            versions[address] = probe.info()["version"]
+            self._connections.append(probe)
+            for _ in range(self.connections_per_worker - 1):
+                self._connections.append(WorkerConnection(address, self.timeout))
+        
+        # The version feeds the result cache key, so every worker must agree
+        if len(set(versions.values())) > 1:
+            raise ValueError(f"Inference workers serve different model versions: {versions}")
+        self.version = next(iter(versions.values()))
+        for connection in self._connections:
+            self._idle.put(connection)
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # Wait up to the timeout for a connection to a healthy worker. Connections
+        # whose worker recently failed are held aside (not retried, not counted)
+        # until their cooldown ends, so they cannot crowd out busy healthy ones
+        deadline = time.monotonic() + self.timeout
+        cooling: List[WorkerConnection] = []
+        try:
+            while True:
+                now = time.monotonic()
+                if not any(connection.retry_at <= now for connection in self._connections):
+                    raise RemoteInferenceError("No inference worker available")
+                if now >= deadline:
+                    raise RemoteInferenceError(f"No inference worker became free within {self.timeout:g}s")
+                
+                recovered = [connection for connection in cooling if connection.retry_at <= now]
+                if recovered:
+                    connection = recovered[0]
+                    cooling.remove(connection)
+                else:
+                    wait = deadline - now
+                    if cooling:
+                        wait = min(wait, min(connection.retry_at for connection in cooling) - now)
+                    try:
+                        connection = self._idle.get(timeout=max(wait, 0.001))
+                    except queue.Empty:
+                        continue
+                    if connection.retry_at > time.monotonic():
+                        cooling.append(connection)
+                        continue
+                
+                try:
+                    outputs = connection.predict(batch)
+                    self.worker_calls[connection.address] += 1
+                    return outputs
+                except WorkerUnavailableError as e:
+                    logger.warning(str(e))
+                    self.worker_errors[connection.address] += 1
+                    connection.retry_at = time.monotonic() + self.FAILURE_COOLDOWN_SECONDS
+                finally:
+                    self._idle.put(connection)
+        finally:
+            for connection in cooling:
+                self._idle.put(connection)
+    
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **super().get_stats(),
+            "max_concurrency": self.max_concurrency,
+            "workers": {
+                address: {"calls": self.worker_calls[address], "errors": self.worker_errors[address]}
+                for address in self.worker_addresses
+            }
+        }
+
+BACKENDS: Dict[str, Type[InferenceBackend]] = {
+    "keras": KerasBackend,
+    "savedmodel": SavedModelBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+    "numpy": NumpyStubBackend,
+    "remote": RemoteInferenceBackend,
+}
+
+def create_backend(
+    name: str,
+    model_path: str,
+    model_filename: Optional[str] = None,
+    num_threads: Optional[int] = None,
+    batch_buckets: Optional[Sequence[int]] = None,
+    compile_cache_dir: Optional[str] = None,
+    inter_op_threads: Optional[int] = None,
+    **options
+) -> InferenceBackend:
+    """Instantiate the inference backend selected in config"""
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Unknown inference backend '{name}'. Available: {', '.join(BACKENDS)}")
+    return backend_class(
+        model_path,
+        model_filename,
+        num_threads=num_threads,
+        batch_buckets=batch_buckets,
+        compile_cache_dir=compile_cache_dir,
+        inter_op_threads=inter_op_threads,
+        **options
+    )
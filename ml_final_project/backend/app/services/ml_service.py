@@ -1,87 +1,540 @@
 import numpy as np
-import tensorflow as tf
-from PIL import Image
-import io
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable, TypeVar, Union, Tuple, AsyncIterator, Deque
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 import asyncio
+import time
+import os
 
 from ..models.schemas import (
     PredictionResult, 
     AnalysisResult, 
     DiseaseType, 
-    SeverityLevel
+    SeverityLevel,
+    ImageMetadata,
+    Priority
 )
 from ..core.config import settings
+from ..core.admission import OverloadedError
+from .image_preprocessing import ImagePreprocessor, decode_image
+from .inference_backends import InferenceBackend, create_backend
+from .result_cache import InferenceResultCache, image_digest
+from .upload_ingest import IngestedUpload
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Raw image bytes, or an ingested upload that is read when the image is analyzed
+ImageSource = Union[bytes, IngestedUpload]
+
+# Order of the model's output scores
+CLASS_NAMES = [
+    DiseaseType.NORMAL,
+    DiseaseType.PNEUMONIA,
+    DiseaseType.TUBERCULOSIS,
+    DiseaseType.LUNG_CANCER,
+    DiseaseType.COVID19
+]
+
+# Backend preloaded in the pre-fork parent process (see start.py)
+_preloaded_backend: Optional[InferenceBackend] = None
+
+def create_configured_backend(name: Optional[str] = None, workers: Optional[int] = None) -> InferenceBackend:
+    """Create the inference backend described by settings.
+    
+    ``name`` overrides INFERENCE_BACKEND and ``workers`` the number of
+    processes sharing this node's cores (WORKERS).
+    """
+    name = name or settings.INFERENCE_BACKEND
+    workers = workers or settings.WORKERS
+    # Batch buckets up to the max batch size, always including it
+    max_batch_size = max(1, settings.INFERENCE_MAX_BATCH_SIZE)
+    buckets = sorted({b for b in settings.INFERENCE_BATCH_BUCKETS if 0 < b < max_batch_size} | {max_batch_size})
+    
+    # With several workers, split the node's cores between them by default
+    num_threads = settings.INFERENCE_THREADS
+    if num_threads is None and workers > 1:
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+    
+    options = {}
+    if name == "remote":
+        options = {
+            "worker_addresses": settings.INFERENCE_WORKER_ADDRESSES,
+            "connections_per_worker": settings.INFERENCE_WORKER_CONNECTIONS,
+            "timeout": settings.INFERENCE_WORKER_TIMEOUT_SECONDS,
+        }
+    
+    return create_backend(
+        name,
+        settings.MODEL_PATH,
+        model_filename=settings.MODEL_FILENAME,
+        num_threads=num_threads,
+        batch_buckets=buckets,
+        compile_cache_dir=settings.COMPILE_CACHE_DIR,
+        inter_op_threads=settings.INFERENCE_INTER_OP_THREADS,
+        **options
+    )
+
+def preload_backend():
+    """Load model weights once in the parent process, before workers fork"""
+    global _preloaded_backend
+    backend = create_configured_backend()
+    if backend.preload():
+        _preloaded_backend = backend
+        logger.info(f"Preloaded {backend.name} model weights for sharing across workers")
+    else:
+        logger.warning(
+            f"The {backend.name} backend cannot share weights across workers; each worker loads its own copy "
+            f"(TFLite and ORT-format ONNX models are shared)"
+        )
+
+class InferenceBatcher:
+    """Dynamic micro-batching scheduler for model inference.
+    
+    Concurrent callers submit raw images; a background worker groups them into
+    a single batch bounded by ``max_batch_size`` and ``max_wait_ms``, decodes
+    the batch straight into a pooled tensor buffer, runs one forward pass and
+    hands every caller its own row of the output. Decoding of the next batch
+    overlaps with inference on the current one.
+    
+    Requests wait in one lane per priority. Batch slots are shared between the
+    waiting lanes by smooth weighted round-robin, so a large bulk job cannot
+    crowd out interactive requests, and any request queued longer than
+    ``starvation_ms`` is taken first so low-priority lanes always progress.
+    """
+    
+    def __init__(
+        self,
+        preprocessor: ImagePreprocessor,
+        infer_fn: Callable[[np.ndarray], Awaitable[np.ndarray]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_queue: Optional[int] = None,
+        lane_weights: Optional[Dict[str, int]] = None,
+        starvation_ms: Optional[float] = None
+    ):
+        self.preprocessor = preprocessor
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max_queue  # Requests beyond this many waiting in a lane are shed
+        self.lane_weights = {
+            priority.value: max(1, (lane_weights or {}).get(priority.value, 1)) for priority in Priority
+        }
+        self.starvation_age = starvation_ms / 1000.0 if starvation_ms is not None else None
+        self._lanes: Dict[str, Deque[tuple]] = {lane: deque() for lane in self.lane_weights}
+        self._lane_credit: Dict[str, int] = {lane: 0 for lane in self.lane_weights}
+        self._work_available: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batch_tasks: set = set()
+        self._pipeline_slots: Optional[asyncio.Semaphore] = None
+        self._infer_slots: Optional[asyncio.Semaphore] = None
+        self.max_concurrent_batches = 1  # Forward passes allowed at once
+        
+        # Scheduler statistics
+        self.total_batches = 0
+        self.total_requests = 0
+        self.largest_batch = 0
+        self.batch_size_histogram: Dict[int, int] = {}
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_preprocess_time = 0.0
+        self.total_inference_time = 0.0
+        self.shed_requests = 0
+        self.batches_waiting_for_infer = 0
+        self.lane_stats: Dict[str, Dict[str, float]] = {
+            lane: {"requests": 0, "shed": 0, "promoted": 0, "total_queue_wait": 0.0, "max_queue_wait": 0.0}
+            for lane in self.lane_weights
+        }
+    
+    def start(self):
+        """Start the batching worker on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._work_available = asyncio.Event()
+            if self.queue_depth():
+                self._work_available.set()
+            # One batch per pooled buffer can be in flight (decoding or inferring)
+            self._pipeline_slots = asyncio.Semaphore(self.preprocessor.num_buffers)
+            self._infer_slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the batching worker and fail any requests still queued"""
+        if self._worker is not None:
+            self._worker.cancel()
+            for task in list(self._batch_tasks):
+                task.cancel()
+            await asyncio.gather(self._worker, *self._batch_tasks, return_exceptions=True)
+            self._worker = None
+        
+        for lane in self._lanes.values():
+            while lane:
+                _, future, _ = lane.popleft()
+                if not future.done():
+                    future.set_exception(RuntimeError("Inference scheduler stopped"))
+    
+    def queue_depth(self) -> int:
+        """Requests waiting in all lanes"""
+        return sum(len(lane) for lane in self._lanes.values())
+    
+    async def submit(self, image_data: bytes, priority: Priority = Priority.INTERACTIVE) -> np.ndarray:
+        """Queue a single image in its priority lane and wait for its output row.
+        
+        Raises OverloadedError when the lane's queue is full.
+        """
+        self.start()
+        lane = Priority(priority).value
+        if self.max_queue is not None and len(self._lanes[lane]) >= self.max_queue:
+            self.shed_requests += 1
+            self.lane_stats[lane]["shed"] += 1
+            raise OverloadedError("preprocess")
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[lane].append((image_data, future, time.perf_counter()))
+        self._work_available.set()
+        return await future
+    
+    async def _wait_for_work(self, timeout: Optional[float] = None) -> bool:
+        """Wait until a request is queued; False on timeout"""
+        while not self.queue_depth():
+            self._work_available.clear()
+            try:
+                await asyncio.wait_for(self._work_available.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+    
+    async def _run(self):
+        """Collect queued requests into batches and hand them to the pipeline"""
+        while True:
+            await self._wait_for_work()
+            # Wait for a free buffer before choosing requests, so urgent ones
+            # queued meanwhile still make the next batch
+            await self._pipeline_slots.acquire()
+            batch = []
+            try:
+                batch = self._take(self.max_batch_size)
+                deadline = min(enqueued_at for _, _, enqueued_at in batch) + self.max_wait
+                
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0 or not await self._wait_for_work(timeout):
+                        # Deadline passed - only take what is already waiting
+                        batch.extend(self._take(self.max_batch_size - len(batch)))
+                        break
+                    batch.extend(self._take(self.max_batch_size - len(batch)))
+            except BaseException:
+                self._pipeline_slots.release()
+                self._fail_pending(batch, RuntimeError("Inference scheduler stopped"))
+                raise
+            
+            task = asyncio.create_task(self._process_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+    
+    def _take(self, limit: int) -> List[tuple]:
+        """Dequeue up to ``limit`` requests: overdue requests first, then by lane weight"""
+        taken = []
+        now = time.perf_counter()
+        while len(taken) < limit:
+            lane = self._overdue_lane(now) or self._next_weighted_lane()
+            if lane is None:
+                break
+            item = self._lanes[lane].popleft()
+            wait = now - item[2]
+            stats = self.lane_stats[lane]
+            stats["requests"] += 1
+            stats["total_queue_wait"] += wait
+            stats["max_queue_wait"] = max(stats["max_queue_wait"], wait)
+            taken.append(item)
+        return taken
+    
+    def _overdue_lane(self, now: float) -> Optional[str]:
+        """Lane whose oldest request has waited past the starvation limit (the longest-waiting one)"""
+        if self.starvation_age is None:
+            return None
+        overdue = [(lane[0][2], name) for name, lane in self._lanes.items() if lane and now - lane[0][2] > self.starvation_age]
+        if not overdue:
+            return None
+        name = min(overdue)[1]
+        self.lane_stats[name]["promoted"] += 1
+        return name
+    
+    def _next_weighted_lane(self) -> Optional[str]:
+        """Pick the next non-empty lane by smooth weighted round-robin"""
+        active = [name for name, lane in self._lanes.items() if lane]
+        if not active:
+            return None
+        for name in active:
+            self._lane_credit[name] += self.lane_weights[name]
+        chosen = max(active, key=lambda name: self._lane_credit[name])
+        self._lane_credit[chosen] -= sum(self.lane_weights[name] for name in active)
+        return chosen
+    
+    async def _process_batch(self, batch: List[tuple]):
+        """Decode a batch, run one forward pass and resolve each waiting future"""
+        try:
+            # Skip callers that gave up (e.g. client disconnected) while queued
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                return
+            
+            started = time.perf_counter()
+            self._record_batch([started - enqueued_at for _, _, enqueued_at in batch])
+            
+            async with self.preprocessor.preprocess_batch([item[0] for item in batch]) as (images, errors):
+                decoded = time.perf_counter()
+                self.total_preprocess_time += decoded - started
+                
+                # Fail images that could not be decoded; infer on the rest
+                for (_, future, _), error in zip(batch, errors):
+                    if error is not None and not future.done():
+                        future.set_exception(error)
+                valid = [i for i, error in enumerate(errors) if error is None]
+                if not valid:
+                    return
+                if len(valid) < len(batch):
+                    images = images[valid]
+                
+                try:
+                    self.batches_waiting_for_infer += 1
+                    try:
+                        await self._infer_slots.acquire()
+                    finally:
+                        self.batches_waiting_for_infer -= 1
+                    try:
+                        inference_started = time.perf_counter()
+                        outputs = await self.infer_fn(images)
+                        self.total_inference_time += time.perf_counter() - inference_started
+                    finally:
+                        self._infer_slots.release()
+                except Exception as e:
+                    logger.error(f"Batched inference failed for {len(valid)} requests: {str(e)}")
+                    for i in valid:
+                        if not batch[i][1].done():
+                            batch[i][1].set_exception(e)
+                    return
+            
+            for row, i in enumerate(valid):
+                future = batch[i][1]
+                if not future.done():
+                    future.set_result(outputs[row])
+        except BaseException as e:
+            # Cancelled by stop() or failed unexpectedly: never leave a caller waiting
+            error = RuntimeError("Inference scheduler stopped") if isinstance(e, asyncio.CancelledError) else e
+            self._fail_pending(batch, error)
+            raise
+        finally:
+            self._pipeline_slots.release()
+    
+    @staticmethod
+    def _fail_pending(batch: List[tuple], error: BaseException):
+        """Fail the futures of a batch that are still waiting"""
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+    
+    def _record_batch(self, queue_waits: List[float]):
+        """Update batch size and queue wait statistics"""
+        size = len(queue_waits)
+        self.total_batches += 1
+        self.total_requests += size
+        self.largest_batch = max(self.largest_batch, size)
+        self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+        self.total_queue_wait += sum(queue_waits)
+        self.max_queue_wait = max(self.max_queue_wait, max(queue_waits))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Report achieved batch sizes, queue wait and per-stage times"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "max_queue": self.max_queue,
+            "queue_depth": self.queue_depth(),
+            "batches_waiting_for_infer": self.batches_waiting_for_infer,
+            "shed_requests": self.shed_requests,
+            "total_batches": self.total_batches,
+            "total_requests": self.total_requests,
+            "avg_batch_size": self.total_requests / self.total_batches if self.total_batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+            "avg_queue_wait_ms": 1000.0 * self.total_queue_wait / self.total_requests if self.total_requests else 0.0,
+            "max_queue_wait_ms": 1000.0 * self.max_queue_wait,
+            "avg_preprocess_ms_per_batch": 1000.0 * self.total_preprocess_time / self.total_batches if self.total_batches else 0.0,
+            "avg_inference_ms_per_batch": 1000.0 * self.total_inference_time / self.total_batches if self.total_batches else 0.0,
+            "lanes": {
+                lane: {
+                    "weight": self.lane_weights[lane],
+                    "queue_depth": len(self._lanes[lane]),
+                    "requests": stats["requests"],
+                    "shed": stats["shed"],
+                    "promoted": stats["promoted"],
+                    "avg_queue_wait_ms": 1000.0 * stats["total_queue_wait"] / stats["requests"] if stats["requests"] else 0.0,
+                    "max_queue_wait_ms": 1000.0 * stats["max_queue_wait"]
+                }
+                for lane, stats in self.lane_stats.items()
+            }
+        }
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight task"""
+    
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn for key, or join the pending call if one is already running"""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.create_task(fn())
+            self._in_flight[key] = task
+            self.executed += 1
+            task.add_done_callback(lambda t: self._finish(key, t))
+        
+        # Shield so one caller giving up does not cancel the shared work
+        return await asyncio.shield(task)
+    
+    def running(self, key: str) -> bool:
+        """Whether a call for key is in flight"""
+        return key in self._in_flight
+    
+    def _finish(self, key: str, task: asyncio.Task):
+        """Forget a completed call and mark its outcome as retrieved"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Report in-flight and coalesced request counts"""
+        return {
+            "in_flight": len(self._in_flight),
+            "executed": self.executed,
+            "coalesced": self.coalesced
+        }
+
 class MLService:
     def __init__(self):
-        self.model = None
+        self.backend: Optional[InferenceBackend] = None
         self.is_loaded = False
-        self.class_names = [
-            DiseaseType.NORMAL,
-            DiseaseType.PNEUMONIA,
-            DiseaseType.TUBERCULOSIS,
-            DiseaseType.LUNG_CANCER,
-            DiseaseType.COVID19
-        ]
-        
+        self.class_names = list(CLASS_NAMES)
+        self.preprocessor = ImagePreprocessor(
+            executor_type=settings.PREPROCESS_EXECUTOR,
+            max_workers=settings.PREPROCESS_WORKERS,
+            batch_capacity=settings.INFERENCE_MAX_BATCH_SIZE,
+            num_buffers=settings.PREPROCESS_BUFFERS
+        )
+        self.batcher = InferenceBatcher(
+            self.preprocessor,
+            self._run_inference,
+            max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+            max_queue=settings.INFERENCE_MAX_QUEUE if settings.ADMISSION_CONTROL_ENABLED else None,
+            lane_weights=settings.INFERENCE_PRIORITY_WEIGHTS,
+            starvation_ms=settings.INFERENCE_STARVATION_MS
+        )
+        self.model_version = settings.MODEL_VERSION
+        # Forward passes run on one dedicated thread, off the event loop
+        self._inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.result_cache = InferenceResultCache(
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+            disk_dir=settings.RESULT_CACHE_DIR,
+            disk_max_bytes=settings.RESULT_CACHE_DISK_MAX_MB * 1024 * 1024
+        ) if settings.RESULT_CACHE_ENABLED else None
+        self.single_flight = SingleFlight()
+    
     async def load_models(self):
-        """Load ML models - For now using mock implementation"""
+        """Load the inference backend selected by INFERENCE_BACKEND"""
         try:
-            # In production, you would load actual models like:
-            # self.model = tf.keras.models.load_model(f"{settings.MODEL_PATH}/lung_disease_model.h5")
+            logger.info(f"Loading ML models ({settings.INFERENCE_BACKEND} backend)...")
+            # Reuse the backend preloaded by the pre-fork parent, if any
+            backend = _preloaded_backend or create_configured_backend()
+            await asyncio.get_running_loop().run_in_executor(self._inference_executor, backend.load)
             
-            # Mock implementation for demonstration
-            logger.info("Loading ML models...")
-            await asyncio.sleep(1)  # Simulate loading time
+            self.backend = backend
+            self.model_version = settings.MODEL_VERSION or backend.version
             self.is_loaded = True
-            logger.info("✅ ML models loaded successfully")
             
+            if backend.max_concurrency > 1:
+                # Several batches run at once (e.g. one per remote worker), each on
+                # its own thread, with one spare buffer so decoding keeps overlapping
+                self._inference_executor.shutdown(wait=False)
+                self._inference_executor = ThreadPoolExecutor(
+                    max_workers=backend.max_concurrency, thread_name_prefix="inference"
+                )
+                self.batcher.max_concurrent_batches = backend.max_concurrency
+                self.preprocessor.num_buffers = max(self.preprocessor.num_buffers, backend.max_concurrency + 1)
+            self.preprocessor.start()
+            self.batcher.start()
+            logger.info(f"✅ ML models loaded successfully (version {self.model_version})")
+        
         except Exception as e:
             logger.error(f"❌ Failed to load ML models: {str(e)}")
             raise
     
+    async def warmup(self):
+        """Compile every batch bucket before serving traffic"""
+        started = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(self._inference_executor, self.backend.warmup)
+        logger.info(
+            f"Warmed up batch buckets {self.backend.batch_buckets} "
+            f"in {1000.0 * (time.perf_counter() - started):.0f} ms"
+        )
+    
+    async def shutdown(self):
+        """Stop background inference and preprocessing workers"""
+        await self.batcher.stop()
+        self.preprocessor.shutdown()
+        if self.backend is not None:
+            self.backend.close()
+        self._inference_executor.shutdown(wait=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get runtime statistics for the inference pipeline"""
+        return {
+            "model_loaded": self.is_loaded,
+            "backend": self.backend.name if self.backend else None,
+            "model_version": self.model_version,
+            "compilation": self.backend.get_stats() if self.backend else None,
+            "batching": self.batcher.get_stats(),
+            "result_cache": self.result_cache.get_stats() if self.result_cache else None,
+            "coalescing": self.single_flight.get_stats()
+        }
+    
     def preprocess_image(self, image_data: bytes) -> np.ndarray:
-        """Preprocess X-ray image for ML model"""
+        """Preprocess X-ray image for ML model (blocking; the async path decodes in the batcher)"""
         try:
-            # Open image using PIL
-            image = Image.open(io.BytesIO(image_data))
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Resize to model input size (typically 224x224 for medical imaging)
-            image = image.resize((224, 224))
-            
-            # Convert to numpy array and normalize
-            image_array = np.array(image) / 255.0
-            
             # Add batch dimension
-            image_array = np.expand_dims(image_array, axis=0)
-            
-            return image_array
-            
+            return np.expand_dims(decode_image(image_data), axis=0)
+        
         except Exception as e:
             logger.error(f"Image preprocessing failed: {str(e)}")
             raise ValueError(f"Invalid image format: {str(e)}")
     
-    async def predict_lung_disease(self, image_data: bytes, patient_info: Optional[Dict] = None) -> AnalysisResult:
+    async def predict_lung_disease(
+        self,
+        image_data: bytes,
+        patient_info: Optional[Dict] = None,
+        digest: Optional[str] = None,
+        image_metadata: Optional[ImageMetadata] = None,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> AnalysisResult:
         """Perform lung disease prediction on X-ray image"""
         if not self.is_loaded:
             raise RuntimeError("ML models not loaded")
         
         try:
-            # Preprocess image
-            processed_image = self.preprocess_image(image_data)
-            
-            # Mock prediction - In production, use actual model
-            predictions = await self._mock_prediction(processed_image, patient_info)
+            probabilities = await self._get_probabilities(image_data, digest, priority)
+            predictions = self._build_predictions(probabilities)
             
             # Generate analysis result
             analysis_id = str(uuid.uuid4())
@@ -95,24 +548,60 @@ class MLService:
                 severity_assessment=self._assess_severity(predictions),
                 requires_immediate_attention=self._check_urgent_care(predictions),
                 analysis_timestamp=datetime.now(),
-                image_path=None  # Would be set after saving image
+                image_path=None,  # Would be set after saving image
+                image_metadata=image_metadata
             )
-            
+        
         except Exception as e:
             logger.error(f"Prediction failed: {str(e)}")
             raise
     
-    async def _mock_prediction(self, image_array: np.ndarray, patient_info: Optional[Dict] = None) -> List[PredictionResult]:
-        """Mock prediction for demonstration - Replace with actual model inference"""
-        # Simulate inference time
-        await asyncio.sleep(0.5)
-        
-        # Generate realistic mock predictions
-        np.random.seed(42)  # For consistent results
-        raw_predictions = np.random.dirichlet([1, 2, 1, 1, 1.5])  # Slightly favor pneumonia
+    async def _get_probabilities(
+        self,
+        image_data: bytes,
+        digest: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> np.ndarray:
+        """Get class probabilities for an image, serving repeat uploads from the result cache"""
+        cache_key = InferenceResultCache.make_key(digest or image_digest(image_data), self.model_version)
+        if self.result_cache is not None:
+            probabilities = await self.result_cache.get(cache_key)
+            if probabilities is not None:
+                return probabilities
         
+        # Identical concurrent uploads share one pending inference, keyed by lane:
+        # a caller joins a call at its own priority or a more urgent one, never
+        # one queued behind it (lanes are listed most urgent first)
+        priority = Priority(priority)
+        lanes = list(Priority)
+        for lane in lanes[:lanes.index(priority)]:
+            if self.single_flight.running(f"{cache_key}:{lane.value}"):
+                priority = lane
+                break
+        flight_key = f"{cache_key}:{priority.value}"
+        return await self.single_flight.do(flight_key, lambda: self._infer_and_cache(image_data, cache_key, priority))
+    
+    async def _infer_and_cache(self, image_data: bytes, cache_key: str, priority: Priority) -> np.ndarray:
+        """Run inference for an image and store the result in the cache"""
+        probabilities = await self._infer_image(image_data, priority)
+        if self.result_cache is not None:
+            await self.result_cache.put(cache_key, probabilities)
+        return probabilities
+    
+    async def _infer_image(self, image_data: bytes, priority: Priority = Priority.INTERACTIVE) -> np.ndarray:
+        """Run an image through the micro-batching scheduler (decode + inference)"""
+        return await self.batcher.submit(image_data, priority)
+    
+    async def _run_inference(self, batch: np.ndarray) -> np.ndarray:
+        """Run one forward pass over a batch of preprocessed images"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._inference_executor, self.backend.run, batch
+        )
+    
+    def _build_predictions(self, probabilities: np.ndarray) -> List[PredictionResult]:
+        """Convert a row of class probabilities into sorted prediction results"""
         predictions = []
-        for i, (class_name, prob) in enumerate(zip(self.class_names, raw_predictions)):
+        for class_name, prob in zip(self.class_names, probabilities):
             predictions.append(PredictionResult(
                 disease_type=class_name,
                 confidence=float(prob),
@@ -203,14 +692,46 @@ class MLService:
         
         return False
     
+    async def iter_batch_analyze(
+        self,
+        image_sources: List[ImageSource],
+        concurrency: Optional[int] = None,
+        priority: Priority = Priority.BATCH
+    ) -> AsyncIterator[Tuple[int, Union[AnalysisResult, Exception]]]:
+        """Analyze multiple X-ray images with bounded concurrency, yielding (index, result) as each finishes"""
+        semaphore = asyncio.Semaphore(concurrency or settings.BATCH_CONCURRENCY)
+        
+        async def analyze(index: int, source: ImageSource) -> Tuple[int, Union[AnalysisResult, Exception]]:
+            async with semaphore:
+                try:
+                    if isinstance(source, IngestedUpload):
+                        image_data = await source.read_async()
+                        return index, await self.predict_lung_disease(
+                            image_data, digest=source.digest, image_metadata=source.metadata, priority=priority
+                        )
+                    return index, await self.predict_lung_disease(source, priority=priority)
+                except Exception as e:
+                    return index, e
+        
+        # Concurrent requests are grouped into shared forward passes by the batcher
+        tasks = [asyncio.create_task(analyze(i, source)) for i, source in enumerate(image_sources)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
     async def batch_analyze(self, image_data_list: List[bytes]) -> List[AnalysisResult]:
         """Analyze multiple X-ray images concurrently"""
-        tasks = [self.predict_lung_disease(img_data) for img_data in image_data_list]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        results = {}
+        async for index, result in self.iter_batch_analyze(image_data_list):
+            results[index] = result
         
         # Filter out exceptions and log errors
         valid_results = []
-        for i, result in enumerate(results):
+        for i in range(len(image_data_list)):
+            result = results[i]
             if isinstance(result, Exception):
                 logger.error(f"Batch analysis failed for image {i}: {str(result)}")
             else:
@@ -0,0 +1,183 @@
+import numpy as np
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Frame: header length and payload length (network byte order), a JSON header,
+# then the raw tensor bytes. Each connection carries one request at a time.
+FRAME_PREFIX = struct.Struct("!II")
+MAX_HEADER_BYTES = 64 * 1024
+
+class RemoteInferenceError(RuntimeError):
+    """Raised when an inference worker fails a request"""
+
+class WorkerUnavailableError(RemoteInferenceError):
+    """Raised when an inference worker cannot be reached; the request can be retried elsewhere"""
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """Parse ``unix:/path/to.sock`` or ``host:port`` into (family, target)"""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid inference worker address '{address}'. Use unix:/path or host:port")
+    return "tcp", (host, int(port))
+
+def encode_frame(header: Dict[str, Any], payload: memoryview = memoryview(b"")) -> list:
+    """Frame pieces for a header and payload, ready for a vectored write"""
+    header_bytes = json.dumps(header).encode()
+    return [FRAME_PREFIX.pack(len(header_bytes), payload.nbytes), header_bytes, payload]
+
+def tensor_header(array: np.ndarray, **fields) -> Dict[str, Any]:
+    """Header describing a tensor payload"""
+    return {"shape": list(array.shape), "dtype": array.dtype.str, **fields}
+
+def tensor_from_payload(header: Dict[str, Any], payload) -> np.ndarray:
+    """Rebuild a tensor from its header and payload buffer (no copy)"""
+    return np.frombuffer(payload, dtype=np.dtype(header["dtype"])).reshape(header["shape"])
+
+class WorkerConnection:
+    """Blocking client connection to one inference worker"""
+    
+    def __init__(self, address: str, timeout: float):
+        self.address = address
+        self.timeout = timeout
+        self.retry_at = 0.0  # Set after a failure so other workers are tried first
+        self._sock: Optional[socket.socket] = None
+    
+    def connect(self):
+        """Open the socket if it is not already open"""
+        if self._sock is not None:
+            return
+        family, target = parse_address(self.address)
+        if family == "unix":
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(target)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+    
+    def close(self):
+        """Close the socket"""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+    
+    def request(self, header: Dict[str, Any], payload: memoryview = memoryview(b"")) -> Tuple[Dict[str, Any], bytearray]:
+        """Send one request and wait for its response; the connection is closed on failure"""
+        try:
+            self.connect()
+            for piece in encode_frame(header, payload):
+                self._sock.sendall(piece)
+            header_length, payload_length = FRAME_PREFIX.unpack(self._recv_exactly(FRAME_PREFIX.size))
+            response = json.loads(self._recv_exactly(header_length))
+            body = self._recv_exactly(payload_length)
+        except (OSError, ValueError) as e:
+            self.close()
+            raise WorkerUnavailableError(f"Inference worker {self.address} unavailable: {str(e)}") from e
+        if not response.get("ok"):
+            raise RemoteInferenceError(f"Inference worker {self.address} failed: {response.get('error')}")
+        return response, body
+    
+    def _recv_exactly(self, size: int) -> bytearray:
+        """Read exactly ``size`` bytes"""
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = self._sock.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError("Connection closed by worker")
+            received += count
+        return buffer
+    
+    def info(self) -> Dict[str, Any]:
+        """Backend name and model version served by the worker"""
+        return self.request({"op": "info"})[0]
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Run a preprocessed batch on the worker and return its output rows"""
+        batch = np.ascontiguousarray(batch)
+        header, body = self.request(tensor_header(batch, op="predict"), memoryview(batch).cast("B"))
+        return tensor_from_payload(header, body)
+
+class InferenceWorkerServer:
+    """Serves a loaded inference backend to MLService instances over a socket.
+    
+    Connections are handled concurrently, but forward passes run one at a
+    time on a single thread, as backends expect.
+    """
+    
+    def __init__(self, backend, address: str):
+        self.backend = backend
+        self.address = address
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference-worker")
+        self.requests_served = 0
+    
+    async def serve_forever(self):
+        """Listen on the configured address until cancelled"""
+        family, target = parse_address(self.address)
+        if family == "unix":
+            if os.path.exists(target):
+                os.unlink(target)  # Stale socket from a previous run
+            server = await asyncio.start_unix_server(self._handle, path=target)
+        else:
+            server = await asyncio.start_server(self._handle, host=target[0], port=target[1])
+        logger.info(f"Inference worker ({self.backend.name} {self.backend.version}) listening on {self.address}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=False)
+            if family == "unix" and os.path.exists(target):
+                os.unlink(target)
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer requests on one connection until the client disconnects"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    prefix = await reader.readexactly(FRAME_PREFIX.size)
+                except asyncio.IncompleteReadError:
+                    return  # Client closed the connection
+                header_length, payload_length = FRAME_PREFIX.unpack(prefix)
+                if header_length > MAX_HEADER_BYTES:
+                    return
+                header = json.loads(await reader.readexactly(header_length))
+                payload = await reader.readexactly(payload_length)
+                
+                try:
+                    if header.get("op") == "info":
+                        response, body = {"ok": True, "backend": self.backend.name, "version": self.backend.version}, b""
+                    elif header.get("op") == "predict":
+                        batch = tensor_from_payload(header, payload)
+                        outputs = await loop.run_in_executor(self._executor, self.backend.run, batch)
+                        outputs = np.ascontiguousarray(outputs)
+                        response, body = tensor_header(outputs, ok=True), memoryview(outputs).cast("B")
+                        self.requests_served += 1
+                    else:
+                        response, body = {"ok": False, "error": f"Unknown op {header.get('op')!r}"}, b""
+                except Exception as e:
+                    logger.error(f"Inference request failed: {str(e)}")
+                    response, body = {"ok": False, "error": str(e)}, b""
+                
+                writer.writelines(encode_frame(response, memoryview(body)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
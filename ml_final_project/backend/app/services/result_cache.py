@@ -0,0 +1,204 @@
+import numpy as np
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import logging
+import asyncio
+
+logger = logging.getLogger(__name__)
+
+def image_digest(image_data: bytes) -> str:
+    """Content hash of an uploaded image"""
+    return hashlib.sha256(image_data).hexdigest()
+
+class InferenceResultCache:
+    """Content-addressed LRU + TTL cache of model outputs.
+    
+    Entries are keyed by the image digest plus the model version and hold the
+    raw class probabilities, so a repeat upload can skip decode and inference
+    while still getting a fresh analysis id. The in-memory tier is bounded by
+    entry count; the optional on-disk tier is bounded by total bytes.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 24 * 3600,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        
+        # key -> (expires_at, probabilities), least recently used first
+        self._memory: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        # key -> file size, least recently used first
+        self._disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        
+        # Cache statistics
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+    
+    @staticmethod
+    def make_key(digest: str, model_version: str) -> str:
+        """Build a cache key from an image digest and the model version"""
+        return f"{model_version}:{digest}"
+    
+    async def get(self, key: str) -> Optional[np.ndarray]:
+        """Look up cached probabilities, checking memory first and then disk"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, probabilities = entry
+            if expires_at > time.time():
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return probabilities
+            del self._memory[key]
+        
+        if self.disk_dir and key in self._disk_index:
+            entry = await asyncio.to_thread(self._disk_get_locked, key)
+            if entry is not None:
+                self._memory_put(key, *entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry[1]
+        
+        self.misses += 1
+        return None
+    
+    async def put(self, key: str, probabilities: np.ndarray):
+        """Store probabilities in both tiers"""
+        expires_at = time.time() + self.ttl_seconds
+        self._memory_put(key, expires_at, probabilities)
+        
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._disk_put_locked, key, expires_at, probabilities)
+            except OSError as e:
+                logger.warning(f"Failed to write result cache entry to disk: {str(e)}")
+    
+    def clear(self):
+        """Drop all in-memory entries"""
+        self._memory.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Report cache size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_enabled": bool(self.disk_dir),
+            "disk_entries": len(self._disk_index),
+            "disk_bytes": self._disk_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions
+        }
+    
+    def _memory_put(self, key: str, expires_at: float, probabilities: np.ndarray):
+        """Insert into the memory tier, evicting least recently used entries"""
+        self._memory[key] = (expires_at, probabilities)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+    
+    # Disk tier (called from worker threads)
+    def _disk_get_locked(self, key: str) -> Optional[Tuple[float, np.ndarray]]:
+        with self._disk_lock:
+            return self._disk_get(key)
+    
+    def _disk_put_locked(self, key: str, expires_at: float, probabilities: np.ndarray):
+        with self._disk_lock:
+            self._disk_put(key, expires_at, probabilities)
+    
+    def _disk_path(self, key: str) -> str:
+        """File path for a cache key"""
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode()).hexdigest() + ".json")
+    
+    def _load_disk_index(self):
+        """Rebuild the disk LRU index from file modification times"""
+        entries = []
+        for filename in os.listdir(self.disk_dir):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.disk_dir, filename)
+            try:
+                with open(path) as f:
+                    key = json.load(f)["key"]
+                stat = os.stat(path)
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((stat.st_mtime, key, stat.st_size))
+        
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+    
+    def _disk_get(self, key: str) -> Optional[Tuple[float, np.ndarray]]:
+        """Read an entry from disk, dropping it if expired or unreadable"""
+        path = self._disk_path(key)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data["expires_at"] <= time.time():
+                self._disk_remove(key)
+                return None
+            os.utime(path)  # Refresh recency across restarts
+        except (OSError, ValueError, KeyError):
+            self._disk_remove(key)
+            return None
+        
+        self._disk_index.move_to_end(key)
+        return data["expires_at"], np.asarray(data["probabilities"], dtype=np.float64)
+    
+    def _disk_put(self, key: str, expires_at: float, probabilities: np.ndarray):
+        """Write an entry to disk atomically and enforce the byte budget"""
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "key": key,
+                "expires_at": expires_at,
+                "probabilities": [float(p) for p in probabilities]
+            }, f)
+        os.replace(tmp_path, path)
+        
+        self._disk_bytes -= self._disk_index.pop(key, 0)
+        size = os.path.getsize(path)
+        self._disk_index[key] = size
+        self._disk_bytes += size
+        self._evict_disk()
+    
+    def _disk_remove(self, key: str):
+        """Delete an entry from disk"""
+        self._disk_bytes -= self._disk_index.pop(key, 0)
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+    
+    def _evict_disk(self):
+        """Evict least recently used disk entries until under the byte budget"""
+        while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+            key = next(iter(self._disk_index))
+            self._disk_remove(key)
+            self.evictions += 1
@@ -0,0 +1,333 @@
+from concurrent.futures import Executor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+import asyncio
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# (collection, document id, data)
+Write = Tuple[str, str, Dict[str, Any]]
+
+# Called, from any thread, after a watched collection changes
+ChangeCallback = Callable[[], None]
+
+class StorageBackend:
+    """Document storage behind FirebaseService.
+    
+    Holds the ``diseases`` and ``analyses`` repositories, whose async methods
+    run blocking calls on the service's I/O pool. Implementations keep
+    Firestore's semantics: documents are dicts keyed by id within a
+    collection, listed in id order, and ``commit_writes`` applies a batch of
+    writes atomically.
+    """
+    
+    name = "base"
+    
+    def __init__(self, executor: Executor):
+        self.executor = executor
+        self.connected = False
+        self.diseases: "DiseaseRepository"
+        self.analyses: "AnalysisRepository"
+        self._watchers: Dict[str, List[ChangeCallback]] = {}
+    
+    def connect(self):
+        """Open the connection (blocking)"""
+        raise NotImplementedError
+    
+    def commit_writes(self, writes: List[Write]):
+        """Apply document writes as one atomic batch (blocking)"""
+        raise NotImplementedError
+    
+    def server_timestamp(self) -> Any:
+        """Value stored as a document's write time"""
+        return datetime.now(timezone.utc)
+    
+    def watch(self, collection: str, callback: ChangeCallback) -> Callable[[], None]:
+        """Call ``callback`` after writes to a collection; returns an unsubscribe function.
+        
+        The base implementation only sees writes made through this backend
+        (in this process).
+        """
+        self._watchers.setdefault(collection, []).append(callback)
+        return lambda: self._watchers.get(collection, []).remove(callback)
+    
+    def _notify(self, writes: List[Write]):
+        """Run the callbacks watching the collections a batch wrote to"""
+        for collection in {collection for collection, _, _ in writes}:
+            for callback in list(self._watchers.get(collection, [])):
+                callback()
+    
+    def close(self):
+        """Release the connection (blocking)"""
+        self.connected = False
+
+class Repository:
+    """Async access to one collection; blocking calls run on the I/O pool"""
+    
+    collection: str = ""
+    
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+    
+    async def _run(self, fn: Callable[..., T], *args) -> T:
+        """Run a blocking call on the I/O pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.storage.executor, functools.partial(fn, *args))
+
+class DiseaseRepository(Repository):
+    """The disease catalog"""
+    
+    collection = 'diseases'
+    
+    async def list_all(self) -> List[Dict[str, Any]]:
+        """Every disease document"""
+        raise NotImplementedError
+    
+    async def find_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """The disease with an exact name, if any"""
+        raise NotImplementedError
+    
+    async def is_empty(self) -> bool:
+        """Whether the catalog has no documents"""
+        raise NotImplementedError
+    
+    async def put_many(self, documents: Dict[str, Dict[str, Any]]):
+        """Write documents by id in one batch"""
+        await self._run(self.storage.commit_writes, [(self.collection, document_id, data) for document_id, data in documents.items()])
+
+class AnalysisRepository(Repository):
+    """Saved analysis results"""
+    
+    collection = 'analyses'
+    
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """An analysis by id, if it exists"""
+        raise NotImplementedError
+
+# Firestore
+
+def _firestore():
+    """The firebase_admin Firestore module, imported on first use (it is slow to import)"""
+    from firebase_admin import firestore
+    return firestore
+
+class FirestoreStorage(StorageBackend):
+    """Cloud Firestore through firebase_admin.
+    
+    The client is synchronous; every thread of the I/O pool reuses the one
+    client (and its gRPC channel), so concurrent reads proceed in parallel.
+    """
+    
+    name = "firestore"
+    
+    def __init__(self, executor: Executor):
+        super().__init__(executor)
+        self.client = None
+        self.app = None
+        self.diseases = FirestoreDiseaseRepository(self)
+        self.analyses = FirestoreAnalysisRepository(self)
+    
+    def connect(self):
+        """Initialize the Firebase app and create the Firestore client"""
+        import firebase_admin
+        from firebase_admin import credentials
+        
+        # Check if Firebase app is already initialized
+        if not firebase_admin._apps:
+            # Initialize Firebase
+            if os.path.exists(settings.FIREBASE_CREDENTIALS_PATH):
+                cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
+                self.app = firebase_admin.initialize_app(cred, {
+                    'projectId': settings.FIREBASE_PROJECT_ID,
+                })
+            else:
+                # Use default credentials (for deployment)
+                self.app = firebase_admin.initialize_app()
+            
+            logger.info("✅ Firebase initialized successfully")
+        else:
+            self.app = firebase_admin.get_app()
+            logger.info("✅ Using existing Firebase app")
+        
+        self.client = _firestore().client()
+        self.connected = True
+    
+    def collection(self, name: str):
+        """Reference to a collection"""
+        if self.client is None:
+            raise RuntimeError("Firestore is not connected")
+        return self.client.collection(name)
+    
+    def commit_writes(self, writes: List[Write]):
+        batch = self.client.batch()
+        for collection, document_id, data in writes:
+            batch.set(self.collection(collection).document(document_id), data)
+        batch.commit()
+    
+    def server_timestamp(self) -> Any:
+        return _firestore().SERVER_TIMESTAMP
+    
+    def watch(self, collection: str, callback: ChangeCallback) -> Callable[[], None]:
+        """Subscribe with a snapshot listener, which also sees other writers"""
+        watch = self.collection(collection).on_snapshot(lambda snapshot, changes, read_time: callback())
+        return watch.unsubscribe
+    
+    @staticmethod
+    def with_id(doc) -> Dict[str, Any]:
+        """Document data with its Firestore id"""
+        data = doc.to_dict()
+        data['firestore_id'] = doc.id
+        return data
+
+class FirestoreDiseaseRepository(DiseaseRepository):
+    async def list_all(self) -> List[Dict[str, Any]]:
+        storage = self.storage
+        return await self._run(lambda: [storage.with_id(doc) for doc in storage.collection(self.collection).stream()])
+    
+    async def find_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        def query():
+            docs = list(self.storage.collection(self.collection).where('name', '==', name).limit(1).stream())
+            return self.storage.with_id(docs[0]) if docs else None
+        return await self._run(query)
+    
+    async def is_empty(self) -> bool:
+        return await self._run(lambda: not self.storage.collection(self.collection).limit(1).get())
+
+class FirestoreAnalysisRepository(AnalysisRepository):
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        def fetch():
+            doc = self.storage.collection(self.collection).document(analysis_id).get()
+            return doc.to_dict() if doc.exists else None
+        return await self._run(fetch)
+
+# Local SQLite / in-memory
+
+LOCAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+"""
+
+class SQLiteStorage(StorageBackend):
+    """Local stand-in for Firestore in a SQLite file, for development,
+    benchmarks and CI without a Google project or network.
+    
+    Documents are stored as JSON; datetimes come back as ISO strings.
+    """
+    
+    name = "sqlite"
+    
+    def __init__(self, executor: Executor, path: Optional[str] = None):
+        super().__init__(executor)
+        self.path = path or settings.LOCAL_STORAGE_PATH
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.diseases = LocalDiseaseRepository(self)
+        self.analyses = LocalAnalysisRepository(self)
+    
+    def connect(self):
+        if self._conn is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if self.path != ":memory:" and directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        with conn:
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(LOCAL_SCHEMA)
+        self._conn = conn
+        self.connected = True
+        logger.info(f"✅ Using local {self.name} storage ({self.path})")
+    
+    def query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """Run a read query"""
+        if self._conn is None:
+            raise RuntimeError("Local storage is not connected")
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+    
+    def commit_writes(self, writes: List[Write]):
+        rows = [(collection, document_id, json.dumps(data, default=_json_default)) for collection, document_id, data in writes]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)", rows)
+        self._notify(writes)
+    
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+        super().close()
+
+class MemoryStorage(SQLiteStorage):
+    """SQLite storage held in memory; contents are lost on restart"""
+    
+    name = "memory"
+    
+    def __init__(self, executor: Executor):
+        super().__init__(executor, path=":memory:")
+
+def _json_default(value: Any) -> Any:
+    """Encode values JSON does not support natively"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "value"):
+        return value.value  # Enums
+    raise TypeError(f"Cannot store {type(value).__name__} in local storage")
+
+def _document(row: sqlite3.Row, with_id: bool) -> Dict[str, Any]:
+    """Decode a stored document"""
+    data = json.loads(row[1])
+    if with_id:
+        data['firestore_id'] = row[0]
+    return data
+
+class LocalDiseaseRepository(DiseaseRepository):
+    async def list_all(self) -> List[Dict[str, Any]]:
+        rows = await self._run(self.storage.query, "SELECT id, data FROM documents WHERE collection = ? ORDER BY id", (self.collection,))
+        return [_document(row, with_id=True) for row in rows]
+    
+    async def find_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        rows = await self._run(
+            self.storage.query,
+            "SELECT id, data FROM documents WHERE collection = ? AND json_extract(data, '$.name') = ? ORDER BY id LIMIT 1",
+            (self.collection, name)
+        )
+        return _document(rows[0], with_id=True) if rows else None
+    
+    async def is_empty(self) -> bool:
+        rows = await self._run(self.storage.query, "SELECT 1 FROM documents WHERE collection = ? LIMIT 1", (self.collection,))
+        return not rows
+
+class LocalAnalysisRepository(AnalysisRepository):
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._run(
+            self.storage.query, "SELECT id, data FROM documents WHERE collection = ? AND id = ?", (self.collection, analysis_id)
+        )
+        return _document(rows[0], with_id=False) if rows else None
+
+STORAGE_BACKENDS: Dict[str, Type[StorageBackend]] = {
+    "firestore": FirestoreStorage,
+    "sqlite": SQLiteStorage,
+    "memory": MemoryStorage,
+}
+
+def create_storage(name: str, executor: Executor) -> StorageBackend:
+    """Instantiate the storage backend selected in config"""
+    storage_class = STORAGE_BACKENDS.get(name)
+    if storage_class is None:
+        raise ValueError(f"Unknown storage backend '{name}'. Available: {', '.join(STORAGE_BACKENDS)}")
+    return storage_class(executor)
@@ -0,0 +1,221 @@
+from typing import Dict, Iterable, List, Sequence, Tuple
+import bisect
+
+import numpy as np
+
+from ..models.schemas import Disease
+
+SEPARATOR = "\x00"  # Joins the vocabulary into one searchable text; symptoms containing it are matched entry by entry
+
+def normalize_symptom(text: str) -> str:
+    """The form symptoms are compared in: lowercased, nothing else (punctuation counts)"""
+    return text.lower()
+
+class _Automaton:
+    """Aho-Corasick automaton: every pattern occurring in a text, in one pass over it"""
+    
+    def __init__(self, patterns: Sequence[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        
+        ends: Dict[int, List[int]] = {}
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = next_state
+            ends.setdefault(state, []).append(index)
+        
+        # Breadth-first: link each state to its longest proper suffix in the trie
+        queue = list(self._goto[0].values())
+        for state in queue:
+            self._out[state] = tuple(ends.get(state, ()))
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                link = self._goto[fallback].get(char, 0)
+                self._fail[child] = link if link != child else 0
+                self._out[child] = tuple(ends.get(child, ())) + self._out[self._fail[child]]
+                queue.append(child)
+    
+    def find(self, text: str) -> List[int]:
+        """Indexes of the patterns occurring in a text"""
+        found = []
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            found.extend(self._out[state])
+        return found
+
+class SymptomMatches:
+    """Matches of a list of reported symptoms against the catalog.
+    
+    ``hits[i, j]`` is whether reported symptom ``i`` matches a symptom of
+    disease ``j`` (in catalog order); ``scores[j]`` is how many reported
+    symptoms disease ``j`` matches.
+    """
+    
+    def __init__(self, symptoms: Sequence[str], hits: np.ndarray):
+        self.symptoms = list(symptoms)
+        self.hits = hits
+        self.scores = hits.sum(axis=0)
+
+class SymptomMatcher:
+    """Symptom-to-disease matching engine, built once per catalog version.
+    
+    A reported symptom matches a disease symptom when either contains the
+    other, ignoring case; an empty symptom is contained in every symptom.
+    The distinct lowercased disease symptoms form
+    the vocabulary; an Aho-Corasick automaton finds the vocabulary entries
+    contained in a reported symptom, and a scan of the joined vocabulary finds
+    the entries containing it. A sparse (CSR) vocabulary × disease incidence
+    matrix turns the matched entries into disease hits for every reported
+    symptom at once.
+    """
+    
+    def __init__(self, diseases: Sequence[Disease]):
+        self.diseases = tuple(diseases)
+        
+        vocabulary: Dict[str, int] = {}
+        rows: List[int] = []
+        columns: List[int] = []
+        for column, disease in enumerate(self.diseases):
+            for symptom in disease.symptoms:
+                term = normalize_symptom(symptom)
+                row = vocabulary.setdefault(term, len(vocabulary))
+                rows.append(row)
+                columns.append(column)
+        self.vocabulary: Tuple[str, ...] = tuple(vocabulary)
+        
+        # Incidence matrix in CSR form: diseases of vocabulary entry r are
+        # indices[indptr[r]:indptr[r + 1]]
+        pairs = np.unique(np.array([rows, columns], dtype=np.int64).reshape(2, -1), axis=1)
+        self.indices = pairs[1].astype(np.int32)
+        self.indptr = np.searchsorted(pairs[0], np.arange(len(self.vocabulary) + 1)).astype(np.int64)
+        
+        # The automaton has no state for an empty entry; it is in every symptom
+        self._empty_entries = [entry for entry, term in enumerate(self.vocabulary) if not term]
+        self._automaton = _Automaton(self.vocabulary)
+        self._text = SEPARATOR.join(self.vocabulary)
+        self._starts = []
+        offset = 0
+        for term in self.vocabulary:
+            self._starts.append(offset)
+            offset += len(term) + 1
+    
+    def _containing(self, term: str) -> List[int]:
+        """Vocabulary entries that contain a term"""
+        found = []
+        position = self._text.find(term)
+        while position != -1:
+            entry = bisect.bisect_right(self._starts, position) - 1
+            found.append(entry)
+            # Continue after this entry; it is matched once
+            next_start = self._starts[entry + 1] if entry + 1 < len(self._starts) else len(self._text)
+            position = self._text.find(term, next_start)
+        return found
+    
+    def vocabulary_matches(self, symptom: str) -> List[int]:
+        """Vocabulary entries a reported symptom matches (either contains the other)"""
+        term = normalize_symptom(symptom)
+        if not term:
+            return list(range(len(self.vocabulary)))  # Contained in every entry
+        if SEPARATOR in term:
+            # Would match across entries in the joined text; check each entry instead
+            return [entry for entry, candidate in enumerate(self.vocabulary) if term in candidate or candidate in term]
+        return sorted(set(self._automaton.find(term)) | set(self._containing(term)) | set(self._empty_entries))
+    
+    def match(self, symptoms: Iterable[str]) -> SymptomMatches:
+        """Match reported symptoms against every disease in one pass"""
+        symptoms = list(symptoms)
+        entry_rows: List[int] = []
+        entries: List[int] = []
+        for row, symptom in enumerate(symptoms):
+            matched = self.vocabulary_matches(symptom)
+            entries.extend(matched)
+            entry_rows.extend([row] * len(matched))
+        
+        # Gather the incidence rows of every matched entry at once
+        hits = np.zeros((len(symptoms), len(self.diseases)), dtype=bool)
+        if entries:
+            entry_ids = np.array(entries, dtype=np.int64)
+            starts = self.indptr[entry_ids]
+            lengths = self.indptr[entry_ids + 1] - starts
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            hits[np.repeat(np.array(entry_rows, dtype=np.int64), lengths), self.indices[offsets]] = True
+        return SymptomMatches(symptoms, hits)
+    
+    def match_batch(self, records: Sequence[Sequence[str]]) -> "BatchSymptomMatches":
+        """Match the symptoms of many patients, matching each distinct symptom once"""
+        terms: Dict[str, int] = {}
+        indices: List[int] = []
+        indptr = [0]
+        for symptoms in records:
+            for symptom in symptoms:
+                indices.append(terms.setdefault(symptom.lower(), len(terms)))
+            indptr.append(len(indices))
+        return BatchSymptomMatches(
+            self,
+            list(terms),
+            np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int64)
+        )
+
+class BatchSymptomMatches:
+    """Symptoms of many patients, encoded as a sparse patient × symptom matrix.
+    
+    Row ``p`` of the CSR matrix (``indices[indptr[p]:indptr[p + 1]]``) lists
+    patient ``p``'s reported symptoms as ids into ``terms``, the distinct
+    lowercased symptoms of the batch; ``hits[t, j]`` is whether term ``t``
+    matches disease ``j``. Per-patient totals (such as disease scores) are
+    gathered straight from the CSR arrays, so nothing of size patients ×
+    terms is ever built.
+    """
+    
+    def __init__(self, matcher: SymptomMatcher, terms: List[str], indptr: np.ndarray, indices: np.ndarray):
+        self.matcher = matcher
+        self.terms = terms
+        self.indptr = indptr
+        self.indices = indices
+        self.hits = matcher.match(terms).hits
+        self._hit_counts = self.hits.astype(np.int32)
+    
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+    
+    def symptom_counts(self, start: int, stop: int) -> np.ndarray:
+        """Number of reported symptoms of each patient in a range"""
+        return np.diff(self.indptr[start:stop + 1])
+    
+    def patient_sums(self, values: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """Sum of per-term ``values`` (one row per term) over each patient's symptoms, for a range of patients
+        
+        Repeated symptoms count each time they are reported.
+        """
+        counts = self.symptom_counts(start, stop)
+        sums = np.zeros((stop - start,) + values.shape[1:], dtype=values.dtype)
+        gathered = values[self.indices[self.indptr[start]:self.indptr[stop]]]
+        if len(gathered):
+            # reduceat needs strictly increasing offsets: patients with no symptoms keep their zeros
+            reported = counts > 0
+            offsets = (self.indptr[start:stop] - self.indptr[start])[reported]
+            sums[reported] = np.add.reduceat(gathered, offsets, axis=0)
+        return sums
+    
+    def scores(self, start: int, stop: int) -> np.ndarray:
+        """How many of each patient's symptoms match each disease, for a range of patients"""
+        return self.patient_sums(self._hit_counts, start, stop).astype(np.int64)
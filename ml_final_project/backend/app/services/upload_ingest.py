@@ -0,0 +1,82 @@
+from fastapi import UploadFile
+from typing import BinaryIO, Optional, Tuple
+import aiofiles
+import hashlib
+import asyncio
+import io
+
+from ..core.config import settings
+from ..models.schemas import ImageMetadata
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size limit"""
+
+class IngestedUpload:
+    """An upload's spool file, taken over from the multipart parser.
+    
+    The parser has already written the part to a SpooledTemporaryFile: small
+    bodies stay in memory, anything over ``UPLOAD_SPOOL_MAX_MEMORY`` is on
+    disk. That spool is kept as is, not copied. The content digest is computed
+    at ingest, so later stages (cache, single-flight) don't hash the bytes again.
+    """
+    
+    def __init__(self, spool: BinaryIO, size: int, digest: str, filename: Optional[str], content_type: Optional[str]):
+        self.spool = spool
+        self.size = size
+        self.digest = digest
+        self.filename = filename
+        self.content_type = content_type
+        self.metadata: Optional[ImageMetadata] = None  # Set once the image header is probed
+    
+    def read(self) -> bytes:
+        """Read the full upload contents (blocking)"""
+        self.spool.seek(0)
+        return self.spool.read()
+    
+    async def read_async(self) -> bytes:
+        """Read the full upload contents without blocking the event loop"""
+        return await asyncio.to_thread(self.read)
+    
+    async def save_to(self, path: str):
+        """Copy the upload to a file in chunks"""
+        self.spool.seek(0)
+        async with aiofiles.open(path, 'wb') as f:
+            while chunk := await asyncio.to_thread(self.spool.read, settings.UPLOAD_CHUNK_SIZE):
+                await f.write(chunk)
+    
+    def close(self):
+        """Release the spool (deletes any on-disk temp file)"""
+        self.spool.close()
+
+def _hash_in_place(spool: BinaryIO, max_size: int, filename: Optional[str]) -> Tuple[int, str]:
+    """Size and SHA-256 of a spool, read in chunks and rewound (blocking)"""
+    hasher = hashlib.sha256()
+    size = 0
+    spool.seek(0)
+    while chunk := spool.read(settings.UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            raise UploadTooLargeError(f"File {filename} too large")
+        hasher.update(chunk)
+    spool.seek(0)
+    return size, hasher.hexdigest()
+
+async def ingest_upload(file: UploadFile, max_size: Optional[int] = None) -> IngestedUpload:
+    """Check an upload's size and hash it in place, then take ownership of its spool.
+    
+    The request body has already been received and spooled by the time the
+    endpoint runs (oversized bodies are cut off earlier, by
+    ``RequestSizeLimitMiddleware``). The spool is detached from the
+    ``UploadFile`` so it stays open after the framework closes the request's
+    files; the caller closes it through ``IngestedUpload.close``.
+    """
+    max_size = max_size or settings.MAX_FILE_SIZE
+    
+    # The multipart parser already knows the size
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLargeError(f"File {file.filename} too large")
+    
+    size, digest = await asyncio.to_thread(_hash_in_place, file.file, max_size, file.filename)
+    spool = file.file
+    file.file = io.BytesIO()  # What the framework's cleanup closes instead
+    return IngestedUpload(spool, size, digest, file.filename, file.content_type)
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from ..core.admission import OverloadedError
+
+logger = logging.getLogger(__name__)
+
+# (collection, document id, data)
+Write = Tuple[str, str, Dict[str, Any]]
+
+class WriteBehindQueue:
+    """Buffers document writes and commits them in batches off the request path.
+    
+    Writes are keyed by document, so a document rewritten before it is
+    committed is only written once. A background worker waits briefly for a
+    batch to fill, commits up to ``max_batch_size`` writes at a time with
+    ``commit_fn`` (run on ``executor``) and retries failed batches with
+    exponential backoff. Pending and in-flight writes can be read back with
+    ``get`` until they are committed.
+    """
+    
+    def __init__(
+        self,
+        commit_fn: Callable[[List[Write]], None],
+        max_batch_size: int = 500,
+        flush_interval_ms: float = 50.0,
+        max_pending: int = 10000,
+        max_retries: int = 5,
+        retry_backoff_seconds: float = 0.5,
+        is_ready: Optional[Callable[[], bool]] = None,
+        executor: Optional[Executor] = None
+    ):
+        self.commit_fn = commit_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000.0
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_seconds
+        self.is_ready = is_ready or (lambda: True)
+        self.executor = executor  # Runs commit_fn; defaults to the loop's executor
+        self._pending: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        
+        # Queue statistics
+        self.enqueued = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+        self.last_commit_ms = 0.0
+    
+    def put(self, collection: str, document_id: str, data: Dict[str, Any]):
+        """Queue a document write; raises OverloadedError when the queue is full"""
+        key = (collection, document_id)
+        if key in self._pending:
+            self.coalesced += 1
+        elif len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            raise OverloadedError("persist")
+        self._pending[key] = data
+        self.enqueued += 1
+        self._start()
+        self._wakeup.set()
+    
+    def get(self, collection: str, document_id: str) -> Optional[Dict[str, Any]]:
+        """A write that is queued or being committed, if any"""
+        key = (collection, document_id)
+        return self._pending.get(key) or self._in_flight.get(key)
+    
+    def depth(self) -> int:
+        """Writes not yet committed"""
+        return len(self._pending) + len(self._in_flight)
+    
+    async def flush(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for every queued write to be committed"""
+        deadline = time.monotonic() + timeout
+        while self.depth() and self.is_ready() and self._worker is not None and not self._worker.done():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return not self.depth()
+    
+    async def close(self, timeout: float):
+        """Flush, then stop the worker; writes still queued are logged as lost"""
+        flushed = await self.flush(timeout)
+        if not flushed:
+            logger.error(f"❌ {self.depth()} queued Firestore writes were not committed before shutdown")
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+    
+    def _start(self):
+        """Start the worker on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        """Commit queued writes in batches until cancelled"""
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if not self.is_ready():
+                await asyncio.sleep(self.retry_backoff)  # Database not connected yet
+                continue
+            if len(self._pending) < self.max_batch_size and self.flush_interval:
+                await asyncio.sleep(self.flush_interval)  # Let a batch gather
+            
+            while self._pending and len(self._in_flight) < self.max_batch_size:
+                key, data = self._pending.popitem(last=False)
+                self._in_flight[key] = data
+            try:
+                await self._commit_with_retry()
+            finally:
+                self._in_flight.clear()
+    
+    async def _commit_with_retry(self):
+        """Commit the in-flight batch, backing off between failed attempts"""
+        writes = [(collection, document_id, data) for (collection, document_id), data in self._in_flight.items()]
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await asyncio.get_running_loop().run_in_executor(self.executor, self.commit_fn, writes)
+            except Exception as e:
+                self.last_error = str(e)
+                if attempt == self.max_retries:
+                    self.failed += len(writes)
+                    logger.error(f"❌ Dropping {len(writes)} Firestore writes after {attempt + 1} attempts: {str(e)}")
+                    return
+                self.retries += 1
+                delay = min(self.retry_backoff * 2 ** attempt, 30.0)
+                logger.warning(f"Firestore batch write failed ({str(e)}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            else:
+                self.last_commit_ms = 1000.0 * (time.perf_counter() - started)
+                self.written += len(writes)
+                self.batches += 1
+                return
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Report queue depth and write outcomes"""
+        return {
+            "queue_depth": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "max_pending": self.max_pending,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": self.written / self.batches if self.batches else 0.0,
+            "last_commit_ms": self.last_commit_ms,
+            "retries": self.retries,
+            "failed": self.failed,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the API
+
+Measures, each in a fresh interpreter:
+  * import time of app.main, with the slowest imported modules (-X importtime)
+  * time from launching uvicorn until /health answers (time-to-first-request)
+  * time until /ready reports every startup stage complete (time-to-ready)
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+def measure_import(top: int):
+    """Return (total import seconds, slowest top-level imports) for app.main"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # Header line
+        modules.append((int(cumulative) / 1e6, name.rstrip(), len(name) - len(name.lstrip())))
+    
+    # importtime lists a module after its imports: walk back from app.main
+    # collecting its direct imports (one level deeper), slowest first
+    main_index = max(i for i, (_, name, _) in enumerate(modules) if name.strip() == "app.main")
+    total, _, main_indent = modules[main_index]
+    children = []
+    for seconds, name, indent in reversed(modules[:main_index]):
+        if indent <= main_indent:
+            break
+        if indent == main_indent + 2:
+            children.append((seconds, name.strip()))
+    return total, sorted(children, reverse=True)[:top]
+
+# Talk to the local server directly, ignoring any proxy settings
+opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+def wait_for(url: str, expected_status: int, started: float, timeout: float, server: subprocess.Popen) -> float:
+    """Poll a URL until it returns the expected status; seconds since ``started``"""
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode} before {url} responded")
+        try:
+            with opener.open(url, timeout=1) as response:
+                if response.status == expected_status:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} not available after {timeout:.0f}s")
+
+def measure_startup(port: int, timeout: float):
+    """Return (time to first /health response, time to /ready)"""
+    env = dict(os.environ, PYTHONPATH=".")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        first_request = wait_for(f"http://127.0.0.1:{port}/health", 200, started, timeout, server)
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", 200, started, timeout, server)
+    finally:
+        server.terminate()
+        server.wait()
+    return first_request, ready
+
+def main():
+    """Run the benchmark and print the results"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="Number of slowest imports to list")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    
+    print("📊 Cold start")
+    print("=" * 50)
+    import_total, slowest = measure_import(args.top)
+    print(f"Import app.main: {1000 * import_total:8.1f} ms")
+    for seconds, name in slowest:
+        print(f"  {name:<40} {1000 * seconds:8.1f} ms")
+    
+    print("=" * 50)
+    runs = [measure_startup(args.port, args.timeout) for _ in range(args.runs)]
+    for i, (first_request, ready) in enumerate(runs, 1):
+        print(f"Run {i}: first request {1000 * first_request:8.1f} ms   ready {1000 * ready:8.1f} ms")
+    print("=" * 50)
+    print(f"Best: first request {1000 * min(r[0] for r in runs):.1f} ms, ready {1000 * min(r[1] for r in runs):.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# Settings are read at import: run the app on in-process backends, with state under a scratch directory
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("INFERENCE_BACKEND", "numpy")
+os.environ.setdefault("PREPROCESS_EXECUTOR", "thread")
+os.environ.setdefault("CATALOG_WATCH_CHANGES", "false")
+
+_scratch = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("JOB_DB_PATH", os.path.join(_scratch, "jobs.db"))
+os.environ.setdefault("JOB_STORAGE_DIR", os.path.join(_scratch, "jobs"))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Inference worker for the "remote" backend
+
+Loads a model with one of the local backends (keras, savedmodel, tflite,
+onnx, numpy), warms up every batch bucket and serves forward passes over a
+Unix socket or TCP. Point the API at it with:
+  
+  INFERENCE_BACKEND=remote INFERENCE_WORKER_ADDRESSES='["unix:/tmp/lung-inference-0.sock"]'
+
+--processes starts several workers on one host; "{index}" in a Unix socket
+path (or the port, incremented per process) gives each its own address.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+
+from app.core.config import settings
+
+def worker_address(listen: str, index: int) -> str:
+    """Address of the index-th worker for a --listen pattern"""
+    if listen.startswith("unix:"):
+        return listen.replace("{index}", str(index))
+    host, _, port = listen.rpartition(":")
+    return f"{host}:{int(port) + index}"
+
+def run_worker(address: str, backend_name: str, processes: int):
+    """Load the backend and serve it until interrupted (one process)"""
+    from app.services.ml_service import create_configured_backend
+    from app.services.remote_inference import InferenceWorkerServer
+    
+    logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    # Worker processes on this host split its cores between them
+    backend = create_configured_backend(backend_name, workers=processes)
+    backend.load()
+    backend.warmup()
+    
+    server = InferenceWorkerServer(backend, address)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.close()
+
+def main():
+    """Parse arguments and start the worker processes"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listen", default="unix:/tmp/lung-inference-{index}.sock",
+                        help="unix:/path/to.sock or host:port")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--backend", default=None,
+                        help="Local backend to serve (defaults to INFERENCE_BACKEND unless that is 'remote')")
+    args = parser.parse_args()
+    
+    backend_name = args.backend or settings.INFERENCE_BACKEND
+    if backend_name == "remote":
+        parser.error("INFERENCE_BACKEND is 'remote'; pass --backend with the model runtime to serve")
+    
+    addresses = [worker_address(args.listen, i) for i in range(args.processes)]
+    if len(set(addresses)) < len(addresses):
+        parser.error("Each process needs its own address; add {index} to the socket path")
+    
+    print(f"🧠 Starting {len(addresses)} inference worker(s) ({backend_name} backend)")
+    print(f"   INFERENCE_WORKER_ADDRESSES='{json.dumps(addresses)}'")
+    if len(addresses) == 1:
+        run_worker(addresses[0], backend_name, 1)
+        return
+    
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(address, backend_name, len(addresses))) for address in addresses]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+            process.join()
+    print("\n👋 Inference workers stopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Offline model optimizer for CPU inference
+
+Produces quantized variants of the model in MODEL_PATH and writes a report of
+per-image latency, memory footprint and top-1 agreement with the original:
+  
+  keras / savedmodel source -> TFLite dynamic-range int8, full int8, float16
+  onnx source               -> ONNX dynamic-range int8, full int8 (QDQ)
+
+Full-int8 calibration and the agreement check use X-rays from uploads/.
+Serve a variant with the INFERENCE_BACKEND / MODEL_FILENAME printed at the end.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.image_preprocessing import decode_image
+from app.services.inference_backends import create_backend
+from app.services.ml_service import CLASS_NAMES
+
+TFLITE_VARIANTS = ["dynamic_int8", "int8", "float16"]
+ONNX_VARIANTS = ["dynamic_int8", "int8"]
+
+def load_images(directory: str, limit: int) -> np.ndarray:
+    """Decode up to ``limit`` readable images from a directory into a float32 batch"""
+    images = []
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            images.append(decode_image(data))
+        except Exception:
+            continue  # Not an image we can decode
+        if len(images) >= limit:
+            break
+    if not images:
+        raise SystemExit(f"❌ No decodable images found in {directory}")
+    return np.stack(images)
+
+def prune_weights(weights: list, sparsity: float) -> list:
+    """Zero the smallest-magnitude entries of every kernel (arrays with 2+ dims)"""
+    pruned = []
+    for weight in weights:
+        if weight.ndim >= 2 and sparsity > 0:
+            threshold = np.quantile(np.abs(weight), sparsity)
+            weight = np.where(np.abs(weight) < threshold, 0, weight).astype(weight.dtype)
+        pruned.append(weight)
+    return pruned
+
+def convert_tflite(source: str, variant: str, calibration: np.ndarray, output: str, sparsity: float):
+    """Convert a Keras/SavedModel model to a TFLite variant"""
+    import tensorflow as tf
+    
+    if os.path.isdir(source) and not sparsity:
+        converter = tf.lite.TFLiteConverter.from_saved_model(source)
+    else:
+        model = tf.keras.models.load_model(source, compile=False)
+        if sparsity:
+            model.set_weights(prune_weights(model.get_weights(), sparsity))
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        converter.representative_dataset = lambda: ([image[np.newaxis]] for image in calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    
+    with open(output, "wb") as f:
+        f.write(converter.convert())
+
+def convert_onnx(source: str, variant: str, calibration: np.ndarray, output: str, sparsity: float):
+    """Quantize an ONNX model with ONNX Runtime's quantization tools"""
+    import onnx
+    from onnx import numpy_helper
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    )
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        if sparsity:
+            model = onnx.load(source)
+            for initializer in model.graph.initializer:
+                weight = numpy_helper.to_array(initializer)
+                initializer.CopyFrom(numpy_helper.from_array(prune_weights([weight], sparsity)[0], initializer.name))
+            source = os.path.join(work_dir, "pruned.onnx")
+            onnx.save(model, source)
+        
+        if variant == "dynamic_int8":
+            quantize_dynamic(source, output, weight_type=QuantType.QInt8)
+            return
+        
+        input_name = onnx.load(source, load_external_data=False).graph.input[0].name
+        
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                self._images = iter(calibration)
+            
+            def get_next(self):
+                image = next(self._images, None)
+                return None if image is None else {input_name: image[np.newaxis]}
+        
+        quantize_static(
+            source,
+            output,
+            Reader(),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QInt8,
+            weight_type=QuantType.QInt8
+        )
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def evaluate(backend_name: str, model_dir: str, filename: str, images: np.ndarray, threads, repeats: int) -> dict:
+    """Load one model and time single-image inference (run in a fresh process)"""
+    backend = create_backend(backend_name, model_dir, model_filename=filename, num_threads=threads)
+    backend.load()
+    
+    probabilities = np.concatenate([backend.predict(images[i:i + 1]) for i in range(len(images))])
+    timings = []
+    for _ in range(repeats):
+        for i in range(len(images)):
+            started = time.perf_counter()
+            backend.predict(images[i:i + 1])
+            timings.append(time.perf_counter() - started)
+    backend.close()
+    
+    return {
+        "latency_ms_p50": 1000 * float(np.median(timings)),
+        "latency_ms_p95": 1000 * float(np.percentile(timings, 95)),
+        "peak_rss_mb": _peak_rss_mb(),
+        "probabilities": probabilities,
+    }
+
+def run_isolated(*args) -> dict:
+    """Evaluate in a fresh process so peak memory is comparable across models"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(evaluate, *args).result()
+
+def file_size_mb(path: str, compressed: bool = False) -> float:
+    """Size of a model file or directory, optionally gzip-compressed (shows pruning gains)"""
+    paths = [path]
+    if os.path.isdir(path):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+    total = 0
+    for file_path in paths:
+        with open(file_path, "rb") as f:
+            total += len(gzip.compress(f.read())) if compressed else os.path.getsize(file_path)
+    return total / (1024 * 1024)
+
+def compare(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Top-1 agreement with the reference model, overall and per reference class"""
+    reference_top1 = reference.argmax(axis=1)
+    agrees = reference_top1 == candidate.argmax(axis=1)
+    per_class = {}
+    for index, class_name in enumerate(CLASS_NAMES):
+        mask = reference_top1 == index
+        per_class[class_name.value] = {
+            "images": int(mask.sum()),
+            "agreement": float(agrees[mask].mean()) if mask.any() else None,
+        }
+    return {
+        "top1_agreement": float(agrees.mean()),
+        "max_probability_delta": float(np.abs(reference - candidate).max()),
+        "per_class": per_class,
+    }
+
+def main():
+    """Build the variants, evaluate them and write the report"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source_backends = ["keras", "savedmodel", "onnx"]
+    parser.add_argument("--backend", choices=source_backends,
+                        default=settings.INFERENCE_BACKEND if settings.INFERENCE_BACKEND in source_backends else "keras",
+                        help="Format of the source model (defaults to INFERENCE_BACKEND, or keras when that is not a source format)")
+    parser.add_argument("--model-path", default=settings.MODEL_PATH)
+    parser.add_argument("--model-filename", default=settings.MODEL_FILENAME)
+    parser.add_argument("--output-dir", default=None, help="Defaults to --model-path")
+    parser.add_argument("--variants", nargs="+", default=None, help="Subset of variants to build")
+    parser.add_argument("--images-dir", default="uploads", help="Calibration and evaluation images")
+    parser.add_argument("--calibration-samples", type=int, default=100)
+    parser.add_argument("--eval-samples", type=int, default=200)
+    parser.add_argument("--prune-sparsity", type=float, default=0.0,
+                        help="Fraction of smallest weights to zero before conversion (no fine-tuning)")
+    parser.add_argument("--threads", type=int, default=settings.INFERENCE_THREADS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--report", default=None, help="Defaults to <output-dir>/optimization_report.json")
+    args = parser.parse_args()
+    
+    output_dir = args.output_dir or args.model_path
+    os.makedirs(output_dir, exist_ok=True)
+    source = create_backend(args.backend, args.model_path, model_filename=args.model_filename).model_file
+    if source is None:
+        raise SystemExit(f"❌ The {args.backend} backend has no model file to optimize")
+    if not os.path.exists(source):
+        raise SystemExit(f"❌ Model not found: {source}")
+    
+    if args.backend == "onnx":
+        target_backend, convert, extension, available = "onnx", convert_onnx, ".onnx", ONNX_VARIANTS
+    else:
+        target_backend, convert, extension, available = "tflite", convert_tflite, ".tflite", TFLITE_VARIANTS
+    variants = args.variants or available
+    unknown = set(variants) - set(available)
+    if unknown:
+        raise SystemExit(f"❌ Unsupported variants for {args.backend}: {', '.join(sorted(unknown))}")
+    
+    images = load_images(args.images_dir, max(args.calibration_samples, args.eval_samples))
+    calibration, evaluation = images[:args.calibration_samples], images[:args.eval_samples]
+    stem = os.path.splitext(os.path.basename(source.rstrip(os.sep)))[0]
+    suffix = f"_pruned{int(args.prune_sparsity * 100)}" if args.prune_sparsity else ""
+    
+    print(f"📊 Optimizing {source} ({len(calibration)} calibration / {len(evaluation)} evaluation images)")
+    print("=" * 50)
+    reference = run_isolated(args.backend, os.path.dirname(source), os.path.basename(source.rstrip(os.sep)),
+                             evaluation, args.threads, args.repeats)
+    rows = [{
+        "variant": "original",
+        "backend": args.backend,
+        "file": source,
+        "size_mb": file_size_mb(source),
+        "compressed_size_mb": file_size_mb(source, compressed=True),
+        **{key: value for key, value in reference.items() if key != "probabilities"},
+        **compare(reference["probabilities"], reference["probabilities"]),
+    }]
+    
+    for variant in variants:
+        filename = f"{stem}_{variant}{suffix}{extension}"
+        output = os.path.join(output_dir, filename)
+        print(f"🔧 Building {filename}...")
+        started = time.perf_counter()
+        convert(source, variant, calibration, output, args.prune_sparsity)
+        conversion_seconds = time.perf_counter() - started
+        
+        result = run_isolated(target_backend, output_dir, filename, evaluation, args.threads, args.repeats)
+        rows.append({
+            "variant": variant + suffix,
+            "backend": target_backend,
+            "file": output,
+            "size_mb": file_size_mb(output),
+            "compressed_size_mb": file_size_mb(output, compressed=True),
+            "conversion_seconds": conversion_seconds,
+            **{key: value for key, value in result.items() if key != "probabilities"},
+            **compare(reference["probabilities"], result["probabilities"]),
+        })
+    
+    report_path = args.report or os.path.join(output_dir, "optimization_report.json")
+    with open(report_path, "w") as f:
+        json.dump({"source": source, "eval_images": len(evaluation), "variants": rows}, f, indent=2)
+    
+    print("=" * 50)
+    print(f"{'variant':>20} {'size MB':>8} {'gzip MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8} {'top-1':>7}")
+    for row in rows:
+        print(
+            f"{row['variant']:>20} {row['size_mb']:8.2f} {row['compressed_size_mb']:8.2f}"
+            f" {row['latency_ms_p50']:8.2f} {row['latency_ms_p95']:8.2f}"
+            f" {row['peak_rss_mb']:8.1f} {100 * row['top1_agreement']:6.1f}%"
+        )
+    print("=" * 50)
+    print(f"📝 Report written to {report_path}")
+    for row in rows[1:]:
+        print(f"   {row['variant']}: INFERENCE_BACKEND={row['backend']} MODEL_FILENAME={os.path.basename(row['file'])}"
+              + ("" if os.path.abspath(output_dir) == os.path.abspath(settings.MODEL_PATH) else f" MODEL_PATH={output_dir}"))
+
+if __name__ == "__main__":
+    main()
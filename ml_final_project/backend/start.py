@@ -4,9 +4,33 @@ Startup script for the FastAPI Lung Disease Detection Backend
 """
 
 import uvicorn
+import importlib.util
 import os
 import sys
 
+def run_prefork(host: str, port: int, workers: int, log_level: str):
+    """Serve with gunicorn: load model weights once, then fork uvicorn workers"""
+    from gunicorn.app.base import BaseApplication
+    
+    class PreforkServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)  # load() runs once, in the parent
+            self.cfg.set("loglevel", log_level)
+            self.cfg.set("accesslog", "-")
+        
+        def load(self):
+            from app.main import app
+            from app.services.ml_service import preload_backend
+            
+            # Weights read here are shared copy-on-write by every worker
+            preload_backend()
+            return app
+    
+    PreforkServer().run()
+
 def main():
     """Main function to start the FastAPI server"""
     
@@ -18,14 +42,25 @@ def main():
     port = int(os.getenv("PORT", 8000))
     reload = os.getenv("DEBUG", "True").lower() == "true"
     log_level = os.getenv("LOG_LEVEL", "info").lower()
+    workers = int(os.getenv("WORKERS", 1))
     
     print("🚀 Starting Lung Disease Detection API...")
     print(f"📍 Server will run on: http://{host}:{port}")
     print(f"📚 API Documentation: http://{host}:{port}/docs")
     print(f"🔧 Debug mode: {reload}")
+    if workers > 1:
+        print(f"👥 Workers: {workers} (pre-fork, reload disabled)")
     print("=" * 50)
     
     try:
+        if workers > 1:
+            if importlib.util.find_spec("gunicorn") is not None:
+                run_prefork(host, port, workers, log_level)
+            else:
+                print("⚠️ gunicorn is not installed; starting independent uvicorn workers (one model copy each)")
+                uvicorn.run("app.main:app", host=host, port=port, workers=workers, log_level=log_level)
+            return
+        
         # Start the server
         uvicorn.run(
             "app.main:app",
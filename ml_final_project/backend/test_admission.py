@@ -0,0 +1,150 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import admission as admission_module
+from app.core.admission import AdmissionController, ClientRateLimiter, OverloadedError, StageLimiter, TokenBucket
+from app.core.middleware import AdmissionControlMiddleware
+
+class _HandOverAtTimeout:
+    """asyncio, except that ``wait_for`` hands the waiter its slot and then fails as if it timed out"""
+    
+    def __init__(self, limiter: StageLimiter, error: BaseException):
+        self.limiter = limiter
+        self.error = error
+    
+    def __getattr__(self, name):
+        return getattr(asyncio, name)
+    
+    async def wait_for(self, awaitable, timeout):
+        self.limiter.release()  # The holder frees its slot, handing it to the waiter...
+        awaitable.cancel()
+        raise self.error  # ...just as the wait gives up
+
+@pytest.mark.asyncio
+async def test_slot_handed_over_as_wait_times_out_is_kept(monkeypatch):
+    limiter = StageLimiter("ingest", max_concurrent=1, max_queue=1, queue_timeout=0.01)
+    await limiter.acquire()
+    monkeypatch.setattr(admission_module, "asyncio", _HandOverAtTimeout(limiter, asyncio.TimeoutError()))
+    
+    await limiter.acquire()  # Admitted with the handed-over slot, not shed
+    assert limiter.active == 1
+    assert limiter.timed_out == 0
+    
+    limiter.release()
+    assert limiter.active == 0  # No slot leaked
+
+@pytest.mark.asyncio
+async def test_slot_handed_over_as_waiter_is_cancelled_is_returned(monkeypatch):
+    limiter = StageLimiter("ingest", max_concurrent=1, max_queue=1, queue_timeout=0.01)
+    await limiter.acquire()
+    monkeypatch.setattr(admission_module, "asyncio", _HandOverAtTimeout(limiter, asyncio.CancelledError()))
+    
+    with pytest.raises(asyncio.CancelledError):
+        await limiter.acquire()
+    assert limiter.active == 0
+
+@pytest.mark.asyncio
+async def test_waiter_times_out_and_queue_sheds():
+    limiter = StageLimiter("ingest", max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    
+    with pytest.raises(OverloadedError):
+        await limiter.acquire()  # Queue full: shed at once
+    with pytest.raises(OverloadedError):
+        await waiter  # Nobody released in time
+    
+    stats = limiter.get_stats()
+    assert (stats["shed"], stats["timed_out"], stats["active"], stats["queue_depth"]) == (1, 1, 1, 0)
+    limiter.release()
+    assert limiter.active == 0
+
+@pytest.mark.asyncio
+async def test_release_hands_slot_to_oldest_waiter():
+    limiter = StageLimiter("persist", max_concurrent=1, max_queue=2, queue_timeout=1.0)
+    await limiter.acquire()
+    first = asyncio.create_task(limiter.acquire())
+    second = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    
+    limiter.release()
+    await first
+    assert not second.done() and limiter.active == 1
+    limiter.release()
+    await second
+    limiter.release()
+    assert limiter.active == 0
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=2.0, burst=2)
+    assert bucket.take() == 0.0
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(0.5, abs=0.01)  # One token accrues in half a second
+    
+    bucket.updated -= 0.5
+    assert bucket.take() == 0.0
+    bucket.updated -= 10.0
+    bucket.take()
+    assert bucket.tokens == pytest.approx(1.0, abs=0.01)  # Refill is capped at the burst
+
+def test_rate_limiter_tracks_clients_separately():
+    limiter = ClientRateLimiter(rate=1.0, burst=1, max_clients=2)
+    assert limiter.check("a") == 0.0
+    assert limiter.check("a") > 0.0
+    assert limiter.check("b") == 0.0
+    limiter.check("c")  # Evicts the least recently seen client
+    assert limiter.check("a") == 0.0
+    assert limiter.get_stats()["tracked_clients"] == 2
+
+async def _app(scope, receive, send):
+    """Accept the body and answer 200"""
+    while (await receive()).get("more_body"):
+        pass
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+def _client(controller):
+    middleware = AdmissionControlMiddleware(_app, controller=controller, paths=["/upload"])
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test")
+
+@pytest.mark.asyncio
+async def test_rate_limited_response_carries_retry_after():
+    controller = AdmissionController()
+    controller.rate_limiter = ClientRateLimiter(rate=0.25, burst=1)
+    async with _client(controller) as client:
+        assert (await client.post("/upload", content=b"x")).status_code == 200
+        response = await client.post("/upload", content=b"x")
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "4"
+        
+        # Preflights and other routes spend no tokens
+        assert (await client.options("/upload")).status_code == 200
+        assert (await client.post("/other")).status_code == 200
+
+@pytest.mark.asyncio
+async def test_retry_after_is_capped_when_a_client_is_blocked():
+    controller = AdmissionController()
+    controller.rate_limiter = ClientRateLimiter(rate=0.0, burst=0)
+    async with _client(controller) as client:
+        response = await client.post("/upload", content=b"x")
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "3600"
+
+@pytest.mark.asyncio
+async def test_full_ingest_stage_is_shed_with_retry_after():
+    controller = AdmissionController()
+    controller.rate_limiter = None
+    controller.stages["ingest"] = StageLimiter("ingest", max_concurrent=1, max_queue=0, queue_timeout=1.0)
+    await controller.stage("ingest").acquire()
+    async with _client(controller) as client:
+        response = await client.post("/upload", content=b"x")
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) == max(1, round(OverloadedError("ingest").retry_after))
+    
+    controller.stage("ingest").release()
+    async with _client(controller) as client:
+        assert (await client.post("/upload", content=b"x")).status_code == 200
+    assert controller.stage("ingest").active == 0  # Released once the body was received
@@ -1 +1,122 @@
- 
\ No newline at end of file
+import asyncio
+import io
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+from PIL import Image
+
+from app.main import app
+
+def _png(shade: int = 128) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (96, 96), (shade, shade, shade)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+@pytest_asyncio.fixture
+async def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for _ in range(200):
+                if (await client.get("/ready")).status_code == 200:
+                    break
+                await asyncio.sleep(0.05)
+            else:
+                pytest.fail("app did not become ready")
+            yield client
+
+@pytest.mark.asyncio
+async def test_health(client):
+    response = await client.get("/health")
+    assert response.status_code == 200
+    assert response.json()["ml_service"] is True
+
+@pytest.mark.asyncio
+async def test_upload_xray(client):
+    response = await client.post(
+        "/api/analysis/upload-xray",
+        files={"file": ("chest.png", _png(), "image/png")},
+        data={"patient_age": "42"}
+    )
+    assert response.status_code == 200, response.text
+    analysis = response.json()["analysis"]
+    assert len(analysis["predictions"]) == 5
+    assert sum(prediction["confidence"] for prediction in analysis["predictions"]) == pytest.approx(1.0, abs=1e-3)
+
+@pytest.mark.asyncio
+async def test_upload_rejects_non_images(client):
+    response = await client.post(
+        "/api/analysis/upload-xray",
+        files={"file": ("notes.txt", b"not an image", "text/plain")}
+    )
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_batch_analyze_streams_ndjson(client):
+    files = [
+        ("files", ("a.png", _png(40), "image/png")),
+        ("files", ("broken.png", b"not a png", "image/png")),
+        ("files", ("b.png", _png(200), "image/png"))
+    ]
+    response = await client.post("/api/analysis/batch-analyze", files=files)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    
+    items = {item["index"]: item for item in map(json.loads, response.text.splitlines())}
+    assert sorted(items) == [0, 1, 2]
+    assert [items[index]["success"] for index in range(3)] == [True, False, True]
+    assert len(items[2]["analysis"]["predictions"]) == 5
+
+@pytest.mark.asyncio
+async def test_analysis_job_runs_to_completion(client):
+    files = [("files", (f"{i}.png", _png(60 * i), "image/png")) for i in range(3)]
+    response = await client.post("/api/analysis/jobs", files=files)
+    assert response.status_code == 202, response.text
+    job = response.json()
+    assert (job["status"], job["total"]) == ("queued", 3)
+    
+    for _ in range(200):
+        job = (await client.get(f"/api/analysis/jobs/{job['id']}")).json()
+        if job["status"] not in ("queued", "running"):
+            break
+        await asyncio.sleep(0.05)
+    assert (job["status"], job["completed"], job["failed"]) == ("completed", 3, 0)
+    assert len(job["items"]) == 3
+    
+    events = await client.get(f"/api/analysis/jobs/{job['id']}/events")
+    assert events.headers["content-type"].startswith("text/event-stream")
+    assert events.text.rstrip().split("\n\n")[-1].startswith("event: done")
+    
+    assert (await client.get("/api/analysis/jobs/missing")).status_code == 404
+
+@pytest.mark.asyncio
+async def test_disease_search(client):
+    response = await client.get("/api/diseases/search/", params={"q": "pneumonia"})
+    assert response.status_code == 200
+    assert "Pneumonia" in [disease["name"] for disease in response.json()]
+
+@pytest.mark.asyncio
+async def test_symptom_match(client):
+    response = await client.post("/api/symptoms/match", json={"symptoms": ["fever", "cough"], "age": 70})
+    assert response.status_code == 200
+    result = response.json()
+    assert [match["symptom"] for match in result["matches"]] == ["fever", "cough"]
+    assert result["suggested_diseases"]
+    
+    assert (await client.post("/api/symptoms/match", json={"symptoms": []})).status_code == 400
+
+@pytest.mark.asyncio
+async def test_triage_matches_each_record_like_match(client):
+    records = [{"symptoms": ["fever", "cough"], "age": 70}, {"symptoms": []}, {"symptoms": ["chest pain"]}]
+    response = await client.post("/api/symptoms/triage", json={"records": records})
+    assert response.status_code == 200
+    
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [(item["index"], item["success"]) for item in items] == [(0, True), (1, False), (2, True)]
+    for index in (0, 2):
+        single = await client.post("/api/symptoms/match", json=records[index])
+        assert items[index]["result"] == single.json()
@@ -0,0 +1,177 @@
+from contextlib import asynccontextmanager
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.admission import OverloadedError
+from app.models.schemas import Priority
+from app.services.ml_service import InferenceBatcher, MLService
+
+class FakePreprocessor:
+    """Stands in for ImagePreprocessor: records the order images are decoded in"""
+    
+    num_buffers = 1
+    
+    def __init__(self):
+        self.order = []
+    
+    @asynccontextmanager
+    async def preprocess_batch(self, image_data_list):
+        self.order.extend(image_data_list)
+        yield np.zeros((len(image_data_list), 1), dtype=np.float32), [None] * len(image_data_list)
+
+class GatedInference:
+    """Inference function that holds every forward pass until released"""
+    
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.started = asyncio.Event()
+    
+    async def __call__(self, images):
+        self.started.set()
+        await self.gate.wait()
+        return np.arange(len(images), dtype=np.float32).reshape(-1, 1)
+
+def _batcher(preprocessor, infer, starvation_ms=None):
+    return InferenceBatcher(
+        preprocessor,
+        infer,
+        max_batch_size=1,
+        max_wait_ms=0,
+        lane_weights={"interactive": 8, "batch": 2, "background": 1},
+        starvation_ms=starvation_ms
+    )
+
+async def _queue_behind_busy_pass(batcher, infer, requests):
+    """Occupy the pipeline with one pass, then queue ``requests`` ((image, priority) pairs) behind it"""
+    blocker = asyncio.create_task(batcher.submit(b"blocker", Priority.INTERACTIVE))
+    await infer.started.wait()
+    tasks = [asyncio.create_task(batcher.submit(image, priority)) for image, priority in requests]
+    await asyncio.sleep(0)  # Let every request reach its lane
+    return [blocker] + tasks
+
+@pytest.mark.asyncio
+async def test_lanes_are_served_by_weight_under_load():
+    preprocessor, infer = FakePreprocessor(), GatedInference()
+    batcher = _batcher(preprocessor, infer)
+    requests = [(f"background-{i}".encode(), Priority.BACKGROUND) for i in range(4)]
+    requests += [(f"batch-{i}".encode(), Priority.BATCH) for i in range(4)]
+    requests += [(f"interactive-{i}".encode(), Priority.INTERACTIVE) for i in range(4)]
+    tasks = await _queue_behind_busy_pass(batcher, infer, requests)
+    
+    infer.gate.set()
+    await asyncio.gather(*tasks)
+    await batcher.stop()
+    
+    order = [image.decode().split("-")[0] for image in preprocessor.order[1:]]
+    # Queued last, interactive requests still go first and background ones only
+    # after them; batch gets its weighted share in between (smooth weighted round-robin)
+    assert order.index("background") > max(i for i, lane in enumerate(order) if lane == "interactive")
+    assert order == [
+        "interactive", "interactive", "batch", "interactive", "interactive", "background",
+        "background", "batch", "batch", "background", "batch", "background"
+    ]
+    assert batcher.get_stats()["lanes"]["interactive"]["requests"] == 5
+
+@pytest.mark.asyncio
+async def test_starved_request_is_promoted():
+    preprocessor, infer = FakePreprocessor(), GatedInference()
+    batcher = _batcher(preprocessor, infer, starvation_ms=50)
+    requests = [(b"background", Priority.BACKGROUND)]
+    requests += [(f"interactive-{i}".encode(), Priority.INTERACTIVE) for i in range(4)]
+    tasks = await _queue_behind_busy_pass(batcher, infer, requests)
+    
+    await asyncio.sleep(0.1)  # Past the starvation limit while the pipeline is busy
+    infer.gate.set()
+    await asyncio.gather(*tasks)
+    await batcher.stop()
+    
+    assert preprocessor.order[1] == b"background"
+    assert batcher.get_stats()["lanes"]["background"]["promoted"] >= 1
+
+@pytest.mark.asyncio
+async def test_lanes_keep_weighted_order_without_starvation():
+    preprocessor, infer = FakePreprocessor(), GatedInference()
+    batcher = _batcher(preprocessor, infer)
+    requests = [(b"background", Priority.BACKGROUND)]
+    requests += [(f"interactive-{i}".encode(), Priority.INTERACTIVE) for i in range(4)]
+    tasks = await _queue_behind_busy_pass(batcher, infer, requests)
+    
+    await asyncio.sleep(0.1)
+    infer.gate.set()
+    await asyncio.gather(*tasks)
+    await batcher.stop()
+    
+    assert preprocessor.order[-1] == b"background"
+
+@pytest.mark.asyncio
+async def test_stop_fails_pending_requests():
+    preprocessor, infer = FakePreprocessor(), GatedInference()
+    batcher = _batcher(preprocessor, infer)
+    tasks = await _queue_behind_busy_pass(batcher, infer, [(b"queued-1", Priority.BATCH), (b"queued-2", Priority.BACKGROUND)])
+    
+    await batcher.stop()
+    results = await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 1.0)
+    
+    assert all(isinstance(result, RuntimeError) and "stopped" in str(result) for result in results)
+
+@pytest.mark.asyncio
+async def test_shed_when_lane_is_full():
+    preprocessor, infer = FakePreprocessor(), GatedInference()
+    batcher = _batcher(preprocessor, infer)
+    batcher.max_queue = 1
+    tasks = await _queue_behind_busy_pass(batcher, infer, [(b"queued", Priority.BATCH)])
+    
+    with pytest.raises(OverloadedError):
+        await batcher.submit(b"shed", Priority.BATCH)
+    
+    infer.gate.set()
+    await asyncio.gather(*tasks)
+    await batcher.stop()
+    assert batcher.get_stats()["lanes"]["batch"]["shed"] == 1
+
+class CoalescingService:
+    """An MLService whose inference records the lanes it runs in and waits to be released"""
+    
+    def __init__(self):
+        self.service = MLService()
+        self.service.result_cache = None
+        self.lanes = []
+        self.gate = asyncio.Event()
+        self.service._infer_image = self._infer_image
+    
+    async def _infer_image(self, image_data, priority=Priority.INTERACTIVE):
+        self.lanes.append(Priority(priority))
+        await self.gate.wait()
+        return np.full(5, 0.2, dtype=np.float32)
+    
+    def probabilities(self, priority):
+        return asyncio.create_task(self.service._get_probabilities(b"image", "digest", priority))
+
+@pytest.mark.asyncio
+async def test_interactive_request_never_joins_a_less_urgent_flight():
+    fake = CoalescingService()
+    background = fake.probabilities(Priority.BACKGROUND)
+    await asyncio.sleep(0.01)
+    interactive = fake.probabilities(Priority.INTERACTIVE)
+    await asyncio.sleep(0.01)
+    
+    assert fake.lanes == [Priority.BACKGROUND, Priority.INTERACTIVE]
+    fake.gate.set()
+    await asyncio.gather(background, interactive)
+
+@pytest.mark.asyncio
+async def test_less_urgent_request_joins_a_more_urgent_flight():
+    fake = CoalescingService()
+    interactive = fake.probabilities(Priority.INTERACTIVE)
+    await asyncio.sleep(0.01)
+    batch = fake.probabilities(Priority.BATCH)
+    background = fake.probabilities(Priority.BACKGROUND)
+    await asyncio.sleep(0.01)
+    
+    assert fake.lanes == [Priority.INTERACTIVE]
+    fake.gate.set()
+    results = await asyncio.gather(interactive, batch, background)
+    assert all((result == results[0]).all() for result in results)
+    assert fake.service.single_flight.get_stats()["coalesced"] == 2
@@ -0,0 +1,76 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.services.result_cache import InferenceResultCache
+
+PROBABILITIES = np.array([0.1, 0.2, 0.3, 0.2, 0.2])
+
+@pytest.mark.asyncio
+async def test_memory_tier_hit_and_lru_eviction():
+    cache = InferenceResultCache(max_entries=2)
+    await cache.put("a", PROBABILITIES)
+    await cache.put("b", PROBABILITIES)
+    assert await cache.get("a") is not None  # "a" is now the most recently used
+    await cache.put("c", PROBABILITIES)
+    
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_ttl(monkeypatch):
+    cache = InferenceResultCache(ttl_seconds=60)
+    await cache.put("a", PROBABILITIES)
+    assert await cache.get("a") is not None
+    
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert await cache.get("a") is None
+    assert cache.get_stats()["memory_entries"] == 0
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_a_restart(tmp_path):
+    cache = InferenceResultCache(disk_dir=str(tmp_path))
+    await cache.put("model:digest", PROBABILITIES)
+    
+    restarted = InferenceResultCache(disk_dir=str(tmp_path))
+    assert restarted.get_stats()["disk_entries"] == 1
+    cached = await restarted.get("model:digest")
+    assert np.allclose(cached, PROBABILITIES)
+    assert restarted.get_stats()["disk_hits"] == 1
+    
+    # Promoted to memory: the next lookup does not touch the disk
+    await restarted.get("model:digest")
+    assert restarted.get_stats()["disk_hits"] == 1
+
+@pytest.mark.asyncio
+async def test_expired_disk_entry_is_dropped(tmp_path, monkeypatch):
+    cache = InferenceResultCache(ttl_seconds=60, disk_dir=str(tmp_path))
+    await cache.put("a", PROBABILITIES)
+    cache.clear()
+    
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert await cache.get("a") is None
+    assert os.listdir(tmp_path) == []
+
+@pytest.mark.asyncio
+async def test_disk_tier_stays_under_its_byte_budget(tmp_path):
+    probe = InferenceResultCache(disk_dir=str(tmp_path / "probe"))
+    await probe.put("key-0", PROBABILITIES)
+    entry_size = probe.get_stats()["disk_bytes"]
+    
+    cache = InferenceResultCache(disk_dir=str(tmp_path / "cache"), disk_max_bytes=int(entry_size * 2.5))
+    for i in range(4):
+        await cache.put(f"key-{i}", PROBABILITIES)
+    
+    stats = cache.get_stats()
+    assert stats["disk_entries"] == 2
+    assert stats["disk_bytes"] <= entry_size * 2.5
+    cache.clear()
+    assert await cache.get("key-0") is None  # Least recently used, evicted from disk
+    assert await cache.get("key-3") is not None
@@ -0,0 +1,53 @@
+import random
+from datetime import datetime
+
+import numpy as np
+
+from app.models.schemas import Disease, SeverityLevel
+from app.services.symptom_matcher import SymptomMatcher
+
+def _disease(id: int, symptoms):
+    return Disease(
+        id=id,
+        name=f"Disease {id}",
+        description="",
+        severity=SeverityLevel.MODERATE,
+        symptoms=symptoms,
+        created_at=datetime.now()
+    )
+
+def _reference_hits(symptoms, diseases):
+    """The original rule: either lowercased symptom contains the other"""
+    hits = np.zeros((len(symptoms), len(diseases)), dtype=bool)
+    for row, symptom in enumerate(symptoms):
+        symptom_lower = symptom.lower()
+        for column, disease in enumerate(diseases):
+            for disease_symptom in disease.symptoms:
+                if symptom_lower in disease_symptom.lower() or disease_symptom.lower() in symptom_lower:
+                    hits[row, column] = True
+                    break
+    return hits
+
+def test_matches_original_substring_rule():
+    rng = random.Random(7)
+    alphabet = "abcAB \x00-!"
+    
+    def text():
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 6)))
+    
+    for _ in range(300):
+        diseases = [_disease(id, [text() for _ in range(rng.randint(0, 4))]) for id in range(rng.randint(0, 6))]
+        symptoms = [text() for _ in range(rng.randint(0, 6))]
+        matches = SymptomMatcher(diseases).match(symptoms)
+        assert (matches.hits == _reference_hits(symptoms, diseases)).all(), (symptoms, [d.symptoms for d in diseases])
+
+def test_separator_does_not_match_across_entries():
+    matcher = SymptomMatcher([_disease(1, ["Fever", "Cough"])])
+    assert not matcher.match(["r\x00c"]).hits.any()
+    assert matcher.match(["fever\x00cough"]).hits.all()
+
+def test_batch_scores_count_repeated_symptoms():
+    diseases = [_disease(1, ["Fever", "Cough"]), _disease(2, ["Chest pain"])]
+    batch = SymptomMatcher(diseases).match_batch([["fever", "FEVER", "chest pain"], [], ["cough"]])
+    assert batch.scores(0, 3).tolist() == [[2, 1], [0, 0], [1, 0]]
+    assert batch.symptom_counts(0, 3).tolist() == [3, 0, 1]
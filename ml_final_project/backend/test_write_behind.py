@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import OverloadedError
+from app.services.write_behind import WriteBehindQueue
+
+class FlakyCommit:
+    """commit_fn that fails a set number of times before succeeding"""
+    
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+    
+    def __call__(self, writes):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("backend unavailable")
+        self.batches.append(list(writes))
+
+def _queue(commit, **options):
+    options = {"flush_interval_ms": 1.0, "retry_backoff_seconds": 0.01, **options}
+    return WriteBehindQueue(commit, **options)
+
+@pytest.mark.asyncio
+async def test_writes_are_batched_and_flushed():
+    commit = FlakyCommit()
+    queue = _queue(commit, max_batch_size=2)
+    for i in range(5):
+        queue.put("analyses", str(i), {"n": i})
+    
+    assert await queue.flush(timeout=2.0)
+    await queue.close(timeout=1.0)
+    
+    assert [len(batch) for batch in commit.batches] == [2, 2, 1]
+    assert [document_id for batch in commit.batches for _, document_id, _ in batch] == ["0", "1", "2", "3", "4"]
+    assert queue.get_stats()["written"] == 5
+
+@pytest.mark.asyncio
+async def test_rewritten_document_is_committed_once_and_readable_until_then():
+    commit = FlakyCommit()
+    queue = _queue(commit)
+    queue.put("analyses", "a", {"version": 1})
+    queue.put("analyses", "a", {"version": 2})
+    assert queue.get("analyses", "a") == {"version": 2}
+    
+    assert await queue.flush(timeout=2.0)
+    await queue.close(timeout=1.0)
+    
+    assert commit.batches == [[("analyses", "a", {"version": 2})]]
+    assert queue.get("analyses", "a") is None
+    assert queue.get_stats()["coalesced"] == 1
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried():
+    commit = FlakyCommit(failures=2)
+    queue = _queue(commit, max_retries=3)
+    queue.put("analyses", "a", {})
+    
+    assert await queue.flush(timeout=2.0)
+    await queue.close(timeout=1.0)
+    
+    stats = queue.get_stats()
+    assert (stats["retries"], stats["written"], stats["failed"]) == (2, 1, 0)
+    assert stats["last_error"] == "backend unavailable"
+
+@pytest.mark.asyncio
+async def test_batch_is_dropped_after_the_last_retry():
+    commit = FlakyCommit(failures=10)
+    queue = _queue(commit, max_retries=1)
+    queue.put("analyses", "a", {})
+    
+    assert await queue.flush(timeout=2.0)  # Nothing left queued, though nothing was written
+    await queue.close(timeout=1.0)
+    
+    stats = queue.get_stats()
+    assert (stats["retries"], stats["written"], stats["failed"]) == (1, 0, 1)
+
+@pytest.mark.asyncio
+async def test_full_queue_refuses_writes():
+    queue = _queue(FlakyCommit(), max_pending=1, is_ready=lambda: False)
+    queue.put("analyses", "a", {})
+    queue.put("analyses", "a", {"again": True})  # Same document: coalesced, not refused
+    with pytest.raises(OverloadedError):
+        queue.put("analyses", "b", {})
+    
+    # Not connected: flush gives up at once, and close reports the write as lost
+    assert not await queue.flush(timeout=1.0)
+    await queue.close(timeout=0.1)
+    assert queue.get_stats()["rejected"] == 1
+    assert queue.depth() == 1
+
+@pytest.mark.asyncio
+async def test_writes_wait_for_the_database():
+    commit = FlakyCommit()
+    ready = False
+    queue = _queue(commit, is_ready=lambda: ready)
+    queue.put("analyses", "a", {})
+    await asyncio.sleep(0.05)
+    assert commit.batches == []
+    
+    ready = True
+    assert await queue.flush(timeout=2.0)
+    await queue.close(timeout=1.0)
+    assert len(commit.batches) == 1